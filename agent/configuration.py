@@ -1,6 +1,7 @@
 """Define the configurable parameters for the agent."""
 
 from dataclasses import dataclass, field, fields
+from functools import lru_cache
 from typing import Annotated, Any, Literal, Optional, Type, TypeVar
 
 from langchain_core.runnables import RunnableConfig, ensure_config
@@ -33,8 +34,23 @@ class IndexConfiguration:
         """
         config = ensure_config(config)
         configurable = config.get("configurable") or {}
-        _fields = {f.name for f in fields(cls) if f.init}
-        return cls(**{k: v for k, v in configurable.items() if k in _fields})
+        _fields = _init_fields(cls)
+        values = tuple(sorted((k, v) for k, v in configurable.items() if k in _fields))
+        try:
+            return _cached_instance(cls, values)
+        except TypeError:  # unhashable value, build a fresh instance
+            return cls(**dict(values))
+
+
+@lru_cache(maxsize=None)
+def _init_fields(cls) -> frozenset:
+    return frozenset(f.name for f in fields(cls) if f.init)
+
+
+@lru_cache(maxsize=256)
+def _cached_instance(cls, values: tuple):
+    # Instances are shared between calls with the same configurable values; treat as read-only
+    return cls(**dict(values))
 
 
 T = TypeVar("T", bound=IndexConfiguration)
@@ -56,6 +72,20 @@ class Configuration(IndexConfiguration):
         },
     )
 
+    router_model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
+        default="anthropic/claude-3-haiku-20240307",
+        metadata={
+            "description": "The language model used for the respond/query routing decision. A small model is enough. Should be in the form: provider/model-name."
+        },
+    )
+
+    router_retries: int = field(
+        default=2,
+        metadata={
+            "description": "How many times an unparseable routing decision is re-asked before responding directly."
+        },
+    )
+
     query_system_prompt: str = field(
         default=sys1,
         metadata={
@@ -69,3 +99,10 @@ class Configuration(IndexConfiguration):
             "description": "The language model used for processing and refining queries. Should be in the form: provider/model-name."
         },
     )
+
+    speculative_retrieval: bool = field(
+        default=False,
+        metadata={
+            "description": "Start the CrewAI lookup while the router decides, and drop it if the router responds directly."
+        },
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class FakeModelError(RuntimeError):
+    pass
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic local chat model with configurable latency, for tests and benchmarks.
+
+    Replies are picked by the first rule whose substring appears in the prompt, otherwise
+    ``responses`` are cycled. Latency is ``latency + seconds_per_input_token * prompt_tokens``
+    before the first token, then ``1 / tokens_per_second`` per generated token. A
+    ``failure_rate`` fraction of calls raise FakeModelError, for exercising fallbacks.
+
+    With ``cache_prefixes`` it mimics a provider's automatic prompt cache: it remembers
+    that many recent message-boundary prefixes, and the longest one a prompt starts with
+    is reported as cached input (``input_token_details.cache_read``) and costs no
+    ``seconds_per_input_token``.
+    """
+
+    responses: List[str] = ["This is a reply from the fake model."]
+    rules: List[Tuple[str, str]] = [("ONLY 'query' or 'respond'", "respond")]
+    latency: float = 0.0
+    seconds_per_input_token: float = 0.0
+    tokens_per_second: float = 0.0
+    failure_rate: float = 0.0
+    cache_prefixes: int = 0
+    calls: int = 0
+    last_input_tokens: int = 0
+    last_cached_tokens: int = 0
+
+    _prefixes: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _prefixes_lock: Lock = PrivateAttr(default_factory=Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prepare(self, messages: List[BaseMessage]) -> Tuple[str, float, dict]:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise FakeModelError("fake model failure")
+        prompt = "\n".join(str(m.content) for m in messages)
+        input_tokens = len(prompt) // 4 + 1
+        cached_tokens = self._cached_tokens(messages) if self.cache_prefixes else 0
+        self.last_input_tokens, self.last_cached_tokens = input_tokens, cached_tokens
+        reply = next((r for s, r in self.rules if s in prompt), None)
+        if reply is None:
+            reply = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        output_tokens = len(reply) // 4 + 1
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+        if cached_tokens:
+            usage["input_token_details"] = {"cache_read": cached_tokens}
+        return reply, self.latency + self.seconds_per_input_token * (input_tokens - cached_tokens), usage
+
+    def _cached_tokens(self, messages: List[BaseMessage]) -> int:
+        """Tokens in the longest remembered prefix of ``messages``; remembers all of its prefixes."""
+        digest, length, keys = hashlib.sha256(), 0, []
+        for message in messages:
+            digest.update(f"{message.type}\0{message.content}\0".encode())
+            length += len(str(message.content)) + 1
+            keys.append((digest.hexdigest(), length))
+        cached, hit = 0, True
+        with self._prefixes_lock:
+            for key, length in keys:
+                hit = hit and key in self._prefixes
+                if hit:
+                    cached = length // 4
+                self._prefixes[key] = True
+                self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.cache_prefixes:
+                self._prefixes.popitem(last=False)
+        return cached
+
+    def _pieces(self, reply: str) -> List[str]:
+        words = reply.split(" ")
+        return [w if i == len(words) - 1 else w + " " for i, w in enumerate(words)]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        reply, delay, usage = self._prepare(messages)
+        time.sleep(delay + self._token_delay() * len(self._pieces(reply)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        reply, delay, usage = self._prepare(messages)
+        await asyncio.sleep(delay + self._token_delay() * len(self._pieces(reply)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        reply, delay, usage = self._prepare(messages)
+        time.sleep(delay)
+        pieces = self._pieces(reply)
+        for i, piece in enumerate(pieces):
+            time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=piece, usage_metadata=usage if i == len(pieces) - 1 else None))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        reply, delay, usage = self._prepare(messages)
+        await asyncio.sleep(delay)
+        pieces = self._pieces(reply)
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=piece, usage_metadata=usage if i == len(pieces) - 1 else None))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
@@ -2,66 +2,93 @@
 
 # load_dotenv()
 
+from threading import Lock
+
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from agent.utils import load_chat_model
 from langchain_core.messages import AIMessage
-from langchain_core.prompts import ChatPromptTemplate
 import agent.state as state
 from agent.configuration import Configuration
+from v1.nodes import parse_decision
+from v1.prompt_cache import CachedPrompt
+from v1.speculation import Speculator, speculation_key
+from storage import get_checkpointer
+
+speculator = Speculator.from_env()
+
+# Built once; the fixed instructions lead each prompt so providers can cache them (v1.prompt_cache)
+query_prompt = CachedPrompt([
+    ("system", "Formulate a natural language query for the CrewAI agents based on the student's question."),
+], [
+    ("human", "{input}"),
+])
+
+router_prompt = CachedPrompt([
+    ("system",
+        "Decide if we need to consult the CrewAI agents for more information or if we can respond directly. "
+        "Output ONLY 'query' or 'respond'."),
+], [
+    ("human", "{input}"),
+    ("system", "Invalid decisions so far: {invalid_count}"),
+])
+
+response_prompt = CachedPrompt([
+    ("system",
+        "You are a helpful assistant for a student. Respond based on the conversation and any information from the CrewAI agents."),
+], [
+    ("human", "{input}"),
+    ("ai", "CrewAI Agent info: {database_agent_response}\nResponse:"),
+])
 
 def crewai_stub(query: str) -> str:
     return "User's Name is Chris"
 
-async def respond_or_query(state: state.AssistantState,*,config:RunnableConfig):
-    prompt = ChatPromptTemplate.from_messages([
-        ("system",
-            "Decide if we need to consult the CrewAI agents for more information or if we can respond directly."
-            "Output ONLY 'query' or 'respond'. Invalid decisions so far: {invalid_count}"),
-        ("human", "{input}"),
-    ])
+async def retrieve(text: str, configuration: Configuration) -> str:
+    chain = query_prompt | load_chat_model(configuration.query_model)
+    result = await chain.ainvoke({"input": text})
+    return crewai_stub(result.content)
 
+async def start_turn(state: state.AssistantState):
+    # State persists across turns in the checkpointer; drop the previous turn's retrieval and retries
+    return {"database_agent_response": "", "invalid_decision_count": 0}
+
+async def respond_or_query(state: state.AssistantState,*,config:RunnableConfig):
     configuration = Configuration.from_runnable_config(config)
-    chain = prompt | load_chat_model(configuration.response_model)
+    chain = router_prompt | load_chat_model(configuration.router_model)
 
-    decision = chain.invoke(
+    key = None
+    if configuration.speculative_retrieval:
+        # Overlap the lookup with the routing call; crewai_query claims it on "query"
+        key = speculation_key(state, config)
+        speculator.astart(key, lambda: retrieve(state["messages"][-1].content, configuration))
+
+    decision = await chain.ainvoke(
         {"input": state["messages"][-1].content, "invalid_count": state.get("invalid_decision_count", 0)})
 
-    decision_content = decision.content.strip().lower()
+    # Bounded like v1's router: after router_retries unparseable replies the turn responds directly
+    result = parse_decision(state, decision.content, configuration.router_retries)
 
-    invalid_decision_count = 0
-    if decision_content.startswith("query"):
-        decision_content = "query"
-    elif decision_content.startswith("respond"):
-        decision_content = "respond"
-    else:
-        decision_content = "invalid"
-        invalid_decision_count = state.get("invalid_decision_count", 0) + 1
+    if key is not None and result["task_decision"] == "respond":
+        speculator.discard(key)
 
-    return {"task_decision": decision_content, "invalid_decision_count": invalid_decision_count}
+    return {"task_decision": result["task_decision"], "invalid_decision_count": result["invalid_decision_count"]}
 
 async def crewai_query(state: state.AssistantState, *, config: RunnableConfig):
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "Formulate a natural language query for the CrewAI agents based on the student's question."),
-        ("human", "{input}"),
-    ])
     configuration = Configuration.from_runnable_config(config)
-    chain = prompt | load_chat_model(configuration.query_model)
-    result = chain.invoke({"input": state["messages"][-1].content})
-    return {"database_agent_response": [crewai_stub(result.content)]}
-
-def main_conversation(state: state.AssistantState, *, config: RunnableConfig):
-    prompt = ChatPromptTemplate.from_messages([
-        ("system",
-            "You are a helpful assistant for a student. Respond based on the conversation and any information from the CrewAI agents."),
-        ("human", "{input}"),
-        ("ai", "CrewAI Agent info: {database_agent_response}\nResponse:"),
-    ])
+    work = speculator.take(speculation_key(state, config)) if configuration.speculative_retrieval else None
+    if work is not None:
+        response = await speculator.aresult(work)
+    else:
+        response = await retrieve(state["messages"][-1].content, configuration)
+    return {"database_agent_response": [response]}
+
+async def main_conversation(state: state.AssistantState, *, config: RunnableConfig):
     configuration = Configuration.from_runnable_config(config)
-    chain = prompt | load_chat_model(configuration.query_model)
-    response = chain.invoke({
+    chain = response_prompt | load_chat_model(configuration.response_model)
+    response = await chain.ainvoke({
         "input": state["messages"][-1].content,
-        "database_agent_response": state.get("database_agent_response", "No additional information available.")
+        "database_agent_response": state.get("database_agent_response") or "No additional information available."
     })
     return {"messages": [AIMessage(content=response.content)]}
 
@@ -69,12 +96,14 @@ def main_conversation(state: state.AssistantState, *, config: RunnableConfig):
 workflow = StateGraph(state.AssistantState,input=state.InputState,config_schema=Configuration)
 
 # Add nodes
+workflow.add_node("start_turn", start_turn)
 workflow.add_node("respond_or_query", respond_or_query)
 workflow.add_node("crewai_agent_query", crewai_query)
 workflow.add_node("main_conversation", main_conversation)
 
 # Add edges
-workflow.set_entry_point("respond_or_query")
+workflow.set_entry_point("start_turn")
+workflow.add_edge("start_turn", "respond_or_query")
 workflow.add_conditional_edges(
     "respond_or_query",
     lambda x: "crewai_agent_query" if x["task_decision"] == "query" else (
@@ -87,8 +116,28 @@ workflow.add_conditional_edges(
 )
 workflow.add_edge("main_conversation", END)
 
-# Compile the graph
-graph = workflow.compile()
-graph.name = "StudyAssitance"
+_graph = None
+_graph_lock = Lock()
+
+
+def get_graph():
+    """The compiled graph, opening its checkpointer (CHECKPOINT_STORE) on first use.
+
+    Conversation state is kept per thread, so every invocation needs a ``thread_id``.
+    """
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = workflow.compile(checkpointer=get_checkpointer())
+                _graph.name = "StudyAssitance"
+    return _graph
+
+
+def __getattr__(name):
+    # ``agent.graph:graph`` still resolves, but importing the module opens no store
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
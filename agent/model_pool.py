@@ -0,0 +1,321 @@
+"""Route chat calls across several providers/models with circuit breakers and fallback.
+
+A pool spec joins 'provider/model' names with '|', each optionally weighted with '*n':
+
+    groq/llama-3.1-70b-versatile*3|anthropic/claude-3-5-haiku-20241022
+
+``load_chat_model`` returns a ModelPool for such a spec, so it works anywhere a model
+name does (V1_CHAT_MODEL, the agent graph's response_model/query_model). Settings:
+
+    MODEL_POOL_STRATEGY         least_latency (default) or weighted (smooth weighted round-robin)
+    MODEL_POOL_BREAKER_FAILURES consecutive failures that open a member's circuit (default 3)
+    MODEL_POOL_BREAKER_COOLDOWN seconds an open circuit is skipped before a trial call (default 30)
+    MODEL_POOL_HEDGE_AFTER      seconds before a second member is raced against a slow call;
+                                0 (default) disables hedging. Streaming calls are never hedged.
+
+A failing call falls through to the next member in order; a stream only does so before
+its first chunk.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from v1.metrics import metrics
+
+LEAST_LATENCY = "least_latency"
+WEIGHTED = "weighted"
+
+
+def parse_pool_spec(spec: str) -> List[Tuple[str, float]]:
+    """'a/x*3|b/y' -> [('a/x', 3.0), ('b/y', 1.0)]"""
+    members = []
+    for part in filter(None, (p.strip() for p in spec.split("|"))):
+        name, _, weight = part.rpartition("*") if "*" in part else (part, "", "1")
+        members.append((name.strip(), float(weight)))
+    if not members:
+        raise ValueError(f"Empty model pool spec {spec!r}")
+    return members
+
+
+class Member:
+    """One model in the pool, with its latency estimate and circuit breaker state."""
+
+    def __init__(self, name: str, model: BaseChatModel, weight: float = 1.0):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.latency: Optional[float] = None  # EWMA of successful call seconds
+        self.failures = 0
+        self.open_until = 0.0
+        self.current_weight = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until
+
+
+class ModelPool(BaseChatModel):
+    """A chat model that sends each call to one of its members, falling back on errors."""
+
+    model: str
+    strategy: str = LEAST_LATENCY
+    failure_threshold: int = 3
+    cooldown: float = 30.0
+    hedge_after: float = 0.0
+
+    _members: List[Member] = PrivateAttr(default_factory=list)
+    _lock: Lock = PrivateAttr(default_factory=Lock)
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_spec(cls, spec: str, load: Callable[[str], BaseChatModel], **settings) -> "ModelPool":
+        settings = {
+            "strategy": os.getenv("MODEL_POOL_STRATEGY", LEAST_LATENCY),
+            "failure_threshold": int(os.getenv("MODEL_POOL_BREAKER_FAILURES", "3")),
+            "cooldown": float(os.getenv("MODEL_POOL_BREAKER_COOLDOWN", "30")),
+            "hedge_after": float(os.getenv("MODEL_POOL_HEDGE_AFTER", "0")),
+            **settings,
+        }
+        if settings["strategy"] not in (LEAST_LATENCY, WEIGHTED):
+            raise ValueError(f"Unknown MODEL_POOL_STRATEGY {settings['strategy']!r}")
+        pool = cls(model=spec, **settings)
+        pool._members = [Member(name, load(name), weight) for name, weight in parse_pool_spec(spec)]
+        return pool
+
+    @property
+    def _llm_type(self) -> str:
+        return "model-pool"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model}
+
+    @property
+    def members(self) -> List[Member]:
+        return list(self._members)
+
+    # Selection and bookkeeping
+
+    def order(self) -> List[Member]:
+        """Members to try, best first; open circuits go last so an all-open pool still answers."""
+        now = time.monotonic()
+        with self._lock:
+            ready = [m for m in self._members if m.available(now)]
+            tripped = sorted((m for m in self._members if not m.available(now)), key=lambda m: m.open_until)
+            if self.strategy == WEIGHTED and ready:
+                total = sum(m.weight for m in ready)
+                for m in ready:
+                    m.current_weight += m.weight
+                first = max(ready, key=lambda m: m.current_weight)
+                first.current_weight -= total
+                ready = [first] + sorted((m for m in ready if m is not first), key=lambda m: -m.weight)
+            else:
+                # Members without a latency sample yet are tried first so every one gets measured
+                ready.sort(key=lambda m: m.latency or 0.0)
+        return ready + tripped
+
+    def succeeded(self, member: Member, seconds: float) -> None:
+        with self._lock:
+            member.latency = seconds if member.latency is None else 0.8 * member.latency + 0.2 * seconds
+            member.failures = 0
+            member.open_until = 0.0
+        metrics.inc("model_pool_calls_total", model=member.name, outcome="ok")
+        metrics.observe("model_pool_seconds", seconds, model=member.name)
+        metrics.set("model_pool_circuit_open", 0, model=member.name)
+
+    def failed(self, member: Member, error: BaseException) -> None:
+        with self._lock:
+            member.failures += 1
+            tripped = member.failures >= self.failure_threshold
+            if tripped:
+                member.open_until = time.monotonic() + self.cooldown
+        metrics.inc("model_pool_calls_total", model=member.name, outcome="error")
+        if tripped:
+            metrics.set("model_pool_circuit_open", 1, model=member.name)
+
+    # Blocking calls
+
+    def _call(self, member: Member, messages, stop, run_manager, kwargs) -> Tuple[Member, ChatResult]:
+        start = time.perf_counter()
+        try:
+            result = member.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self.failed(member, e)
+            raise
+        self.succeeded(member, time.perf_counter() - start)
+        return member, result
+
+    def _hedged(self, first: Member, second: Member, messages, stop, run_manager, kwargs) -> ChatResult:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="model-pool")
+        primary = self._executor.submit(self._call, first, messages, stop, run_manager, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            if primary.exception() is None:
+                return primary.result()[1]
+            # Failed fast: fall back to the would-be hedge as a plain call
+            metrics.inc("model_pool_fallbacks_total", model=second.name)
+            return self._call(second, messages, stop, run_manager, kwargs)[1]
+        metrics.inc("model_pool_hedges_total", model=second.name)
+        # The hedge runs without the run manager so two calls never report tokens into one run
+        pending = {primary, self._executor.submit(self._call, second, messages, stop, None, kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    member, result = future.result()
+                    if member is second:
+                        metrics.inc("model_pool_hedge_wins_total", model=second.name)
+                    return result  # the slower call finishes in the background and is ignored
+                error = future.exception()
+        raise error
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        order = self.order()
+        error = None
+        i = 0
+        while i < len(order):
+            member = order[i]
+            if i:
+                metrics.inc("model_pool_fallbacks_total", model=member.name)
+            hedge = self.hedge_after > 0 and i + 1 < len(order)
+            try:
+                if hedge:
+                    return self._hedged(member, order[i + 1], messages, stop, run_manager, kwargs)
+                return self._call(member, messages, stop, run_manager, kwargs)[1]
+            except Exception as e:
+                error = e
+            # A failed hedged call has used up the next member too
+            i += 2 if hedge else 1
+        raise error
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        error = None
+        for i, member in enumerate(self.order()):
+            if i:
+                metrics.inc("model_pool_fallbacks_total", model=member.name)
+            start = time.perf_counter()
+            streamed = False
+            try:
+                if type(member.model)._stream is BaseChatModel._stream:
+                    chunks = iter([as_chunk(member.model._generate(messages, stop=stop, **kwargs))])
+                else:
+                    chunks = member.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+                for chunk in chunks:
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                self.failed(member, e)
+                if streamed:
+                    raise
+                error = e
+                continue
+            self.succeeded(member, time.perf_counter() - start)
+            return
+        raise error
+
+    # Async calls
+
+    async def _acall(self, member: Member, messages, stop, run_manager, kwargs) -> Tuple[Member, ChatResult]:
+        start = time.perf_counter()
+        try:
+            result = await member.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self.failed(member, e)
+            raise
+        self.succeeded(member, time.perf_counter() - start)
+        return member, result
+
+    async def _ahedged(self, first: Member, second: Member, messages, stop, run_manager, kwargs) -> ChatResult:
+        primary = asyncio.ensure_future(self._acall(first, messages, stop, run_manager, kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_after)
+        if done:
+            if primary.exception() is None:
+                return primary.result()[1]
+            metrics.inc("model_pool_fallbacks_total", model=second.name)
+            return (await self._acall(second, messages, stop, run_manager, kwargs))[1]
+        metrics.inc("model_pool_hedges_total", model=second.name)
+        pending = {primary, asyncio.ensure_future(self._acall(second, messages, stop, None, kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        member, result = task.result()
+                        if member is second:
+                            metrics.inc("model_pool_hedge_wins_total", model=second.name)
+                        return result
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        order = self.order()
+        error = None
+        i = 0
+        while i < len(order):
+            member = order[i]
+            if i:
+                metrics.inc("model_pool_fallbacks_total", model=member.name)
+            hedge = self.hedge_after > 0 and i + 1 < len(order)
+            try:
+                if hedge:
+                    return await self._ahedged(member, order[i + 1], messages, stop, run_manager, kwargs)
+                return (await self._acall(member, messages, stop, run_manager, kwargs))[1]
+            except Exception as e:
+                error = e
+            # A failed hedged call has used up the next member too
+            i += 2 if hedge else 1
+        raise error
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        error = None
+        for i, member in enumerate(self.order()):
+            if i:
+                metrics.inc("model_pool_fallbacks_total", model=member.name)
+            start = time.perf_counter()
+            streamed = False
+            try:
+                model = type(member.model)
+                if model._astream is BaseChatModel._astream and model._stream is BaseChatModel._stream:
+                    result = await member.model._agenerate(messages, stop=stop, **kwargs)
+                    streamed = True
+                    yield as_chunk(result)
+                else:
+                    async for chunk in member.model._astream(messages, stop=stop, run_manager=run_manager,
+                                                             **kwargs):
+                        streamed = True
+                        yield chunk
+            except Exception as e:
+                self.failed(member, e)
+                if streamed:
+                    raise
+                error = e
+                continue
+            self.succeeded(member, time.perf_counter() - start)
+            return
+        raise error
+
+
+def as_chunk(result: ChatResult) -> ChatGenerationChunk:
+    """A whole ChatResult as one stream chunk, for members that can't stream."""
+    message = result.generations[0].message
+    return ChatGenerationChunk(message=AIMessageChunk(content=message.content,
+                                                      usage_metadata=getattr(message, "usage_metadata", None)))
@@ -0,0 +1,379 @@
+"""Client-side rate limiting and in-flight coalescing for chat model calls.
+
+Every client of a model shares one RateLimiter with two token buckets, requests per
+minute and tokens per minute. Callers wait in a priority queue: chat turns
+(INTERACTIVE) go ahead of speculative retrieval and crew kickoffs (BACKGROUND).
+Token cost is estimated from the prompt before the call and corrected from the
+reported usage afterwards. Identical concurrent prompts share one upstream call.
+
+Enabled by env vars (all off by default):
+
+    LLM_RPM       requests per minute per model (0 = unlimited)
+    LLM_TPM       tokens per minute per model (0 = unlimited)
+    LLM_COALESCE  1 to share one call between identical in-flight prompts
+
+Wait time is reported in llm_queue_wait_seconds{model,priority}.
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Condition, Lock
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from agent.model_pool import as_chunk
+from v1.metrics import metrics
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Assumed completion size when the call doesn't set max_tokens
+DEFAULT_OUTPUT_TOKENS = 256
+# How often a waiter that isn't at the head of the queue re-checks
+POLL_SECONDS = 0.05
+
+priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background():
+    """Run the enclosed LLM calls at BACKGROUND priority."""
+    token = priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        priority.reset(token)
+
+
+def in_background(run: Callable[[], Any]) -> Any:
+    with background():
+        return run()
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int] = None) -> int:
+    return sum(len(str(m.content)) for m in messages) // 4 + 1 + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def used_tokens(message) -> Optional[int]:
+    meta = getattr(message, "usage_metadata", None)
+    return meta.get("total_tokens") or meta.get("input_tokens", 0) + meta.get("output_tokens", 0) if meta else None
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets with a priority wait queue."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, name: str = ""):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.name = name
+        self._cond = Condition(Lock())
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._refilled = time.monotonic()
+        self._waiting: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._refilled
+        self._refilled = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _grant(self, ticket: tuple, tokens: int) -> float:
+        """Take capacity for the head of the queue: 0 when granted, else seconds to wait."""
+        self._refill(time.monotonic())
+        if self._waiting[0] is not ticket:
+            return POLL_SECONDS
+        # A request larger than the whole bucket waits for a full bucket rather than forever
+        tokens = min(tokens, self.tpm)
+        short_requests = 1 - self._requests if self.rpm else 0.0
+        short_tokens = tokens - self._tokens if self.tpm else 0.0
+        if short_requests > 0 or short_tokens > 0:
+            return max(short_requests * 60 / self.rpm if short_requests > 0 else 0.0,
+                       short_tokens * 60 / self.tpm if short_tokens > 0 else 0.0)
+        self._requests -= 1
+        self._tokens -= tokens
+        heapq.heappop(self._waiting)
+        metrics.set("llm_queue_depth", len(self._waiting), model=self.name)
+        return 0.0
+
+    def _enqueue(self, level: int) -> tuple:
+        ticket = (level, next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        metrics.set("llm_queue_depth", len(self._waiting), model=self.name)
+        return ticket
+
+    def _abandon(self, ticket: tuple) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            metrics.set("llm_queue_depth", len(self._waiting), model=self.name)
+        self._cond.notify_all()
+
+    def _waited(self, level: int, start: float) -> float:
+        waited = time.perf_counter() - start
+        metrics.observe("llm_queue_wait_seconds", waited, model=self.name, priority=PRIORITY_NAMES[level])
+        return waited
+
+    def acquire(self, tokens: int = 0, level: Optional[int] = None) -> float:
+        """Block until a request of ``tokens`` may go; returns the seconds waited."""
+        level = priority.get() if level is None else level
+        start = time.perf_counter()
+        with self._cond:
+            ticket = self._enqueue(level)
+            try:
+                while (delay := self._grant(ticket, tokens)) > 0:
+                    self._cond.wait(delay)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+            # The next in line may be able to go now too
+            self._cond.notify_all()
+        return self._waited(level, start)
+
+    async def aacquire(self, tokens: int = 0, level: Optional[int] = None) -> float:
+        """Async counterpart of acquire(); waits without blocking the event loop."""
+        level = priority.get() if level is None else level
+        start = time.perf_counter()
+        with self._cond:
+            ticket = self._enqueue(level)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._grant(ticket, tokens)
+                    if not delay:
+                        self._cond.notify_all()
+                        break
+                await asyncio.sleep(min(delay, POLL_SECONDS))
+        except BaseException:
+            with self._cond:
+                self._abandon(ticket)
+            raise
+        return self._waited(level, start)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct the token bucket once the call reports what it really used."""
+        if self.tpm and actual is not None:
+            with self._cond:
+                self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - actual)
+
+
+class Coalescer:
+    """Lets concurrent identical calls share the first caller's result."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    @staticmethod
+    def key(name: str, messages: List[BaseMessage], stop, kwargs: dict) -> str:
+        payload = json.dumps([name, [(m.type, m.content) for m in messages], stop, kwargs],
+                             sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _join(self, key: str):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = Future()
+                return None
+        return future
+
+    @staticmethod
+    def shared(result: ChatResult) -> ChatResult:
+        """A follower's copy of the leader's result: the same reply, flagged as coalesced and
+        without token usage, which the leader's call already reported."""
+        result = result.model_copy(deep=True)
+        for generation in result.generations:
+            message = generation.message
+            message.usage_metadata = None
+            message.response_metadata = {**message.response_metadata, "coalesced": True}
+        if result.llm_output:
+            result.llm_output = {k: v for k, v in result.llm_output.items() if k != "token_usage"}
+        return result
+
+    def _finish(self, key: str, result=None, error: BaseException = None) -> None:
+        with self._lock:
+            future = self._inflight.pop(key)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def run(self, key: str, call: Callable[[], ChatResult], name: str = "") -> ChatResult:
+        future = self._join(key)
+        if future is not None:
+            metrics.inc("llm_coalesced_total", model=name)
+            return self.shared(future.result())
+        try:
+            result = call()
+        except BaseException as e:
+            self._finish(key, error=e)
+            raise
+        self._finish(key, result)
+        return result
+
+    async def arun(self, key: str, call, name: str = "") -> ChatResult:
+        future = self._join(key)
+        if future is not None:
+            metrics.inc("llm_coalesced_total", model=name)
+            return self.shared(await asyncio.wrap_future(future))
+        try:
+            result = await call()
+        except BaseException as e:
+            self._finish(key, error=e)
+            raise
+        self._finish(key, result)
+        return result
+
+
+class LimitedChatModel(BaseChatModel):
+    """Wraps a chat model so its calls go through the model's shared limiter and coalescer."""
+
+    model: str
+
+    _inner: BaseChatModel = PrivateAttr()
+    _limiter: Optional[RateLimiter] = PrivateAttr(default=None)
+    _coalescer: Optional[Coalescer] = PrivateAttr(default=None)
+
+    @classmethod
+    def wrap(cls, name: str, inner: BaseChatModel, limiter: Optional[RateLimiter],
+             coalescer: Optional[Coalescer]) -> "LimitedChatModel":
+        model = cls(model=name)
+        model._inner, model._limiter, model._coalescer = inner, limiter, coalescer
+        return model
+
+    @property
+    def _llm_type(self) -> str:
+        return self._inner._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model}
+
+    @property
+    def inner(self) -> BaseChatModel:
+        return self._inner
+
+    def _estimate(self, messages, kwargs) -> int:
+        return estimate_tokens(messages, kwargs.get("max_tokens")) if self._limiter else 0
+
+    def _settle(self, estimated: int, message) -> None:
+        if self._limiter is not None:
+            self._limiter.settle(estimated, used_tokens(message))
+
+    def _call(self, messages, stop, run_manager, kwargs) -> ChatResult:
+        estimated = self._estimate(messages, kwargs)
+        if self._limiter is not None:
+            self._limiter.acquire(estimated)
+        result = self._inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._settle(estimated, result.generations[0].message)
+        return result
+
+    async def _acall(self, messages, stop, run_manager, kwargs) -> ChatResult:
+        estimated = self._estimate(messages, kwargs)
+        if self._limiter is not None:
+            await self._limiter.aacquire(estimated)
+        result = await self._inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._settle(estimated, result.generations[0].message)
+        return result
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self._coalescer is None:
+            return self._call(messages, stop, run_manager, kwargs)
+        key = Coalescer.key(self.model, messages, stop, kwargs)
+        return self._coalescer.run(key, lambda: self._call(messages, stop, run_manager, kwargs), self.model)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        if self._coalescer is None:
+            return await self._acall(messages, stop, run_manager, kwargs)
+        key = Coalescer.key(self.model, messages, stop, kwargs)
+        return await self._coalescer.arun(key, lambda: self._acall(messages, stop, run_manager, kwargs),
+                                          self.model)
+
+    # Streams are per caller (tokens go to one client), so they are rate limited but not shared
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        estimated = self._estimate(messages, kwargs)
+        if self._limiter is not None:
+            self._limiter.acquire(estimated)
+        if type(self._inner)._stream is BaseChatModel._stream:
+            chunks = iter([as_chunk(self._inner._generate(messages, stop=stop, **kwargs))])
+        else:
+            chunks = self._inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        last = None
+        for last in chunks:
+            yield last
+        self._settle(estimated, last and last.message)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        estimated = self._estimate(messages, kwargs)
+        if self._limiter is not None:
+            await self._limiter.aacquire(estimated)
+        inner = type(self._inner)
+        if inner._astream is BaseChatModel._astream and inner._stream is BaseChatModel._stream:
+            result = await self._inner._agenerate(messages, stop=stop, **kwargs)
+            yield as_chunk(result)
+            self._settle(estimated, result.generations[0].message)
+            return
+        last = None
+        async for last in self._inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield last
+        self._settle(estimated, last and last.message)
+
+
+class Limits:
+    """LLM_* settings plus the per-model limiters and coalescers they produce."""
+
+    def __init__(self):
+        self.rpm = float(os.getenv("LLM_RPM", "0"))
+        self.tpm = float(os.getenv("LLM_TPM", "0"))
+        self.coalesce = os.getenv("LLM_COALESCE", "0").lower() in ("1", "true", "yes")
+        self._lock = Lock()
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._coalescers: Dict[str, Coalescer] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm or self.coalesce)
+
+    def limiter(self, name: str) -> Optional[RateLimiter]:
+        """The limiter shared by every client of ``name``, or None when unlimited."""
+        if not (self.rpm or self.tpm):
+            return None
+        with self._lock:
+            if name not in self._limiters:
+                self._limiters[name] = RateLimiter(self.rpm, self.tpm, name)
+            return self._limiters[name]
+
+    def coalescer(self, name: str) -> Optional[Coalescer]:
+        if not self.coalesce:
+            return None
+        with self._lock:
+            return self._coalescers.setdefault(name, Coalescer())
+
+    def wrap(self, name: str, model: BaseChatModel) -> BaseChatModel:
+        if not self.enabled:
+            return model
+        return LimitedChatModel.wrap(name, model, self.limiter(name), self.coalescer(name))
+
+
+limits = Limits()
@@ -1,17 +1,133 @@
+import os
+import time
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl
+
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AnyMessage
 
-def load_chat_model(fully_specified_name: str) -> BaseChatModel:
-    """Load a chat model from a fully specified name.
+from agent.rate_limit import limits
+from v1.metrics import metrics
 
-    Args:
-        fully_specified_name (str): String in the format 'provider/model'.
-    """
+
+def _settings_key(kwargs: dict) -> tuple:
+    return tuple(sorted((k, v if isinstance(v, (str, int, float, bool, type(None))) else repr(v))
+                        for k, v in kwargs.items()))
+
+
+def _init_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
+    if "|" in fully_specified_name:
+        from agent.model_pool import ModelPool
+        # Members come from the registry, so a model shared with other pools keeps one client
+        return ModelPool.from_spec(fully_specified_name, lambda name: registry.get(name, **kwargs))
     if "/" in fully_specified_name:
         provider, model = fully_specified_name.split("/", maxsplit=1)
     else:
         provider = ""
         model = fully_specified_name
-    return init_chat_model(model, model_provider=provider)
\ No newline at end of file
+    if provider == "fake":
+        from agent.fake_llm import FakeChatModel
+        # fake/<name>?latency=0.2&failure_rate=0.1 sets FakeChatModel fields
+        _, _, query = model.partition("?")
+        client = FakeChatModel(**{k: float(v) for k, v in parse_qsl(query)}, **kwargs)
+    elif provider == "llamacpp":
+        # Local CPU model for the small tiers: llamacpp/<path to .gguf>, needs llama-cpp-python
+        from langchain_community.chat_models import ChatLlamaCpp
+        client = ChatLlamaCpp(model_path=model, **{"n_ctx": 2048, "temperature": 0.0, "verbose": False, **kwargs})
+    else:
+        client = init_chat_model(model, model_provider=provider, **kwargs)
+    # Rate limits and coalescing are shared by every client of the same model (LLM_* env vars)
+    return limits.wrap(fully_specified_name, client)
+
+
+class ModelRegistry:
+    """Process-wide cache of chat model clients keyed by 'provider/model' and settings.
+
+    Reusing a client reuses its HTTP connection pool. Entries unused for ``idle_ttl``
+    seconds are dropped on the next lookup after the sweep interval.
+    """
+
+    def __init__(self, idle_ttl: float = 1800.0, sweep_interval: float = 60.0):
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._lock = Lock()
+        self._models: Dict[Tuple[str, tuple], BaseChatModel] = {}
+        self._last_used: Dict[Tuple[str, tuple], float] = {}
+        self._last_sweep = time.monotonic()
+        self.construct_seconds: Dict[str, float] = {}
+
+    def get(self, fully_specified_name: str, **kwargs) -> BaseChatModel:
+        key = (fully_specified_name, _settings_key(kwargs))
+        now = time.monotonic()
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._last_used[key] = now
+        if model is not None:
+            metrics.inc("model_registry_hits_total", model=fully_specified_name)
+            # What this call would have spent rebuilding the client
+            metrics.inc("model_construct_seconds_saved_total",
+                        self.construct_seconds.get(fully_specified_name, 0.0), model=fully_specified_name)
+            self.evict_idle(now)
+            return model
+
+        start = time.perf_counter()
+        model = _init_model(fully_specified_name, **kwargs)
+        elapsed = time.perf_counter() - start
+        metrics.inc("model_registry_misses_total", model=fully_specified_name)
+        metrics.observe("model_construct_seconds", elapsed, model=fully_specified_name)
+        with self._lock:
+            # Another thread may have built it meanwhile; keep the first so clients stay shared
+            model = self._models.setdefault(key, model)
+            self._last_used[key] = now
+            self.construct_seconds[fully_specified_name] = elapsed
+        return model
+
+    def warm_up(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.get(name)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = now or time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return 0
+        with self._lock:
+            self._last_sweep = now
+            idle = [k for k, used in self._last_used.items() if now - used > self.idle_ttl]
+            for key in idle:
+                del self._models[key]
+                del self._last_used[key]
+        if idle:
+            metrics.inc("model_registry_evictions_total", len(idle))
+        return len(idle)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._last_used.clear()
+
+
+registry = ModelRegistry(idle_ttl=float(os.getenv("MODEL_IDLE_TTL", "1800")))
+
+
+def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
+    """Load a chat model from a fully specified name, reusing a cached client when possible.
+
+    Args:
+        fully_specified_name (str): String in the format 'provider/model'. The 'fake'
+            provider returns the local FakeChatModel and 'llamacpp/<file.gguf>' a local
+            llama.cpp model. Several names joined with '|'
+            return a ModelPool that balances and fails over between them (see agent.model_pool).
+        **kwargs: Model settings (temperature, ...); part of the cache key.
+    """
+    return registry.get(fully_specified_name, **kwargs)
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> None:
+    """Build the given models (default: comma-separated MODEL_WARMUP) ahead of the first request."""
+    if names is None:
+        names = [n.strip() for n in os.getenv("MODEL_WARMUP", "").split(",") if n.strip()]
+    registry.warm_up(names)
@@ -0,0 +1,45 @@
+import os
+from threading import Lock
+
+from analytics.engine import PerformanceEngine
+from analytics.events import InvalidEvent
+from analytics.store import AnalyticsStore, MemoryAnalyticsStore, SQLiteAnalyticsStore
+
+
+def get_analytics_store(url: str = None) -> AnalyticsStore:
+    """Open the analytics store named by ``url`` (default: the ANALYTICS_STORE env var).
+
+    Accepts the same URL schemes as storage.get_store.
+    """
+    url = url or os.getenv("ANALYTICS_STORE", "sqlite:///analytics.db")
+    if url.startswith("memory://"):
+        return MemoryAnalyticsStore()
+    if url.startswith("sqlite://"):
+        return SQLiteAnalyticsStore(url[len("sqlite:///"):] or ":memory:")
+    if url.startswith("mongomock://"):
+        import mongomock
+        from analytics.store import MongoAnalyticsStore
+        return MongoAnalyticsStore(mongomock.MongoClient())
+    if url.startswith(("mongodb://", "mongodb+srv://")):
+        from pymongo import MongoClient
+        from analytics.store import MongoAnalyticsStore
+        return MongoAnalyticsStore(MongoClient(url), os.getenv("MONGO_DB", "studytracker"))
+    raise ValueError(f"Unsupported ANALYTICS_STORE {url!r}")
+
+
+_engine: PerformanceEngine = None
+_engine_lock = Lock()
+
+
+def get_performance_engine() -> PerformanceEngine:
+    """Return the process-wide PerformanceEngine over the ANALYTICS_STORE store."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PerformanceEngine(get_analytics_store())
+    return _engine
+
+
+__all__ = ["AnalyticsStore", "InvalidEvent", "MemoryAnalyticsStore", "PerformanceEngine",
+           "SQLiteAnalyticsStore", "get_analytics_store", "get_performance_engine"]
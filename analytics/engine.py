@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from analytics.events import Increment, count_streaks, deadline_update, increments, normalize, week_start
+from analytics.store import TABLES, AnalyticsStore
+
+DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def merge(updates: Iterable[Increment]) -> List[Increment]:
+    """Sum increments that hit the same rollup row, so a batch writes each row once."""
+    merged = {}
+    for table, key, deltas in updates:
+        slot = (table, tuple(key.items()))
+        if slot not in merged:
+            merged[slot] = (table, key, dict(deltas))
+        else:
+            row = merged[slot][2]
+            for field, delta in deltas.items():
+                row[field] = row.get(field, 0) + delta
+    return list(merged.values())
+
+
+def current_streak(streak: Optional[dict], today: date) -> int:
+    """Consecutive study days ending today (or yesterday, if today has no session yet)."""
+    if not streak or streak["last_day"] < (today - timedelta(days=1)).isoformat():
+        return 0
+    return int(streak["current"])
+
+
+class PerformanceEngine:
+    """Ingests study events into rollups and serves the /performance dashboard from them.
+
+    Each event updates a handful of rollup rows, so the dashboard reads pre-aggregated
+    totals instead of re-scanning the event history.
+    """
+
+    def __init__(self, store: AnalyticsStore):
+        self.store = store
+
+    def ingest(self, events: Iterable[dict]) -> int:
+        events = [normalize(e) for e in events]
+        self.store.apply(events, merge(i for e in events for i in increments(e)))
+        return len(events)
+
+    def dashboard(self, user_id: str, today: date = None) -> dict:
+        today = today or date.today()
+        monday = week_start(today)
+        totals = self.store.row("totals", user_id) or dict.fromkeys(TABLES["totals"][1], 0)
+
+        week = self.store.rows("daily", user_id, monday.isoformat(), (monday + timedelta(days=6)).isoformat())
+        hours = np.zeros(7)
+        if week:
+            offsets = np.array([(date.fromisoformat(r["day"]) - monday).days for r in week])
+            hours[offsets] = np.array([r["study_minutes"] for r in week]) / 60
+
+        subjects = self.store.rows("subjects", user_id)
+        graded = [s for s in subjects if s["grade_count"]]
+        scores = (np.array([s["grade_sum"] for s in graded]) / np.array([s["grade_count"] for s in graded])
+                  if graded else np.array([]))
+
+        streak = current_streak(self.store.streak(user_id), today)
+
+        tasks_total = int(totals["tasks_total"])
+        tasks_completed = int(totals["tasks_completed"])
+        average_grade = totals["grade_sum"] / totals["grade_count"] if totals["grade_count"] else 0.0
+        focus = totals["focus_sum"] / totals["focus_count"] if totals["focus_count"] else 0.0
+
+        achievements = []
+        if streak >= 7:
+            achievements.append(f"Completed {streak}-day study streak")
+        if tasks_total and tasks_completed >= tasks_total:
+            achievements.append("Finished all tasks")
+        if hours.sum() >= 10:
+            achievements.append(f"Studied {hours.sum():.0f} hours this week")
+
+        return {
+            'overallProgress': round(100 * tasks_completed / tasks_total) if tasks_total else 0,
+            'studyHours': round(float(hours.sum()), 1),
+            'tasksCompleted': tasks_completed,
+            'averageGrade': round(average_grade, 2),
+            'streak': streak,
+            'focusScore': round(focus),
+            'upcomingDeadlines': [{'task': d["title"], 'subject': d["subject"], 'date': d["due"]}
+                                  for d in self.upcoming_deadlines(user_id, today=today)],
+            'recentAchievements': achievements,
+            'subjectPerformance': [{'subject': s["subject"], 'score': int(round(score))}
+                                   for s, score in zip(graded, scores)],
+            'weeklyStudyHours': [{'day': name, 'hours': round(float(h), 1)} for name, h in zip(DAY_NAMES, hours)],
+        }
+
+    def upcoming_deadlines(self, user_id: str, limit: int = 5, today: date = None) -> List[dict]:
+        """The next ``limit`` open deadlines from today, soonest first."""
+        return self.store.deadlines(user_id, (today or date.today()).isoformat(), limit)
+
+    def rebuild(self, user_id: str) -> None:
+        """Recompute a user's rollups from the raw event log (backfills, schema changes)."""
+        import pandas as pd
+
+        raw = list(self.store.events(user_id))
+        events = pd.DataFrame(raw)
+        updates: List[Increment] = []
+        streak, deadlines, statuses = None, {}, {}
+        if not events.empty:
+            sessions = events[events["type"] == "study_session"]
+            if not sessions.empty:
+                sessions = sessions.assign(week=pd.to_datetime(sessions["day"]).dt.to_period("W-SUN")
+                                           .dt.start_time.dt.date.astype(str))
+                totals = {"study_minutes": float(sessions["minutes"].sum()), "sessions": len(sessions)}
+                if "focus" in sessions and sessions["focus"].notna().any():
+                    focus = sessions["focus"].dropna()
+                    totals.update(focus_sum=float(focus.sum()), focus_count=len(focus))
+                updates.append(("totals", {"user_id": user_id}, totals))
+                streak = count_streaks(sessions["day"])
+                for column, table, agg in (("subject", "subjects", {"study_minutes": ("minutes", "sum")}),
+                                           ("day", "daily", {"study_minutes": ("minutes", "sum"),
+                                                             "sessions": ("minutes", "size")}),
+                                           ("week", "weekly", {"study_minutes": ("minutes", "sum")})):
+                    for key, row in sessions.groupby(column).agg(**agg).iterrows():
+                        updates.append((table, {"user_id": user_id, column: key},
+                                        {f: float(v) for f, v in row.items()}))
+            tasks = events[events["type"] == "task"]
+            if not tasks.empty:
+                # Task counts follow each task's last status, as in task_updates
+                statuses = dict(zip(tasks["task_id"], tasks["status"]))
+                updates.append(("totals", {"user_id": user_id},
+                                {"tasks_total": len(statuses),
+                                 "tasks_completed": sum(s == "completed" for s in statuses.values())}))
+                # Deadlines are last-write-wins per task, so replay the task events in order
+                for event in raw:
+                    update = deadline_update(event)
+                    if update is None:
+                        continue
+                    task_id, row = update
+                    if row is None:
+                        deadlines.pop(task_id, None)
+                    else:
+                        deadlines[task_id] = row
+            grades = events[events["type"] == "grade"]
+            if not grades.empty:
+                updates.append(("totals", {"user_id": user_id},
+                                {"grade_sum": float(grades["score"].sum()), "grade_count": len(grades)}))
+                for subject, row in grades.groupby("subject")["score"].agg(["sum", "size"]).iterrows():
+                    updates.append(("subjects", {"user_id": user_id, "subject": subject},
+                                    {"grade_sum": float(row["sum"]), "grade_count": int(row["size"])}))
+        self.store.reset_rollups(user_id)
+        self.store.apply([], merge(updates))
+        self.store.set_indexes(user_id, streak, list(deadlines.values()), statuses)
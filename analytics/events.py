@@ -0,0 +1,177 @@
+"""Validation and rollup increments for study-tracking events.
+
+Events are plain dicts with a ``type`` and ``user_id``:
+
+    {"type": "study_session", "user_id": "u1", "subject": "Math", "start": "2024-10-01T18:00", "minutes": 45, "focus": 80}
+    {"type": "task", "user_id": "u1", "task_id": "t1", "title": "Essay", "subject": "History", "due": "2024-10-04", "status": "created"}
+    {"type": "task", "user_id": "u1", "task_id": "t1", "status": "completed"}
+    {"type": "grade", "user_id": "u1", "subject": "Math", "score": 88}
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EVENT_TYPES = ("study_session", "task", "grade")
+TASK_STATUSES = ("created", "completed")
+
+# (table, key fields, {field: delta}) as applied by an AnalyticsStore
+Increment = Tuple[str, dict, dict]
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def parse_day(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def normalize(event: dict) -> dict:
+    """Validate an event and fill in derived fields; raises InvalidEvent."""
+    if not isinstance(event, dict):
+        raise InvalidEvent("Each event must be an object")
+    kind = event.get("type")
+    if kind not in EVENT_TYPES:
+        raise InvalidEvent(f"Unknown event type {kind!r}")
+    if not event.get("user_id"):
+        raise InvalidEvent("user_id is required")
+    event = dict(event)
+    try:
+        if kind == "study_session":
+            event["minutes"] = float(event.get("minutes", 0))
+            if event["minutes"] <= 0:
+                raise InvalidEvent("minutes must be positive")
+            event["day"] = parse_day(event.get("start") or datetime.now()).isoformat()
+            event["subject"] = event.get("subject") or "General"
+        elif kind == "task":
+            if not event.get("task_id"):
+                raise InvalidEvent("task_id is required")
+            event["status"] = event.get("status", "created")
+            if event["status"] not in TASK_STATUSES:
+                raise InvalidEvent(f"Unknown task status {event['status']!r}")
+            if event.get("due"):
+                event["due"] = parse_day(event["due"]).isoformat()
+        else:
+            event["score"] = float(event["score"])
+            event["subject"] = event.get("subject") or "General"
+    except (KeyError, TypeError, ValueError) as e:
+        if isinstance(e, InvalidEvent):
+            raise
+        raise InvalidEvent(f"Malformed {kind} event: {e}") from e
+    return event
+
+
+def increments(event: dict) -> List[Increment]:
+    """Rollup updates for one normalized event; applying them is O(1) per event."""
+    user = event["user_id"]
+    kind = event["type"]
+    if kind == "study_session":
+        minutes = event["minutes"]
+        focus = event.get("focus")
+        totals = {"study_minutes": minutes, "sessions": 1}
+        if focus is not None:
+            totals.update(focus_sum=float(focus), focus_count=1)
+        day = parse_day(event["day"])
+        return [
+            ("totals", {"user_id": user}, totals),
+            ("subjects", {"user_id": user, "subject": event["subject"]}, {"study_minutes": minutes}),
+            ("daily", {"user_id": user, "day": day.isoformat()}, {"study_minutes": minutes, "sessions": 1}),
+            ("weekly", {"user_id": user, "week": week_start(day).isoformat()}, {"study_minutes": minutes}),
+        ]
+    if kind == "task":
+        # Task counts depend on the task's previous status; AnalyticsStore.task_updates applies them
+        return []
+    return [
+        ("totals", {"user_id": user}, {"grade_sum": event["score"], "grade_count": 1}),
+        ("subjects", {"user_id": user, "subject": event["subject"]},
+         {"grade_sum": event["score"], "grade_count": 1}),
+    ]
+
+
+def task_deltas(previous: Optional[str], status: str) -> dict:
+    """Change to tasks_total / tasks_completed when a task goes from ``previous`` (None if unseen)
+    to ``status``. Re-sent or repeated statuses change nothing."""
+    deltas = {}
+    if previous is None:
+        deltas["tasks_total"] = 1
+    done, was_done = status == "completed", previous == "completed"
+    if done != was_done:
+        deltas["tasks_completed"] = 1 if done else -1
+    return deltas
+
+
+def session_days(events: Iterable[dict]) -> Dict[str, List[str]]:
+    """Distinct study days per user in a batch, oldest first."""
+    days: Dict[str, set] = {}
+    for event in events:
+        if event["type"] == "study_session":
+            days.setdefault(event["user_id"], set()).add(event["day"])
+    return {user: sorted(d) for user, d in days.items()}
+
+
+def advance_streak(streak: Optional[dict], day: str) -> Optional[dict]:
+    """Streak after a session on ``day``, in O(1).
+
+    Returns None when ``day`` is before the streak's last day: a backfilled session can join
+    older runs, so the caller resolves it with backfill_streak.
+    """
+    if not streak or not streak["last_day"]:
+        return {"last_day": day, "current": 1, "longest": 1}
+    if day == streak["last_day"]:
+        return streak
+    if day < streak["last_day"]:
+        return None
+    gap = (date.fromisoformat(day) - date.fromisoformat(streak["last_day"])).days
+    current = streak["current"] + 1 if gap == 1 else 1
+    return {"last_day": day, "current": current, "longest": max(streak["longest"], current)}
+
+
+def backfill_window(streak: dict, day: str) -> Tuple[str, str]:
+    """Study days backfill_streak needs: the run left of ``day`` is at most ``longest`` long."""
+    start = date.fromisoformat(day) - timedelta(days=int(streak["longest"]) + 1)
+    return start.isoformat(), streak["last_day"]
+
+
+def backfill_streak(streak: dict, day: str, days: Iterable[str]) -> dict:
+    """Streak after a session on a ``day`` before the last study day, given every study day
+    in backfill_window (including ``day``). Idempotent, so an already counted day is a no-op.
+    """
+    ordinals = sorted({date.fromisoformat(d).toordinal() for d in days} | {date.fromisoformat(day).toordinal()})
+    i = j = ordinals.index(date.fromisoformat(day).toordinal())
+    while i > 0 and ordinals[i - 1] == ordinals[i] - 1:
+        i -= 1
+    while j + 1 < len(ordinals) and ordinals[j + 1] == ordinals[j] + 1:
+        j += 1
+    run = j - i + 1
+    reaches_last = date.fromordinal(ordinals[j]).isoformat() == streak["last_day"]
+    return {"last_day": streak["last_day"], "current": run if reaches_last else streak["current"],
+            "longest": max(streak["longest"], run)}
+
+
+def count_streaks(days: Iterable[str]) -> Optional[dict]:
+    """Streak recomputed from every study day, for rebuilds."""
+    streak = None
+    for day in sorted(set(days)):
+        streak = advance_streak(streak, day)
+    return streak
+
+
+def deadline_update(event: dict) -> Optional[Tuple[str, Optional[dict]]]:
+    """(task_id, deadline row) for a task event, with None as the row when the task leaves
+    the index; None when the event doesn't touch it."""
+    if event["type"] != "task":
+        return None
+    if event["status"] == "completed":
+        return event["task_id"], None
+    if not event.get("due"):
+        return None
+    return event["task_id"], {"task_id": event["task_id"], "due": event["due"],
+                              "title": event.get("title") or event["task_id"],
+                              "subject": event.get("subject") or "General"}
@@ -0,0 +1,407 @@
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from analytics.events import (Increment, advance_streak, backfill_streak, backfill_window, deadline_update,
+                              session_days, task_deltas)
+from storage.sqlite import ThreadConnections
+
+# Rollup tables: key columns (user_id first) and counter columns
+TABLES = {
+    "totals": (("user_id",), ("study_minutes", "sessions", "focus_sum", "focus_count",
+                              "tasks_total", "tasks_completed", "grade_sum", "grade_count")),
+    "subjects": (("user_id", "subject"), ("study_minutes", "grade_sum", "grade_count")),
+    "daily": (("user_id", "day"), ("study_minutes", "sessions")),
+    "weekly": (("user_id", "week"), ("study_minutes",)),
+}
+STREAK_FIELDS = ("last_day", "current", "longest")
+DEADLINE_FIELDS = ("task_id", "due", "title", "subject")
+
+
+class AnalyticsStore(ABC):
+    """Raw event log plus incrementally maintained rollup tables.
+
+    Alongside the additive rollups each user has three indexes updated in O(1) per event:
+    their study streak, their open task deadlines kept ordered by due date, and the last
+    status of each task, so task counts follow transitions rather than events.
+    """
+
+    @abstractmethod
+    def apply(self, events: List[dict], increments: List[Increment]) -> None:
+        """Append events, apply their rollup increments and update the indexes atomically."""
+
+    @abstractmethod
+    def rows(self, table: str, user_id: str, start: str = None, end: str = None) -> List[dict]:
+        """Rollup rows for a user; ``start``/``end`` bound the second key column (inclusive)."""
+
+    @abstractmethod
+    def events(self, user_id: str) -> Iterator[dict]:
+        """The user's raw events in ingestion order."""
+
+    @abstractmethod
+    def reset_rollups(self, user_id: str) -> None:
+        """Drop a user's rollups and indexes (the event log is kept)."""
+
+    @abstractmethod
+    def streak(self, user_id: str) -> Optional[dict]:
+        """The user's streak index: last study day, current and longest run."""
+
+    @abstractmethod
+    def deadlines(self, user_id: str, start: str = None, limit: int = 5) -> List[dict]:
+        """The first ``limit`` open deadlines due on or after ``start``, read off the index."""
+
+    @abstractmethod
+    def task_statuses(self, user_id: str, task_ids: Iterable[str]) -> Dict[str, str]:
+        """Last known status of each of ``task_ids`` the user has sent before."""
+
+    @abstractmethod
+    def set_indexes(self, user_id: str, streak: Optional[dict], deadlines: List[dict],
+                    tasks: Dict[str, str] = None) -> None:
+        """Replace a user's indexes wholesale (used by rebuilds)."""
+
+    def row(self, table: str, user_id: str) -> Optional[dict]:
+        rows = self.rows(table, user_id)
+        return rows[0] if rows else None
+
+    def study_days(self, user_id: str, start: str = None, end: str = None) -> List[str]:
+        return [r["day"] for r in self.rows("daily", user_id, start, end) if r["study_minutes"] > 0]
+
+    def next_streaks(self, events: List[dict]) -> Dict[str, dict]:
+        """Updated streak per user touched by ``events``; call after their daily rows are applied.
+
+        Sessions on or after the last study day cost O(1); a backfilled one reads only the
+        daily rows between its run and the last study day.
+        """
+        updates = {}
+        for user, days in session_days(events).items():
+            streak = self.streak(user)
+            for day in days:
+                streak = advance_streak(streak, day) or backfill_streak(
+                    streak, day, self.study_days(user, *backfill_window(streak, day)))
+            updates[user] = streak
+        return updates
+
+    def task_updates(self, events: List[dict]) -> Tuple[List[Increment], Dict[str, Dict[str, str]]]:
+        """Totals increments for the task status transitions in ``events``, and the new status of
+        each task they touch, per user. Reads only the statuses of those tasks."""
+        batches: Dict[str, List[dict]] = defaultdict(list)
+        for event in events:
+            if event["type"] == "task":
+                batches[event["user_id"]].append(event)
+        increments, statuses = [], {}
+        for user, batch in batches.items():
+            current = self.task_statuses(user, {e["task_id"] for e in batch})
+            totals: Dict[str, int] = defaultdict(int)
+            for event in batch:
+                for field, delta in task_deltas(current.get(event["task_id"]), event["status"]).items():
+                    totals[field] += delta
+                current[event["task_id"]] = event["status"]
+            if any(totals.values()):
+                increments.append(("totals", {"user_id": user}, dict(totals)))
+            statuses[user] = {e["task_id"]: current[e["task_id"]] for e in batch}
+        return increments, statuses
+
+
+class MemoryAnalyticsStore(AnalyticsStore):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._events: Dict[str, List[dict]] = defaultdict(list)
+        self._tables: Dict[str, Dict[tuple, dict]] = {name: {} for name in TABLES}
+        self._streaks: Dict[str, dict] = {}
+        # Open deadlines by task, plus (due, task_id) pairs kept sorted for top-k reads
+        self._deadlines: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self._due: Dict[str, List[tuple]] = defaultdict(list)
+        self._tasks: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+    def _set_deadline(self, user_id: str, task_id: str, row: Optional[dict]) -> None:
+        old = self._deadlines[user_id].pop(task_id, None)
+        due = self._due[user_id]
+        if old is not None:
+            del due[bisect_left(due, (old["due"], task_id))]
+        if row is not None:
+            self._deadlines[user_id][task_id] = row
+            insort(due, (row["due"], task_id))
+
+    def apply(self, events: List[dict], increments: List[Increment]) -> None:
+        with self._lock:
+            for event in events:
+                self._events[event["user_id"]].append(event)
+            task_increments, statuses = self.task_updates(events)
+            for user_id, tasks in statuses.items():
+                self._tasks[user_id].update(tasks)
+            for table, key, deltas in increments + task_increments:
+                keys, counters = TABLES[table]
+                row = self._tables[table].setdefault(
+                    tuple(key[k] for k in keys), {**key, **{c: 0 for c in counters}})
+                for field, delta in deltas.items():
+                    row[field] += delta
+            self._streaks.update(self.next_streaks(events))
+            for event in events:
+                update = deadline_update(event)
+                if update is not None:
+                    self._set_deadline(event["user_id"], *update)
+
+    def rows(self, table: str, user_id: str, start: str = None, end: str = None) -> List[dict]:
+        keys, _ = TABLES[table]
+        with self._lock:
+            rows = [dict(r) for k, r in self._tables[table].items() if k[0] == user_id]
+        if len(keys) > 1:
+            col = keys[1]
+            rows = [r for r in rows if (start is None or r[col] >= start) and (end is None or r[col] <= end)]
+            rows.sort(key=lambda r: r[col])
+        return rows
+
+    def events(self, user_id: str) -> Iterator[dict]:
+        yield from list(self._events.get(user_id, ()))
+
+    def reset_rollups(self, user_id: str) -> None:
+        with self._lock:
+            for table in self._tables.values():
+                for key in [k for k in table if k[0] == user_id]:
+                    del table[key]
+            self._streaks.pop(user_id, None)
+            self._deadlines.pop(user_id, None)
+            self._due.pop(user_id, None)
+            self._tasks.pop(user_id, None)
+
+    def streak(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            streak = self._streaks.get(user_id)
+            return dict(streak) if streak else None
+
+    def deadlines(self, user_id: str, start: str = None, limit: int = 5) -> List[dict]:
+        with self._lock:
+            due = self._due.get(user_id, [])
+            first = bisect_left(due, (start,)) if start else 0
+            return [dict(self._deadlines[user_id][task_id]) for _, task_id in due[first:first + limit]]
+
+    def task_statuses(self, user_id: str, task_ids: Iterable[str]) -> Dict[str, str]:
+        with self._lock:
+            tasks = self._tasks.get(user_id, {})
+            return {task_id: tasks[task_id] for task_id in task_ids if task_id in tasks}
+
+    def set_indexes(self, user_id: str, streak: Optional[dict], deadlines: List[dict],
+                    tasks: Dict[str, str] = None) -> None:
+        with self._lock:
+            self._streaks.pop(user_id, None)
+            if streak:
+                self._streaks[user_id] = dict(streak)
+            self._deadlines.pop(user_id, None)
+            self._due.pop(user_id, None)
+            for row in deadlines:
+                self._set_deadline(user_id, row["task_id"], dict(row))
+            self._tasks.pop(user_id, None)
+            if tasks:
+                self._tasks[user_id] = dict(tasks)
+
+
+class SQLiteAnalyticsStore(AnalyticsStore):
+    def __init__(self, path: str = "analytics.db"):
+        self.path = path
+        self._connections = ThreadConnections(path, "analytics")
+        schema = ["CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                  "user_id TEXT NOT NULL, body TEXT NOT NULL)",
+                  "CREATE INDEX IF NOT EXISTS events_user ON events (user_id, seq)",
+                  "CREATE TABLE IF NOT EXISTS streaks (user_id TEXT PRIMARY KEY, last_day TEXT NOT NULL, "
+                  "current INTEGER NOT NULL, longest INTEGER NOT NULL) WITHOUT ROWID",
+                  "CREATE TABLE IF NOT EXISTS deadlines (user_id TEXT NOT NULL, task_id TEXT NOT NULL, "
+                  "due TEXT NOT NULL, title TEXT, subject TEXT, PRIMARY KEY (user_id, task_id)) WITHOUT ROWID",
+                  "CREATE INDEX IF NOT EXISTS deadlines_due ON deadlines (user_id, due, task_id)",
+                  "CREATE TABLE IF NOT EXISTS tasks (user_id TEXT NOT NULL, task_id TEXT NOT NULL, "
+                  "status TEXT NOT NULL, PRIMARY KEY (user_id, task_id)) WITHOUT ROWID"]
+        for table, (keys, counters) in TABLES.items():
+            columns = [f"{k} TEXT NOT NULL" for k in keys] + [f"{c} REAL NOT NULL DEFAULT 0" for c in counters]
+            schema.append(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}, "
+                          f"PRIMARY KEY ({', '.join(keys)})) WITHOUT ROWID")
+        with self._conn() as conn:
+            for statement in schema:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @staticmethod
+    def _upsert(table: str, key: dict, deltas: dict):
+        columns = list(key) + list(deltas)
+        updates = ", ".join(f"{f} = {f} + excluded.{f}" for f in deltas)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}")
+        return sql, [*key.values(), *deltas.values()]
+
+    @staticmethod
+    def _write_streak(conn: sqlite3.Connection, user_id: str, streak: dict) -> None:
+        conn.execute("INSERT OR REPLACE INTO streaks (user_id, last_day, current, longest) VALUES (?, ?, ?, ?)",
+                     (user_id, *(streak[f] for f in STREAK_FIELDS)))
+
+    @staticmethod
+    def _write_deadline(conn: sqlite3.Connection, user_id: str, task_id: str, row: Optional[dict]) -> None:
+        if row is None:
+            conn.execute("DELETE FROM deadlines WHERE user_id = ? AND task_id = ?", (user_id, task_id))
+        else:
+            conn.execute("INSERT OR REPLACE INTO deadlines (user_id, task_id, due, title, subject) "
+                         "VALUES (?, ?, ?, ?, ?)", (user_id, *(row[f] for f in DEADLINE_FIELDS)))
+
+    @staticmethod
+    def _write_tasks(conn: sqlite3.Connection, user_id: str, tasks: Dict[str, str]) -> None:
+        conn.executemany("INSERT OR REPLACE INTO tasks (user_id, task_id, status) VALUES (?, ?, ?)",
+                         [(user_id, task_id, status) for task_id, status in tasks.items()])
+
+    def apply(self, events: List[dict], increments: List[Increment]) -> None:
+        with self._conn() as conn:
+            conn.executemany("INSERT INTO events (user_id, body) VALUES (?, ?)",
+                             [(e["user_id"], json.dumps(e)) for e in events])
+            # After the insert, so this transaction holds the write lock while it reads task statuses
+            task_increments, statuses = self.task_updates(events)
+            for user_id, tasks in statuses.items():
+                self._write_tasks(conn, user_id, tasks)
+            for table, key, deltas in increments + task_increments:
+                conn.execute(*self._upsert(table, key, deltas))
+            # Same connection, so the streak reads see this batch's daily rows
+            for user_id, streak in self.next_streaks(events).items():
+                self._write_streak(conn, user_id, streak)
+            for event in events:
+                update = deadline_update(event)
+                if update is not None:
+                    self._write_deadline(conn, event["user_id"], *update)
+
+    def rows(self, table: str, user_id: str, start: str = None, end: str = None) -> List[dict]:
+        keys, _ = TABLES[table]
+        sql, params = f"SELECT * FROM {table} WHERE user_id = ?", [user_id]
+        if len(keys) > 1:
+            if start is not None:
+                sql += f" AND {keys[1]} >= ?"
+                params.append(start)
+            if end is not None:
+                sql += f" AND {keys[1]} <= ?"
+                params.append(end)
+            sql += f" ORDER BY {keys[1]}"
+        return [dict(r) for r in self._conn().execute(sql, params)]
+
+    def events(self, user_id: str) -> Iterator[dict]:
+        for row in self._conn().execute("SELECT body FROM events WHERE user_id = ? ORDER BY seq", (user_id,)):
+            yield json.loads(row["body"])
+
+    def reset_rollups(self, user_id: str) -> None:
+        with self._conn() as conn:
+            for table in (*TABLES, "streaks", "deadlines", "tasks"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+    def streak(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT last_day, current, longest FROM streaks WHERE user_id = ?",
+                                   (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def deadlines(self, user_id: str, start: str = None, limit: int = 5) -> List[dict]:
+        rows = self._conn().execute("SELECT task_id, due, title, subject FROM deadlines "
+                                    "WHERE user_id = ? AND due >= ? ORDER BY due, task_id LIMIT ?",
+                                    (user_id, start or "", limit))
+        return [dict(r) for r in rows]
+
+    def task_statuses(self, user_id: str, task_ids: Iterable[str]) -> Dict[str, str]:
+        task_ids = list(task_ids)
+        rows = self._conn().execute(f"SELECT task_id, status FROM tasks WHERE user_id = ? "
+                                    f"AND task_id IN ({', '.join('?' * len(task_ids))})", (user_id, *task_ids))
+        return {r["task_id"]: r["status"] for r in rows}
+
+    def set_indexes(self, user_id: str, streak: Optional[dict], deadlines: List[dict],
+                    tasks: Dict[str, str] = None) -> None:
+        with self._conn() as conn:
+            for table in ("streaks", "deadlines", "tasks"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            if streak:
+                self._write_streak(conn, user_id, streak)
+            for row in deadlines:
+                self._write_deadline(conn, user_id, row["task_id"], row)
+            self._write_tasks(conn, user_id, tasks or {})
+
+
+class MongoAnalyticsStore(AnalyticsStore):
+    def __init__(self, client, database: str = "studytracker"):
+        from pymongo import ASCENDING
+        self.client = client
+        self.db = client[database]
+        self.db["events"].create_index([("user_id", ASCENDING), ("_id", ASCENDING)])
+        for table, (keys, _) in TABLES.items():
+            self.db[table].create_index([(k, ASCENDING) for k in keys], unique=True)
+        self.db["streaks"].create_index("user_id", unique=True)
+        self.db["deadlines"].create_index([("user_id", ASCENDING), ("task_id", ASCENDING)], unique=True)
+        self.db["deadlines"].create_index([("user_id", ASCENDING), ("due", ASCENDING), ("task_id", ASCENDING)])
+        self.db["tasks"].create_index([("user_id", ASCENDING), ("task_id", ASCENDING)], unique=True)
+
+    def _write_deadline(self, user_id: str, task_id: str, row: Optional[dict]) -> None:
+        key = {"user_id": user_id, "task_id": task_id}
+        if row is None:
+            self.db["deadlines"].delete_one(key)
+        else:
+            self.db["deadlines"].replace_one(key, {"user_id": user_id, **row}, upsert=True)
+
+    def _write_tasks(self, user_id: str, tasks: Dict[str, str]) -> None:
+        from pymongo import UpdateMany
+        if tasks:
+            # (user_id, task_id) is unique, so each matches one document; mongomock's bulk_write
+            # rejects UpdateOne from current pymongo releases
+            self.db["tasks"].bulk_write([UpdateMany({"user_id": user_id, "task_id": task_id},
+                                                    {"$set": {"status": status}}, upsert=True)
+                                         for task_id, status in tasks.items()], ordered=False)
+
+    def apply(self, events: List[dict], increments: List[Increment]) -> None:
+        if events:
+            self.db["events"].insert_many([dict(e) for e in events])
+        task_increments, statuses = self.task_updates(events)
+        for user_id, tasks in statuses.items():
+            self._write_tasks(user_id, tasks)
+        # Increments are already merged per row, so a batch costs one upsert per touched row
+        for table, key, deltas in increments + task_increments:
+            self.db[table].update_one(key, {"$inc": deltas}, upsert=True)
+        for user_id, streak in self.next_streaks(events).items():
+            self.db["streaks"].replace_one({"user_id": user_id}, {"user_id": user_id, **streak}, upsert=True)
+        for event in events:
+            update = deadline_update(event)
+            if update is not None:
+                self._write_deadline(event["user_id"], *update)
+
+    def rows(self, table: str, user_id: str, start: str = None, end: str = None) -> List[dict]:
+        keys, counters = TABLES[table]
+        query = {"user_id": user_id}
+        if len(keys) > 1 and (start is not None or end is not None):
+            query[keys[1]] = {**({"$gte": start} if start is not None else {}),
+                              **({"$lte": end} if end is not None else {})}
+        cursor = self.db[table].find(query, {"_id": 0})
+        if len(keys) > 1:
+            cursor = cursor.sort(keys[1], 1)
+        return [{**{c: 0 for c in counters}, **doc} for doc in cursor]
+
+    def events(self, user_id: str) -> Iterator[dict]:
+        for doc in self.db["events"].find({"user_id": user_id}, {"_id": 0}).sort("_id", 1):
+            yield doc
+
+    def reset_rollups(self, user_id: str) -> None:
+        for table in (*TABLES, "streaks", "deadlines", "tasks"):
+            self.db[table].delete_many({"user_id": user_id})
+
+    def streak(self, user_id: str) -> Optional[dict]:
+        return self.db["streaks"].find_one({"user_id": user_id}, {"_id": 0, "user_id": 0})
+
+    def deadlines(self, user_id: str, start: str = None, limit: int = 5) -> List[dict]:
+        cursor = self.db["deadlines"].find({"user_id": user_id, "due": {"$gte": start or ""}},
+                                           {"_id": 0, "user_id": 0})
+        return list(cursor.sort([("due", 1), ("task_id", 1)]).limit(limit))
+
+    def task_statuses(self, user_id: str, task_ids: Iterable[str]) -> Dict[str, str]:
+        cursor = self.db["tasks"].find({"user_id": user_id, "task_id": {"$in": list(task_ids)}},
+                                       {"_id": 0, "task_id": 1, "status": 1})
+        return {doc["task_id"]: doc["status"] for doc in cursor}
+
+    def set_indexes(self, user_id: str, streak: Optional[dict], deadlines: List[dict],
+                    tasks: Dict[str, str] = None) -> None:
+        for table in ("streaks", "deadlines", "tasks"):
+            self.db[table].delete_many({"user_id": user_id})
+        if streak:
+            self.db["streaks"].insert_one({"user_id": user_id, **streak})
+        for row in deadlines:
+            self._write_deadline(user_id, row["task_id"], row)
+        self._write_tasks(user_id, tasks or {})
@@ -0,0 +1,145 @@
+"""ASGI entry point: chat turns run on the event loop via graph.ainvoke.
+
+    uvicorn asgi_app:app --workers 1
+
+POST /chats/<chat_id>/messages is served natively async, so many in-flight chats overlap
+their LLM waits in one process. Every other route is delegated to the Flask app.
+"""
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import flask_app
+from flask_app import STREAM_MIMETYPES, chat_storage, encode_event, negotiate_stream, wants_ledger
+from storage import CheckpointConflict
+from v1.graph import get_workflow
+from v1.logs import configure as configure_logging
+from v1.turns import DuplicateTurn, Turn, turns
+
+# Flask-CORS covers the mounted routes; the native ones set the header themselves
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+
+def reply(payload: dict, status_code: int = 200) -> JSONResponse:
+    return JSONResponse(payload, status_code=status_code, headers=CORS_HEADERS)
+
+
+def stream_format(request: Request, data: dict):
+    return negotiate_stream(request.query_params.get('stream', data.get('stream')), request.headers.get('accept', ''))
+
+
+class TurnStreamingResponse(StreamingResponse):
+    """Frees the chat's lane when the response ends, even if the body was never iterated."""
+
+    def __init__(self, turn: Turn, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.turn = turn
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.turn.release()
+
+
+async def stream_reply(chat_id: str, user_id, data: dict, user_message: str, fmt: str, turn: Turn,
+                       debug: bool = False) -> StreamingResponse:
+    async def generate():
+        message_id = str(uuid4())
+        yield encode_event(fmt, 'start', {'id': message_id})
+        if turn.coalesced:
+            try:
+                yield encode_event(fmt, 'message', await turn.ashared())
+            except Exception as e:
+                yield encode_event(fmt, 'error', {'error': f'Error processing message: {str(e)}'})
+            return
+        content = None
+        async with turn:
+            try:
+                async for event, payload in get_workflow().astream(user_message, thread_id=chat_id,
+                                                                   user_id=user_id, debug=debug):
+                    if event == 'token':
+                        yield encode_event(fmt, 'token', {'content': payload})
+                    elif event == 'node':
+                        yield encode_event(fmt, 'node', {'node': payload, 'status': 'done'})
+                    elif event == 'ledger':
+                        yield encode_event(fmt, 'ledger', payload)
+                    else:
+                        content = payload
+            except Exception as e:
+                yield encode_event(fmt, 'error', {'error': f'Error processing message: {str(e)}'})
+                return
+            ai_message = {'id': message_id, 'role': 'assistant', 'content': content}
+            await run_in_threadpool(chat_storage.add_message, chat_id, data)
+            await run_in_threadpool(chat_storage.add_message, chat_id, ai_message)
+            turn.reply = ai_message
+        yield encode_event(fmt, 'message', ai_message)
+
+    return TurnStreamingResponse(turn, generate(), media_type=STREAM_MIMETYPES[fmt],
+                                 headers={**CORS_HEADERS, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def send_message(request: Request):
+    """Send a message in a specific chat"""
+    chat_id = request.path_params['chat_id']
+    if await run_in_threadpool(chat_storage.get_summary, chat_id) is None:
+        return reply({'error': 'Chat not found'}, 404)
+
+    data = await request.json()
+    user_message = data.get('content')
+    if not user_message:
+        return reply({'error': 'Message content is required'}, 400)
+
+    if user_message.startswith('/'):
+        if user_message == '/clear':
+            async with turns.submit(chat_id):
+                await run_in_threadpool(chat_storage.clear_chat, chat_id)
+            return reply({'id': str(uuid4()), 'role': 'assistant', 'content': 'Chat history cleared.'})
+        return reply({'id': str(uuid4()), 'role': 'assistant', 'content': 'Command not recognized.'})
+
+    try:
+        turn = turns.submit(chat_id, user_message)
+    except DuplicateTurn as e:
+        return reply({'error': str(e)}, 409)
+
+    user_id = request.headers.get('x-user-id') or data.get('user_id')
+    debug = wants_ledger(data, request.query_params.get('debug'))
+    fmt = stream_format(request, data)
+    if fmt:
+        return await stream_reply(chat_id, user_id, data, user_message, fmt, turn, debug)
+    if turn.coalesced:
+        return reply(await turn.ashared())
+
+    async with turn:
+        try:
+            response = await get_workflow().ainvoke(user_message, thread_id=chat_id, user_id=user_id, debug=debug)
+        except CheckpointConflict:
+            # Another worker kept winning the race for this chat's checkpoint
+            return reply({'error': 'The chat was updated by another request, please retry'}, 409)
+        ai_message = {
+            'id': str(uuid4()),
+            'role': 'assistant',
+            'content': response['messages'][-1].content
+        }
+        await run_in_threadpool(chat_storage.add_message, chat_id, data)
+        await run_in_threadpool(chat_storage.add_message, chat_id, ai_message)
+        turn.reply = ai_message
+    return reply({**ai_message, 'ledger': response['ledger']} if debug else ai_message)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    configure_logging()
+    yield
+
+
+app = Starlette(routes=[
+    Route('/chats/{chat_id}/messages', send_message, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(flask_app.app)),
+], lifespan=lifespan)
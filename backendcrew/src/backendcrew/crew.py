@@ -2,11 +2,8 @@ from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 
 # from tools.CalenderTool import CustomCalenderTool
-from langchain_community.tools import DuckDuckGoSearchRun
-
-from dotenv import load_dotenv, find_dotenv
-
-load_dotenv(find_dotenv())
+from .tools.DeadlineTool import DeadlineTool
+from .tools.SearchTool import SearchTool
 
 
 @CrewBase
@@ -57,7 +54,7 @@ class backendcrewCrew:
     def misc_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['misc_agent'],
-            tools=[DuckDuckGoSearchRun()],  # Web search tool for handling general queries
+            tools=[SearchTool(), DeadlineTool()],  # Web search and the student's deadlines
             llm=self.llm,
             verbose=True
         )
@@ -92,6 +89,20 @@ class backendcrewCrew:
             config=self.tasks_config['miscellaneous_task_handling'],
         )
 
+    @crew
+    def fast_crew(self) -> Crew:
+        """Sequential crew of the worker tasks only, skipping the manager agent's round trip.
+
+        Only equivalent to crew() when a single worker agent is configured.
+        """
+        return Crew(
+            agents=self.agents,
+            tasks=[t for t in self.tasks if t.agent is not None],  # route_query needs the manager
+            process=Process.sequential,
+            verbose=False,
+        )
+
+    # Defined last: the method name shadows the @crew decorator for the rest of the class body
     @crew
     def crew(self) -> Crew:
         """Creates the StudyTracker crew"""
@@ -107,6 +118,10 @@ class backendcrewCrew:
 
 
 if __name__ == '__main__':
+    # The app loads .env once at startup (v1.graph); run standalone, load it here
+    from dotenv import load_dotenv, find_dotenv
+
+    load_dotenv(find_dotenv())
     crew = backendcrewCrew().crew()
     response = crew.kickoff(inputs={'query': input("Query:")})
     # response = crew.manager_agent.execute_task(crew.tasks[0], context=input("Query:"))
@@ -0,0 +1,65 @@
+from queue import Queue
+from threading import Lock
+from typing import Optional
+
+from crewai import Crew
+
+from .crew import backendcrewCrew
+from .tools.DeadlineTool import DeadlineTool
+
+
+def worker_agents(crew_class) -> int:
+    """The @agent methods a CrewBase class declares, counted without building any agent."""
+    return sum(1 for method in vars(crew_class).values() if getattr(method, "is_agent", False))
+
+
+class CrewPool:
+    """Crews built once up front and checked out by one request at a time.
+
+    A Crew keeps per-run state while it executes, so each concurrent kickoff gets its own
+    instance; the pool size bounds how many can run at once.
+    """
+
+    def __init__(self, size: int = 2, fast_path: bool = True):
+        self.size = size
+        # One worker agent: the hierarchical manager can only ever delegate to it
+        self.fast_path = fast_path and worker_agents(backendcrewCrew) == 1
+        self._idle: "Queue[Crew]" = Queue()
+        for _ in range(size):
+            self._idle.put(self.build())
+
+    def build(self) -> Crew:
+        crew_base = backendcrewCrew()
+        return crew_base.fast_crew() if self.fast_path else crew_base.crew()
+
+    @staticmethod
+    def bind_user(crew: Crew, user_id: Optional[str]) -> None:
+        """Point the crew's per-user tools at ``user_id`` (None: nobody)."""
+        for crew_agent in crew.agents:
+            for tool in crew_agent.tools or ():
+                if isinstance(tool, DeadlineTool):
+                    tool.user_id = user_id
+
+    def kickoff(self, inputs: dict, user_id: str = None):
+        """Run a checked-out crew for ``user_id``, the caller's own user; tools only see that user's data."""
+        crew = self._idle.get()
+        try:
+            self.bind_user(crew, user_id)
+            return crew.kickoff(inputs=inputs)
+        finally:
+            self.bind_user(crew, None)
+            self._idle.put(crew)
+
+
+_pool: CrewPool = None
+_pool_lock = Lock()
+
+
+def get_pool(size: int = 2) -> CrewPool:
+    """Return the process-wide CrewPool, building its crews on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CrewPool(size)
+    return _pool
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from crewai.tools import BaseTool
+
+
+class DeadlineTool(BaseTool):
+    name: str = "Deadline Tool"
+    description: str = (
+        "This tool returns the student's upcoming task deadlines, soonest first. It needs no"
+        " argument; it always answers for the student you are helping."
+    )
+    limit: int = 5
+    # Bound by CrewPool.kickoff to the user of the turn; never taken from the model's argument
+    user_id: Optional[str] = None
+
+    def _run(self, argument: str = "") -> str:
+        if not self.user_id:
+            return "The student isn't signed in, so their deadlines aren't available."
+        # Top-k read off the analytics deadline index; no scan of the student's tasks
+        from analytics import get_performance_engine
+
+        deadlines = get_performance_engine().upcoming_deadlines(self.user_id, self.limit)
+        if not deadlines:
+            return "No upcoming deadlines."
+        return "\n".join(f"{d['due']}: {d['title']} ({d['subject']})" for d in deadlines)
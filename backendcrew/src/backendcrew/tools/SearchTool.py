@@ -0,0 +1,15 @@
+from crewai.tools import BaseTool
+
+
+class SearchTool(BaseTool):
+    """DuckDuckGo web search as a crewai tool; crewai rejects langchain tools in Agent(tools=...)."""
+    name: str = "Web Search"
+    description: str = (
+        "This tool searches the web with DuckDuckGo and returns the top results. The argument"
+        " passed is the search query."
+    )
+
+    def _run(self, argument: str) -> str:
+        from langchain_community.tools import DuckDuckGoSearchRun
+
+        return DuckDuckGoSearchRun().run(argument)
@@ -0,0 +1,140 @@
+"""Streak and deadline index check at 100k events per synthetic user.
+
+    python -m benchmarks.analytics_index [--events 100000] [--users 2] [--store memory://]
+
+Ingests randomised study sessions (with some backfilled out of order), task creations,
+reschedules and completions, and grades; then checks the incrementally maintained streak
+and top-k deadlines against a brute-force recount of the raw events, and against
+PerformanceEngine.rebuild. Exits non-zero on any mismatch. Reports the per-event ingest
+cost early and late in the run (flat when updates are O(1)) and the dashboard read
+latency next to a brute-force scan.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, print_table
+
+TOP_K = 5
+
+
+def synthetic_events(user_id: str, count: int, today: date, rng: random.Random):
+    """Yield ``count`` events whose study days run up to ``today``."""
+    # ~0.6 sessions per event, advancing the day every ~3 sessions by 1.6 days on average
+    day = today - timedelta(days=int(count * 0.6 / 3 * 1.6))
+    open_tasks = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.6 or i >= count - 3:
+            # Mostly consecutive days with the occasional break; ~1% are backfilled
+            if rng.random() < 0.3:
+                day = min(today, day + timedelta(days=rng.choice((1, 1, 1, 2, 3))))
+            when = day - timedelta(days=rng.randint(1, 60)) if rng.random() < 0.01 else day
+            if i >= count - 3:
+                when = today - timedelta(days=count - 1 - i)  # end on a live streak
+            yield {"type": "study_session", "user_id": user_id, "subject": rng.choice(("Math", "Art", "Biology")),
+                   "start": when.isoformat() + "T18:00", "minutes": rng.randint(10, 120), "focus": rng.randint(40, 100)}
+        elif roll < 0.85 or not open_tasks:
+            task_id = open_tasks[rng.randrange(len(open_tasks))] if open_tasks and rng.random() < 0.1 \
+                else f"t{i}"
+            if task_id not in open_tasks:
+                open_tasks.append(task_id)
+            yield {"type": "task", "user_id": user_id, "task_id": task_id, "title": f"Task {task_id}",
+                   "due": (today + timedelta(days=rng.randint(-30, 365))).isoformat()}
+        elif roll < 0.95:
+            task_id = open_tasks.pop(rng.randrange(len(open_tasks)))
+            yield {"type": "task", "user_id": user_id, "task_id": task_id, "status": "completed"}
+        else:
+            yield {"type": "grade", "user_id": user_id, "subject": "Math", "score": rng.randint(50, 100)}
+
+
+def brute_force(events, today: date):
+    """Streak and top-k deadlines by scanning every event, as the dashboard would without the index."""
+    days = sorted({e["day"] for e in events if e["type"] == "study_session"})
+    current = longest = run = 0
+    for prev, day in zip([None] + days, days):
+        run = run + 1 if prev and (date.fromisoformat(day) - date.fromisoformat(prev)).days == 1 else 1
+        longest = max(longest, run)
+    current = run if days and days[-1] >= (today - timedelta(days=1)).isoformat() else 0
+    due = {}
+    for e in events:
+        if e["type"] != "task":
+            continue
+        if e["status"] == "completed":
+            due.pop(e["task_id"], None)
+        elif e.get("due"):
+            due[e["task_id"]] = e["due"]
+    upcoming = sorted((d, t) for t, d in due.items() if d >= today.isoformat())[:TOP_K]
+    return current, longest, [t for _, t in upcoming]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100000, help="events per user")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--store", default="memory://", help="ANALYTICS_STORE url")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from analytics import PerformanceEngine, get_analytics_store
+    from analytics.events import normalize
+
+    engine = PerformanceEngine(get_analytics_store(args.store))
+    rng = random.Random(args.seed)
+    today = date.today()
+    failures = []
+    rows = []
+    for n in range(args.users):
+        user_id = f"synthetic-{n}"
+        events = [normalize(e) for e in synthetic_events(user_id, args.events, today, rng)]
+        per_event = []
+        for start in range(0, len(events), args.batch):
+            batch = events[start:start + args.batch]
+            t0 = time.perf_counter()
+            engine.ingest(batch)
+            per_event.append((time.perf_counter() - t0) / len(batch))
+        tenth = max(1, len(per_event) // 10)
+
+        expected_current, expected_longest, expected_tasks = brute_force(events, today)
+        streak = engine.store.streak(user_id)
+        dashboard = engine.dashboard(user_id, today)
+        got_tasks = [d["task_id"] for d in engine.upcoming_deadlines(user_id, TOP_K, today)]
+        if (dashboard["streak"], streak["longest"]) != (expected_current, expected_longest):
+            failures.append(f"{user_id}: streak {dashboard['streak']}/{streak['longest']} "
+                            f"!= {expected_current}/{expected_longest}")
+        if got_tasks != expected_tasks:
+            failures.append(f"{user_id}: deadlines {got_tasks} != {expected_tasks}")
+
+        engine.rebuild(user_id)
+        if engine.dashboard(user_id, today) != dashboard or engine.store.streak(user_id) != streak:
+            failures.append(f"{user_id}: rebuild disagrees with the incremental index")
+
+        reads, scans = [], []
+        for _ in range(50):
+            t0 = time.perf_counter()
+            engine.dashboard(user_id, today)
+            reads.append(time.perf_counter() - t0)
+        for _ in range(3):
+            t0 = time.perf_counter()
+            brute_force(list(engine.store.events(user_id)), today)
+            scans.append(time.perf_counter() - t0)
+        rows.append((user_id, len(events), expected_current, expected_longest,
+                     f"{sum(per_event[:tenth]) / tenth * 1e6:.1f}",
+                     f"{sum(per_event[-tenth:]) / tenth * 1e6:.1f}",
+                     f"{percentile(reads, 0.5) * 1e3:.2f}",
+                     f"{percentile(scans, 0.5) * 1e3:.1f}"))
+
+    print("store:", args.store)
+    print_table(("user", "events", "streak", "longest", "first 10% us/event", "last 10% us/event",
+                 "dashboard p50 ms", "full scan p50 ms"), rows)
+    if failures:
+        print("\n".join(["MISMATCH"] + failures))
+        sys.exit(1)
+    print("index matches brute force and rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Concurrent-chat throughput of the sync (Flask/WSGI) and async (ASGI) serving modes.
+
+    python -m benchmarks.async_load [--chats 50] [--turns 4] [--latency 0.3] [--sync-workers 1]
+
+Both modes run in-process against the fake chat model. --sync-workers is the number of
+sync worker threads (one per gunicorn sync worker); the async mode uses a single event loop.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("CHAT_STORE", "memory://")
+
+from agent.fake_llm import FakeChatModel
+from benchmarks.common import percentile, print_table
+import v1.graph
+from v1.graph import WorkFlow
+from v1.nodes import Nodes
+
+
+def summarize(mode, latencies, elapsed):
+    return (mode, len(latencies), f"{len(latencies) / elapsed:.1f}",
+            f"{percentile(latencies, 0.5) * 1000:.0f}", f"{percentile(latencies, 0.95) * 1000:.0f}")
+
+
+def run_sync(flask_app, chat_ids, turns, workers):
+    def one_chat(chat_id):
+        client = flask_app.app.test_client()
+        latencies = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            client.post(f'/chats/{chat_id}/messages', json={'role': 'user', 'content': f'question {turn}'})
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = [lat for chat in pool.map(one_chat, chat_ids) for lat in chat]
+    return summarize(f"sync x{workers}", latencies, time.perf_counter() - start)
+
+
+async def run_async(asgi_app, chat_ids, turns):
+    import httpx
+
+    async def one_chat(client, chat_id):
+        latencies = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            await client.post(f'/chats/{chat_id}/messages', json={'role': 'user', 'content': f'question {turn}'})
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    transport = httpx.ASGITransport(app=asgi_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        chats = await asyncio.gather(*(one_chat(client, chat_id) for chat_id in chat_ids))
+    latencies = [lat for chat in chats for lat in chat]
+    return summarize("async", latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50, help="concurrent chats")
+    parser.add_argument("--turns", type=int, default=4, help="messages per chat")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency in seconds")
+    parser.add_argument("--sync-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    v1.graph._workflow = WorkFlow(Nodes(chat=FakeChatModel(latency=args.latency)))
+    import flask_app
+    import asgi_app
+
+    chat_ids = [flask_app.chat_storage.create_chat(f"bench {i}")['id'] for i in range(args.chats)]
+    rows = [run_sync(flask_app, chat_ids, args.turns, args.sync_workers),
+            asyncio.run(run_async(asgi_app, chat_ids, args.turns))]
+    print_table(("mode", "requests", "req/s", "p50 ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
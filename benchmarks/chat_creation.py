@@ -0,0 +1,55 @@
+"""Chat-creation latency and resident memory as the number of chats grows.
+
+    python -m benchmarks.chat_creation [--chats 10000] [--legacy]
+
+`--legacy` reproduces the old behaviour of compiling a WorkFlow (graph + model client)
+for every chat, for comparison with the shared workflow.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # clients are built but never called
+
+from benchmarks.common import percentile, print_table, rss_mb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=10000)
+    parser.add_argument("--legacy", action="store_true", help="build one WorkFlow per chat")
+    parser.add_argument("--store", default="memory://", help="CHAT_STORE url to create chats in")
+    args = parser.parse_args()
+
+    from flask_app import ChatStorage
+    from storage import get_store
+    from v1.graph import WorkFlow
+
+    storage = ChatStorage(get_store(args.store))
+    workflows = {}
+    checkpoints = sorted({n for n in (1, 10, 100, 1000, 10000, 100000) if n <= args.chats} | {args.chats})
+
+    rows = []
+    samples = []
+    base_rss = rss_mb()
+    created = 0
+    for checkpoint in checkpoints:
+        while created < checkpoint:
+            start = time.perf_counter()
+            chat = storage.create_chat(f"Chat {created}")
+            if args.legacy:
+                workflows[chat['id']] = WorkFlow()
+            samples.append(time.perf_counter() - start)
+            created += 1
+        window = samples[-max(1, checkpoint // 10):]
+        rows.append((checkpoint,
+                     f"{percentile(window, 0.5) * 1e6:.1f}",
+                     f"{percentile(window, 0.99) * 1e6:.1f}",
+                     f"{rss_mb() - base_rss:.1f}"))
+
+    print("mode:", "legacy (WorkFlow per chat)" if args.legacy else "shared workflow")
+    print_table(("chats", "p50 us", "p99 us", "rss delta MB"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Bulk import throughput and streaming export memory.
+
+    python -m benchmarks.chat_export [--chats 200] [--messages 1000] [--store sqlite:///bench_chats.db]
+
+Imports the chats through POST /chats/import in one request, then streams GET /chats/export
+and reports the peak RSS growth while reading it; with paged reads it stays flat as the
+history grows.
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # clients are built but never called
+
+from benchmarks.common import print_table, rss_mb
+
+
+def ndjson(chats: int, messages: int):
+    for c in range(chats):
+        yield json.dumps({"type": "chat", "id": f"bench-{c}", "title": f"Chat {c}"}) + "\n"
+        for m in range(messages):
+            role = "user" if m % 2 == 0 else "assistant"
+            yield json.dumps({"type": "message", "role": role, "content": f"message {m} " + "x" * 200}) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=1000, help="messages per chat")
+    parser.add_argument("--store", default="sqlite:///bench_chats.db", help="CHAT_STORE url")
+    args = parser.parse_args()
+
+    import flask_app
+    from storage import get_store
+
+    flask_app.chat_storage = flask_app.ChatStorage(get_store(args.store))
+    client = flask_app.app.test_client()
+    total = args.chats * args.messages
+
+    body = "".join(ndjson(args.chats, args.messages)).encode()
+    start = time.perf_counter()
+    response = client.post("/chats/import", data=body, content_type="application/x-ndjson")
+    import_seconds = time.perf_counter() - start
+    assert response.status_code == 200, response.json
+    del body
+
+    base_rss = peak_rss = rss_mb()
+    lines = 0
+    start = time.perf_counter()
+    response = client.get("/chats/export", buffered=False)
+    for chunk in response.response:
+        lines += chunk.count(b"\n") if isinstance(chunk, bytes) else chunk.count("\n")
+        if lines % 10000 == 0:
+            peak_rss = max(peak_rss, rss_mb())
+    export_seconds = time.perf_counter() - start
+    response.close()
+
+    print("store:", args.store)
+    print_table(("messages", "import msg/s", "export lines/s", "export lines", "export rss growth MB"),
+                [(total, f"{total / import_seconds:.0f}", f"{lines / export_seconds:.0f}", lines,
+                  f"{peak_rss - base_rss:.1f}")])
+
+
+if __name__ == "__main__":
+    main()
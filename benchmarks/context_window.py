@@ -0,0 +1,52 @@
+"""Prompt size and latency against chat length for each context strategy.
+
+    python -m benchmarks.context_window [--turns 200] [--ms-per-token 0.05]
+
+Uses the fake chat model, whose latency grows with prompt size like a hosted model's
+prefill does, so the numbers isolate the effect of the context strategy.
+"""
+import argparse
+import time
+
+from agent.fake_llm import FakeChatModel
+from benchmarks.common import print_table
+from v1.context import ContextManager, KeepAll, RollingSummary, SlidingWindow, TokenBudget
+from v1.graph import WorkFlow
+from v1.nodes import Nodes
+from v1.router import StaticRouter, RouterChain
+
+REPLY = ("Photosynthesis turns light, water and carbon dioxide into glucose and oxygen. "
+         "It happens in the chloroplasts, mostly in the leaves. ") * 3
+QUESTION = "Can you explain the next part of the chapter in a bit more detail, with an example?"
+
+
+def run(strategy, turns: int, ms_per_token: float, report_at):
+    model = FakeChatModel(responses=[REPLY], latency=0.02, seconds_per_input_token=ms_per_token / 1000,
+                          rules=[("running summary", "The student is revising photosynthesis.")])
+    nodes = Nodes(chat=model, router=RouterChain([StaticRouter()]), context=ContextManager(strategy))
+    workflow = WorkFlow(nodes)
+    rows = []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        workflow.invoke(f"{QUESTION} ({turn})", thread_id="bench")
+        elapsed = time.perf_counter() - start
+        if turn in report_at:
+            rows.append((type(strategy).__name__, turn, model.last_input_tokens, f"{elapsed * 1000:.1f}"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--ms-per-token", type=float, default=0.05, help="fake prefill cost per prompt token")
+    args = parser.parse_args()
+
+    report_at = {t for t in (1, 10, 50, 100, 200, 500) if t <= args.turns} | {args.turns}
+    rows = []
+    for strategy in (KeepAll(), SlidingWindow(6), TokenBudget(1500), RollingSummary(4)):
+        rows += run(strategy, args.turns, args.ms_per_token, report_at)
+    print_table(("strategy", "turn", "prompt tokens", "turn ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Crew construction cost and kickoff latency: hierarchical manager vs sequential fast path.
+
+    python -m benchmarks.crew_kickoff [--runs 5] [--query "What's 17 * 23?"]
+
+Kickoffs call the crew's real LLM (GROQ_API_KEY must be set or in .env), so run it a few times
+and compare medians rather than single numbers.
+"""
+import argparse
+import time
+
+from benchmarks.common import percentile, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--query", default="What's 17 * 23?")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from backendcrew.src.backendcrew.crew import backendcrewCrew
+
+    build = {"hierarchical": [], "fast": []}
+    kickoff = {"hierarchical": [], "fast": []}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        hierarchical = backendcrewCrew().crew()
+        build["hierarchical"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        fast = backendcrewCrew().fast_crew()
+        build["fast"].append(time.perf_counter() - start)
+
+        for name, crew in (("hierarchical", hierarchical), ("fast", fast)):
+            start = time.perf_counter()
+            crew.kickoff(inputs={'query': args.query})
+            kickoff[name].append(time.perf_counter() - start)
+
+    rows = [(name,
+             f"{percentile(build[name], 0.5) * 1000:.1f}",
+             f"{percentile(kickoff[name], 0.5):.2f}",
+             f"{percentile(kickoff[name], 0.95):.2f}")
+            for name in ("hierarchical", "fast")]
+    print(f"{args.runs} runs; a pooled crew skips the build column entirely")
+    print_table(("path", "build ms", "kickoff p50 s", "kickoff p95 s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""HTTP load test of the chat API against the fake chat model, with a stored baseline.
+
+    python -m benchmarks.http_load [--concurrency 16] [--requests 2000] [--latency 0.05]
+    python -m benchmarks.http_load --save-baseline      # record this machine's numbers
+    python -m benchmarks.http_load --url http://localhost:8000
+
+By default flask_app runs in-process, driven by --concurrency client threads through the
+WSGI test client. The model is `fake/...` via V1_CHAT_MODEL, so a run costs nothing and
+is deterministic. --url targets a running server instead (start it with the same
+V1_CHAT_MODEL); memory is then sampled for this process only.
+
+Requests are drawn from --mix (weights per endpoint) with a fixed --seed. The report
+gives req/s and p50/p95/p99 per endpoint plus RSS over time. If --baseline exists and was
+recorded with the same settings, a slower p50/p95/p99, lower throughput or higher peak RSS
+beyond --tolerance is a regression, and the command exits with status 1.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentile, print_table, rss_mb
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "http_load.json")
+DEFAULT_MIX = "message=6,list_chats=2,create_chat=1,performance=1"
+QUESTIONS = ["What is due this week?", "Explain photosynthesis in simple terms.",
+             "Can you quiz me on chapter 3?", "How should I plan my revision for Friday's exam?"]
+
+
+class InProcessClient:
+    """flask_app through the WSGI test client, one per thread."""
+
+    def __init__(self):
+        import flask_app
+        self.client = flask_app.app.test_client()
+
+    def request(self, method: str, path: str, body: dict = None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class RemoteClient:
+    def __init__(self, url: str):
+        import httpx
+        self.client = httpx.Client(base_url=url, timeout=None)
+
+    def request(self, method: str, path: str, body: dict = None):
+        response = self.client.request(method, path, json=body)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+class MemorySampler(threading.Thread):
+    """Records (seconds since start, RSS MB) every ``interval`` until stopped."""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+        self._began = time.perf_counter()
+
+    def run(self):
+        while True:
+            self.samples.append((time.perf_counter() - self._began, rss_mb()))
+            if self._done.wait(self.interval):
+                break
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.samples.append((time.perf_counter() - self._began, rss_mb()))
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown endpoint {name!r} in --mix; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def create_chat(client, rng, chats):
+    status, chat = client.request("POST", "/chats", {"title": f"load {rng.random():.6f}"})
+    if status == 200:
+        chats.append(chat["id"])
+    return status
+
+
+def message(client, rng, chats):
+    if not chats:
+        return create_chat(client, rng, chats)
+    status, _ = client.request("POST", f"/chats/{rng.choice(chats)}/messages",
+                               {"role": "user", "content": rng.choice(QUESTIONS)})
+    return status
+
+
+def list_chats(client, rng, chats):
+    return client.request("GET", "/chats?limit=50")[0]
+
+
+def performance(client, rng, chats):
+    return client.request("GET", f"/performance?user_id=load-{rng.randrange(8)}")[0]
+
+
+OPERATIONS = {"create_chat": create_chat, "message": message, "list_chats": list_chats,
+              "performance": performance}
+
+
+def worker(index: int, args, mix: dict, deadline: float, quota, results, lock):
+    rng = random.Random(args.seed + index)
+    client = RemoteClient(args.url) if args.url else InProcessClient()
+    chats = []
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        with lock:
+            if quota[0] <= 0:
+                return
+            quota[0] -= 1
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status = OPERATIONS[name](client, rng, chats)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            results[name].append((elapsed, status == 200))
+
+
+def run(args, mix: dict):
+    results = defaultdict(list)
+    lock = threading.Lock()
+    quota = [args.requests or float("inf")]
+    if not args.url:
+        # Count the app's import toward the starting RSS, not the load
+        import flask_app  # noqa: F401
+    sampler = MemorySampler(args.sample_interval)
+    sampler.start()
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else float("inf")
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for future in [pool.submit(worker, i, args, mix, deadline, quota, results, lock)
+                       for i in range(args.concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    return results, elapsed, sampler.samples
+
+
+def summarize(results: dict, elapsed: float, samples: list) -> dict:
+    endpoints = {}
+    everything = []
+    for name, calls in sorted(results.items()):
+        latencies = [seconds for seconds, _ in calls]
+        everything += latencies
+        endpoints[name] = {"requests": len(calls), "errors": sum(not ok for _, ok in calls),
+                           **{f"p{q}_ms": percentile(latencies, q / 100) * 1e3 for q in (50, 95, 99)}}
+    endpoints["all"] = {"requests": len(everything), "errors": sum(e["errors"] for e in endpoints.values()),
+                        **{f"p{q}_ms": percentile(everything, q / 100) * 1e3 for q in (50, 95, 99)}}
+    rss = [mb for _, mb in samples]
+    return {"throughput": len(everything) / elapsed, "seconds": elapsed, "endpoints": endpoints,
+            "rss_start_mb": rss[0], "rss_peak_mb": max(rss), "rss_end_mb": rss[-1]}
+
+
+def report(summary: dict, samples: list, points: int = 8) -> None:
+    print(f"{summary['endpoints']['all']['requests']} requests in {summary['seconds']:.1f}s "
+          f"= {summary['throughput']:.1f} req/s")
+    print_table(("endpoint", "requests", "errors", "p50 ms", "p95 ms", "p99 ms"),
+                [(name, e["requests"], e["errors"], f"{e['p50_ms']:.1f}", f"{e['p95_ms']:.1f}",
+                  f"{e['p99_ms']:.1f}") for name, e in summary["endpoints"].items()])
+    step = max(1, len(samples) // points)
+    shown = samples[::step] + ([samples[-1]] if (len(samples) - 1) % step else [])
+    print("\nmemory")
+    print_table(("t s", "RSS MB"), [(f"{t:.1f}", f"{mb:.1f}") for t, mb in shown])
+
+
+def compare(summary: dict, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    """Regressions of ``summary`` against ``baseline`` as human-readable lines."""
+    regressions = []
+    for name, before in baseline["endpoints"].items():
+        now = summary["endpoints"].get(name)
+        if now is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            # The absolute slack keeps sub-millisecond endpoints from failing on noise
+            if now[key] > before[key] * (1 + tolerance) + slack_ms:
+                regressions.append(f"{name} {key[:-3]} {before[key]:.1f} -> {now[key]:.1f} ms")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name} errors {before['errors']} -> {now['errors']}")
+    if summary["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput']:.1f} -> {summary['throughput']:.1f} req/s")
+    if summary["rss_peak_mb"] > baseline["rss_peak_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['rss_peak_mb']:.1f} -> {summary['rss_peak_mb']:.1f} MB")
+    return regressions
+
+
+def settings(args) -> dict:
+    """The options a baseline is only comparable under."""
+    return {"url": args.url, "concurrency": args.concurrency, "requests": args.requests,
+            "duration": args.duration, "mix": args.mix, "seed": args.seed, "model": os.environ["V1_CHAT_MODEL"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="load a running server instead of flask_app in-process")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (0 = until --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight, comma-separated")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute slowdown per percentile")
+    args = parser.parse_args()
+    if not args.requests:
+        args.duration = args.duration or 30
+
+    # In-process runs keep everything in memory and never reach a real provider
+    os.environ.setdefault("V1_CHAT_MODEL", f"fake/load?latency={args.latency}"
+                                           f"&tokens_per_second={args.tokens_per_second}")
+    for name in ("CHAT_STORE", "ANALYTICS_STORE"):
+        os.environ.setdefault(name, "memory://")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    # Request logs would interleave with the report; benchmarks.logging_overhead measures them
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    mix = parse_mix(args.mix)
+    results, elapsed, samples = run(args, mix)
+    summary = summarize(results, elapsed, samples)
+    report(summary, samples)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings(args), **summary}, f, indent=2)
+        print(f"\nsaved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}; record one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != json.loads(json.dumps(settings(args))):
+        print(f"\nbaseline {args.baseline} was recorded with other settings, not comparing:\n"
+              f"  {baseline['settings']}")
+        return
+    regressions = compare(summary, baseline, args.tolerance, args.slack_ms)
+    if regressions:
+        print(f"\nREGRESSION against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nwithin {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
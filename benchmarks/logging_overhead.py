@@ -0,0 +1,83 @@
+"""Per-request logging cost on a 1,000-message chat, print() dumps vs structured logging.
+
+    python -m benchmarks.logging_overhead [--messages 1000] [--requests 200] [--console]
+
+`legacy` reproduces the old print() calls: the whole message list on every append and
+the whole chat on every GET. `structured` is the queue-backed logger with payload dumps
+off (the default). Output goes to a temporary file unless --console is given.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # clients are built but never called
+os.environ.setdefault("CHAT_STORE", "memory://")
+
+from benchmarks.common import percentile, print_table
+
+
+def measure(client, storage, chat_id: str, requests: int):
+    gets, appends = [], []
+    message = {"id": "m", "role": "user", "content": "benchmark message " * 10}
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(f"/chats/{chat_id}")
+        gets.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        storage.add_message(chat_id, message)
+        appends.append(time.perf_counter() - start)
+    return gets, appends
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--console", action="store_true", help="write to the real stdout/stderr")
+    args = parser.parse_args()
+
+    sink = sys.stdout if args.console else tempfile.TemporaryFile("w")
+    from v1 import logs
+    logs.configure(stream=sink)
+
+    import flask_app
+    from storage import MemoryChatStore
+
+    store = MemoryChatStore()
+    storage = flask_app.ChatStorage(store)
+    flask_app.chat_storage = storage
+    client = flask_app.app.test_client()
+    chat_id = storage.create_chat("Long chat")["id"]
+    store.add_messages(chat_id, [{"id": str(i), "role": "user" if i % 2 else "assistant",
+                                  "content": f"message {i} " + "lorem ipsum " * 20}
+                                 for i in range(args.messages)])
+
+    rows = []
+    for mode in ("legacy", "structured"):
+        if mode == "legacy":
+            original_payload, original_add = flask_app.log.payload, storage.add_message
+
+            def legacy_add(chat_id, message):
+                original_add(chat_id, message)
+                print(store.messages[chat_id])
+
+            flask_app.log.payload = lambda msg, payload, **fields: print(msg, payload)
+            storage.add_message = legacy_add
+            with contextlib.redirect_stdout(sink):
+                gets, appends = measure(client, storage, chat_id, args.requests)
+            flask_app.log.payload, storage.add_message = original_payload, original_add
+        else:
+            gets, appends = measure(client, storage, chat_id, args.requests)
+        rows.append((mode, f"{percentile(gets, 0.5) * 1e3:.3f}", f"{percentile(gets, 0.99) * 1e3:.3f}",
+                     f"{percentile(appends, 0.5) * 1e3:.3f}", f"{percentile(appends, 0.99) * 1e3:.3f}"))
+
+    logs.shutdown()
+    print(f"chat of {args.messages}+ messages, {args.requests} requests per mode")
+    print_table(("mode", "GET chat p50 ms", "GET chat p99 ms", "append p50 ms", "append p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Latency and error rate of one flaky provider vs a ModelPool in front of two.
+
+    python -m benchmarks.model_pool [--calls 300] [--concurrency 8] [--hedge-after 0.08]
+
+Providers are fake models: each call takes ``--latency`` seconds, a ``--spike-rate``
+fraction take ``--spike`` seconds instead, and a ``--failure-rate`` fraction raise.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import percentile, print_table
+
+
+def flaky_model(latency: float, spike: float, spike_rate: float, failure_rate: float):
+    from agent.fake_llm import FakeChatModel
+
+    class FlakyModel(FakeChatModel):
+        def _prepare(self, messages):
+            reply, delay, usage = super()._prepare(messages)
+            return reply, (spike if random.random() < spike_rate else delay), usage
+
+    return FlakyModel(latency=latency, failure_rate=failure_rate)
+
+
+async def run(model, calls: int, concurrency: int):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await model.ainvoke("benchmark")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--spike", type=float, default=0.5)
+    parser.add_argument("--spike-rate", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--hedge-after", type=float, default=0.08)
+    args = parser.parse_args()
+    random.seed(7)
+
+    from agent.model_pool import ModelPool
+
+    def provider(name):
+        return flaky_model(args.latency, args.spike, args.spike_rate, args.failure_rate)
+
+    setups = {
+        "single provider": provider("a"),
+        "pool, fallback": ModelPool.from_spec("fake/a|fake/b", provider, hedge_after=0),
+        "pool, fallback + hedging": ModelPool.from_spec("fake/a|fake/b", provider, hedge_after=args.hedge_after),
+    }
+    rows = []
+    for name, model in setups.items():
+        latencies, errors = asyncio.run(run(model, args.calls, args.concurrency))
+        rows.append((name, f"{percentile(latencies, 0.5) * 1e3:.1f}", f"{percentile(latencies, 0.95) * 1e3:.1f}",
+                     f"{percentile(latencies, 0.99) * 1e3:.1f}", f"{errors / args.calls:.1%}"))
+    print(f"{args.calls} calls, {args.concurrency} concurrent; per provider {args.failure_rate:.0%} errors, "
+          f"{args.spike_rate:.0%} spikes of {args.spike * 1e3:.0f} ms")
+    print_table(("setup", "p50 ms", "p95 ms", "p99 ms", "errors"), rows)
+
+
+if __name__ == "__main__":
+    main()
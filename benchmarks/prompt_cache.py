@@ -0,0 +1,98 @@
+"""Cached-token ratio and time to first token of the old and new prompt layouts.
+
+    python -m benchmarks.prompt_cache [--turns 30] [--ms-per-token 0.2] [--window 6] [--step 3]
+
+The fake model mimics two kinds of provider prompt cache. "automatic" (Groq, OpenAI)
+reuses any previously seen prefix. "breakpoint" (Anthropic) only caches prefixes that
+end at a cache_control marker. Uncached prompt tokens cost --ms-per-token of prefill
+before the first token; cached ones are free. "legacy" is the per-call layout from
+before v1.prompt_cache: no prefix/suffix split, no markers, and the router's retry
+count interpolated into its system prompt. A sliding window that drops one turn per
+turn changes the history prefix every turn; "window:W:S" drops S turns at a time.
+"""
+import argparse
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from agent.fake_llm import FakeChatModel
+from benchmarks.common import percentile, print_table
+from langgraph.checkpoint.memory import MemorySaver
+from v1.context import ContextManager, SlidingWindow
+from v1.graph import WorkFlow
+from v1.nodes import Nodes
+from v1.router import RouterChain
+
+LEGACY_ROUTER = ChatPromptTemplate.from_messages([
+    ("system",
+     "Decide if we need to consult the CrewAI agents for more information or if we can respond directly."
+     "Output ONLY 'query' or 'respond'. Invalid decisions so far: {invalid_count}. More than 10 will result in termination."),
+    ("human", "{input}"),
+    ("system", "Context retrieved from CrewAI: {database_agent_response}. Query again?"),
+])
+
+LEGACY_MAIN = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are a helpful assistant for a student. Respond based on the conversation and any information from the CrewAI agents."),
+    ("system", "Summary of the earlier conversation: {summary}"),
+    MessagesPlaceholder("history"),
+    ("human", "{input}"),
+    ("system", "Information provided CrewAI Agent: {database_agent_response}\nResponse:"),
+])
+
+REPLY = ("Photosynthesis turns light, water and carbon dioxide into glucose and oxygen in the chloroplasts. "
+         "The light reactions make ATP and NADPH, which the Calvin cycle spends to fix carbon. ") * 4
+
+
+class BreakpointModel(FakeChatModel):
+    """Fake provider that, like Anthropic, only caches prefixes ending at a cache_control marker."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "anthropic-fake"
+
+    def _cached_tokens(self, messages):
+        marked = [i for i, m in enumerate(messages)
+                  if isinstance(m.content, list) and any("cache_control" in block for block in m.content)]
+        if not marked:
+            return 0
+        cut = marked[-1] + 1
+        return super()._cached_tokens(messages[:cut])
+
+
+def run(model_class, layout: str, window: SlidingWindow, turns: int, ms_per_token: float):
+    model = model_class(responses=[REPLY], seconds_per_input_token=ms_per_token / 1000, cache_prefixes=1024)
+    # No cheap routers, so every turn makes the LLM router call as well as the reply
+    nodes = Nodes(chat=model, router=RouterChain([]), context=ContextManager(window))
+    if layout == "legacy":
+        nodes.router_chain, nodes.main_chain = LEGACY_ROUTER | model, LEGACY_MAIN | model
+    workflow = WorkFlow(nodes, MemorySaver())
+    ratios, first_token = [], []
+    for turn in range(turns):
+        ledger = workflow.invoke(f"Can you go over part {turn} of the chapter again?", "bench", debug=True)["ledger"]
+        ratios.append(ledger["cached_ratio"])
+        # The fake streams nothing, so a reply's latency is its prefill: the time to first token
+        first_token += [c["seconds"] for c in ledger["calls"] if c["node"] == "main_conversation"]
+    return ratios, first_token
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--ms-per-token", type=float, default=0.2, help="prefill cost of an uncached prompt token")
+    parser.add_argument("--window", type=int, default=6)
+    parser.add_argument("--step", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for cache, model_class in (("automatic", FakeChatModel), ("breakpoint", BreakpointModel)):
+        for layout, step in (("legacy", 1), ("prefix", 1), ("prefix", args.step)):
+            window = SlidingWindow(args.window, step)
+            ratios, first_token = run(model_class, layout, window, args.turns, args.ms_per_token)
+            rows.append((cache, layout, f"window:{args.window}:{step}", f"{sum(ratios) / len(ratios):.0%}",
+                         f"{percentile(first_token, 0.5) * 1e3:.1f}", f"{percentile(first_token, 0.95) * 1e3:.1f}"))
+    print(f"{args.turns} turns of one chat, {args.ms_per_token} ms prefill per uncached token")
+    print_table(("provider cache", "layout", "context", "cached tokens", "reply TTFT p50 ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""A burst of chat and background calls against a provider that returns 429s over its RPM.
+
+    python -m benchmarks.rate_limit [--rpm 1200] [--available 20] [--chat 60] [--background 60]
+
+`unlimited` sends everything at once, as before. `limited` goes through the shared
+RateLimiter with chat calls at interactive priority and the rest in the background.
+It then shows how many upstream calls a burst of identical prompts costs with coalescing.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import percentile, print_table
+
+
+class TooManyRequests(Exception):
+    pass
+
+
+def provider(rpm: int, latency: float, available: float):
+    """Fake model behind a provider-side token bucket of ``rpm`` with ``available`` requests left."""
+    from agent.fake_llm import FakeChatModel
+
+    bucket = {"tokens": available, "at": time.monotonic()}
+
+    class Provider(FakeChatModel):
+        def _prepare(self, messages):
+            now = time.monotonic()
+            bucket["tokens"] = min(rpm, bucket["tokens"] + (now - bucket["at"]) * rpm / 60)
+            bucket["at"] = now
+            if bucket["tokens"] < 1:
+                raise TooManyRequests("429")
+            bucket["tokens"] -= 1
+            return super()._prepare(messages)
+
+    return Provider(latency=latency)
+
+
+async def burst(model, chat: int, background_calls: int):
+    from agent.rate_limit import background
+
+    results = {"chat": [], "background": []}
+    errors = 0
+
+    async def one(kind: str, i: int):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            if kind == "background":
+                with background():
+                    await model.ainvoke(f"{kind} {i}")
+            else:
+                await model.ainvoke(f"{kind} {i}")
+        except TooManyRequests:
+            errors += 1
+            return
+        results[kind].append(time.perf_counter() - start)
+
+    # Background work is already queued when the chat burst arrives
+    calls = [one("background", i) for i in range(background_calls)] + [one("chat", i) for i in range(chat)]
+    await asyncio.gather(*calls)
+    return results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--available", type=int, default=20)
+    parser.add_argument("--chat", type=int, default=60)
+    parser.add_argument("--background", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    from agent.rate_limit import Coalescer, LimitedChatModel, RateLimiter
+
+    # Both buckets start with --available requests left, as after an earlier burst
+    rows = []
+    for name in ("unlimited", "limited"):
+        model = provider(args.rpm, args.latency, args.available)
+        if name == "limited":
+            limiter = RateLimiter(rpm=args.rpm, name="bench")
+            limiter._requests = args.available
+            model = LimitedChatModel.wrap("bench", model, limiter, None)
+        start = time.perf_counter()
+        results, errors = asyncio.run(burst(model, args.chat, args.background))
+        elapsed = time.perf_counter() - start
+        rows.append((name, errors, f"{percentile(results['chat'], 0.5):.2f}", f"{percentile(results['chat'], 0.95):.2f}",
+                     f"{percentile(results['background'], 0.5):.2f}",
+                     f"{percentile(results['background'], 0.95):.2f}", f"{elapsed:.1f}"))
+    print(f"{args.chat} chat + {args.background} background calls; provider and limiter at {args.rpm}/min, "
+          f"{args.available} requests left")
+    print_table(("setup", "429s", "chat p50 s", "chat p95 s", "bg p50 s", "bg p95 s", "total s"), rows)
+
+    inner = provider(10 ** 6, args.latency, 10 ** 6)
+    for name, coalescer in (("no coalescing", None), ("coalescing", Coalescer())):
+        model = LimitedChatModel.wrap("bench", inner, None, coalescer)
+        before = inner.calls
+
+        async def same():
+            await asyncio.gather(*(model.ainvoke("what's due this week?") for _ in range(50)))
+
+        asyncio.run(same())
+        print(f"50 identical concurrent prompts, {name}: {inner.calls - before} upstream calls")
+
+
+if __name__ == "__main__":
+    main()
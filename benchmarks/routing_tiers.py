@@ -0,0 +1,152 @@
+"""Accuracy and latency of each routing tier on a labelled query set.
+
+    python -m benchmarks.routing_tiers [--models groq/llama-3.1-70b-versatile,llamacpp/qwen2.5-0.5b.gguf]
+    curl -s localhost:5000/chats/export > chats.ndjson
+    python -m benchmarks.routing_tiers --distill groq/llama-3.1-70b-versatile --input chats.ndjson --out labels.jsonl
+
+Cheap routers (keyword, similarity, classifier) may be unsure; "decided" is the share
+they settle and "accuracy" is measured on those. Queries that are also similarity-router
+EXAMPLES are left out, so no tier is scored on what it was built from. The classifier is
+scored with k-fold cross-validation so it never sees its test queries. Each --models
+entry is scored as an LLM router, and the harness also times its query formulation, the
+other small-tier call.
+
+--distill labels the user messages of a GET /chats/export dump (or the "text" of each
+line of a JSONL file) with a model's router decision. The output trains a classifier
+router: V1_ROUTER=keyword,classifier:labels.jsonl.
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from benchmarks.common import percentile, print_table
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "routing_queries.jsonl")
+
+
+def score(route, examples):
+    """(decided share, accuracy on decided, latencies) for a text -> (decision|None, path) function."""
+    decided = correct = 0
+    latencies = []
+    for text, label in examples:
+        start = time.perf_counter()
+        decision, _ = route(text)
+        latencies.append(time.perf_counter() - start)
+        if decision is not None:
+            decided += 1
+            correct += decision == label
+    return decided, correct, latencies
+
+
+def cross_validated(examples, folds: int):
+    from v1.router import ClassifierRouter
+
+    decided = correct = 0
+    latencies = []
+    for k in range(folds):
+        train = [e for i, e in enumerate(examples) if i % folds != k]
+        test = [e for i, e in enumerate(examples) if i % folds == k]
+        router = ClassifierRouter(train)
+        d, c, lat = score(router.route, test)
+        decided, correct = decided + d, correct + c
+        latencies += lat
+    return decided, correct, latencies
+
+
+def llm_router(name: str):
+    from agent.utils import load_chat_model
+    from v1.nodes import ROUTER_PROMPT, parse_decision
+
+    chain = ROUTER_PROMPT | load_chat_model(name)
+
+    def route(text: str):
+        reply = chain.invoke({"input": text, "invalid_count": 0, "database_agent_response": "None."})
+        decision = parse_decision({}, reply.content, retries=0)
+        return (None if decision.get("router_path") == "fallback" else decision["task_decision"]), "llm"
+
+    return route
+
+
+def query_latency(name: str, examples, limit: int = 20):
+    from agent.utils import load_chat_model
+    from v1.nodes import QUERY_PROMPT
+
+    chain = QUERY_PROMPT | load_chat_model(name)
+    latencies = []
+    for text, _ in examples[:limit]:
+        start = time.perf_counter()
+        chain.invoke({"input": text})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def distill_texts(records) -> list:
+    """Distinct user questions from /chats/export records or {"text": ...} lines, in order."""
+    texts = []
+    for record in records:
+        if "text" in record:
+            text = record["text"]
+        elif record.get("type") == "message" and record.get("role") == "user":
+            text = record.get("content") or ""
+        else:
+            continue
+        # Commands such as /clear never reach the router
+        if text.strip() and not text.startswith("/"):
+            texts.append(text)
+    return list(dict.fromkeys(texts))
+
+
+def distill(model: str, source: str, out: str) -> None:
+    route = llm_router(model)
+    with open(source) as f:
+        texts = distill_texts(json.loads(line) for line in f if line.strip())
+    with open(out, "w") as f:
+        for text in texts:
+            decision, _ = route(text)
+            if decision is not None:
+                f.write(json.dumps({"text": text, "label": decision}) + "\n")
+    print(f"labelled {len(texts)} texts with {model} into {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=DATA)
+    parser.add_argument("--models", default="fake/router", help="comma-separated LLM router tiers")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--distill", metavar="MODEL")
+    parser.add_argument("--input")
+    parser.add_argument("--out", default="labels.jsonl")
+    args = parser.parse_args()
+
+    if args.distill:
+        distill(args.distill, args.input or args.data, args.out)
+        return
+
+    from v1.router import EXAMPLES, KeywordRouter, SimilarityRouter, load_labelled, tokenize
+
+    seen = {" ".join(tokenize(text)) for text, _ in EXAMPLES}
+    examples = [e for e in load_labelled(args.data) if " ".join(tokenize(e[0])) not in seen]
+    results = [("keyword", *score(KeywordRouter().route, examples)),
+               ("similarity", *score(SimilarityRouter().route, examples)),
+               (f"classifier ({args.folds}-fold)", *cross_validated(examples, args.folds))]
+    query_rows = []
+    for name in filter(None, (m.strip() for m in args.models.split(","))):
+        results.append((name, *score(llm_router(name), examples)))
+        lat = query_latency(name, examples)
+        query_rows.append((name, f"{percentile(lat, 0.5) * 1e3:.2f}", f"{percentile(lat, 0.95) * 1e3:.2f}"))
+
+    rows = [(name, f"{decided / len(examples):.0%}", f"{correct / decided:.0%}" if decided else "-",
+             f"{percentile(lat, 0.5) * 1e3:.3f}", f"{percentile(lat, 0.95) * 1e3:.3f}")
+            for name, decided, correct, lat in results]
+    print(f"{len(examples)} labelled queries from {args.data}")
+    print_table(("router tier", "decided", "accuracy", "p50 ms", "p95 ms"), rows)
+    if query_rows:
+        print("\nquery formulation")
+        print_table(("model", "p50 ms", "p95 ms"), query_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Cold-start time, import profile and per-worker memory with and without preloading.
+
+    python -m benchmarks.startup [--module flask_app] [--runs 5] [--top 15] [--workers 4]
+
+1. Imports --module in fresh interpreters and reports the median time and RSS, then the
+   same followed by v1.startup.preload() (everything the lazy imports defer).
+2. Profiles that import with ``python -X importtime``: the slowest modules by
+   cumulative time and the total self time per top-level package.
+3. Forks --workers workers the way gunicorn does. "preload" imports and preloads in
+   the master before forking. "per worker" has every worker import the app itself. It
+   reports each worker's RSS, PSS (shared pages split between the processes sharing
+   them) and USS (pages only that worker holds), and the PSS of all processes together.
+   Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from statistics import median
+
+from benchmarks.common import print_table
+
+ENV = {"CHAT_STORE": "memory://", "ANALYTICS_STORE": "memory://", "GROQ_API_KEY": "benchmark",
+       "LOG_LEVEL": "WARNING", "CREWAI_DISABLE_TELEMETRY": "true", "OTEL_SDK_DISABLED": "true"}
+
+TIMED_IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+if {preload}:
+    from v1.startup import preload
+    preload()
+from benchmarks.common import rss_mb
+print(imported, time.perf_counter() - start, rss_mb())
+"""
+
+
+def python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, **ENV, "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(),
+                                                                             os.getenv("PYTHONPATH")]))}
+    return subprocess.run([sys.executable, *flags, "-c", code], env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def cold_start(module: str, runs: int):
+    rows = []
+    for preload in (False, True):
+        samples = [tuple(map(float, python(TIMED_IMPORT.format(module=module, preload=preload))
+                             .stdout.split()[-3:])) for _ in range(runs)]
+        label = f"import {module}" + (" + preload()" if preload else "")
+        rows.append((label, f"{median(s[1] for s in samples):.2f}", f"{median(s[2] for s in samples):.0f}"))
+    return rows
+
+
+def import_profile(module: str, top: int):
+    """(slowest modules, self time per top-level package) from ``-X importtime``, in ms."""
+    modules, packages = [], defaultdict(float)
+    for line in python(f"import {module}", "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules.append((name, int(cumulative_us) / 1000))
+        packages[name.split(".")[0]] += int(self_us) / 1000
+    modules.sort(key=lambda m: -m[1])
+    return modules[:top], sorted(packages.items(), key=lambda p: -p[1])[:top]
+
+
+def smaps(pid: int) -> dict:
+    """RSS, PSS and USS of a process in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def fork_workers(module: str, preload: bool, workers: int) -> None:
+    """Run in a fresh interpreter: fork workers, measure them while all are alive, print JSON."""
+    import importlib
+
+    def load():
+        importlib.import_module(module)
+        from v1.startup import preload as preload_all
+        preload_all()
+
+    if preload:
+        load()
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            if not preload:
+                load()
+            from v1.startup import warm_worker
+            warm_worker()
+            os.write(ready_w, b"r")
+            os.read(go_r, 1)
+            os._exit(0)
+        children.append(pid)
+    for _ in children:
+        os.read(ready_r, 1)
+    stats = {"master": smaps(os.getpid()), "workers": [smaps(pid) for pid in children]}
+    os.write(go_w, b"g" * workers)
+    for pid in children:
+        os.waitpid(pid, 0)
+    print(json.dumps(stats))
+
+
+def worker_memory(module: str, workers: int):
+    rows = []
+    for preload in (True, False):
+        code = f"from benchmarks.startup import fork_workers; fork_workers({module!r}, {preload}, {workers})"
+        stats = json.loads(python(code).stdout.splitlines()[-1])
+        each = stats["workers"]
+        total = stats["master"]["pss"] + sum(w["pss"] for w in each)
+        rows.append(("preload" if preload else "per worker", workers,
+                     f"{median(w['rss'] for w in each):.0f}", f"{median(w['pss'] for w in each):.0f}",
+                     f"{median(w['uss'] for w in each):.0f}", f"{total:.0f}"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="flask_app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print_table(("cold start", "median s", "RSS MB"), cold_start(args.module, args.runs))
+
+    modules, packages = import_profile(args.module, args.top)
+    print(f"\nslowest imports under {args.module}")
+    print_table(("module", "cumulative ms"), [(name, f"{ms:.1f}") for name, ms in modules])
+    print("\nself time by package")
+    print_table(("package", "ms"), [(name, f"{ms:.1f}") for name, ms in packages])
+
+    if sys.platform.startswith("linux"):
+        print(f"\n{args.workers} forked workers (MB; RSS/PSS/USS are per-worker medians)")
+        print_table(("mode", "workers", "RSS", "PSS", "USS", "total PSS"), worker_memory(args.module, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Concurrent sends to the same chats: lost turns, ordering and throughput per scheduling mode.
+
+    python -m benchmarks.turn_order [--chats 8] [--sends 6] [--latency 0.05]
+
+--sends messages per chat arrive concurrently for --chats chats, each handled like
+POST /chats/<id>/messages: a graph turn, then the user message and the reply appended
+to the chat store. "none" runs every send at once, as threaded workers did before
+v1.turns. "global" puts every chat in one lane (a process-wide lock). "per chat" is
+v1.turns.TurnScheduler. A chat is intact when its conversation state holds every turn
+in arrival order and the chat store pairs each question with its own reply.
+
+The second table sends every message twice at once under each duplicate policy.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from agent.fake_llm import FakeChatModel
+from benchmarks.common import percentile, print_table
+from langgraph.checkpoint.memory import MemorySaver
+from storage.memory import MemoryChatStore
+from v1.context import ContextManager, KeepAll
+from v1.graph import WorkFlow
+from v1.nodes import Nodes
+from v1.router import RouterChain, StaticRouter
+from v1.turns import DuplicateTurn, TurnScheduler
+
+
+class Echo(FakeChatModel):
+    """Replies with the question it was asked, so a reply can be matched to its message."""
+
+    def _prepare(self, messages):
+        reply, seconds, usage = super()._prepare(messages)
+        question = next(m.content for m in reversed(messages) if m.type == "human")
+        return f"re: {question}", seconds, usage
+
+
+class Chats:
+    def __init__(self, latency: float, scheduler: TurnScheduler = None, lane: str = None):
+        nodes = Nodes(chat=Echo(latency=latency), router=RouterChain([StaticRouter()]),
+                      context=ContextManager(KeepAll()))
+        self.workflow = WorkFlow(nodes, MemorySaver())
+        self.store = MemoryChatStore()
+        self.scheduler = scheduler
+        self.lane = lane
+        self.arrivals = count()
+        self.arrived = {}
+        self.waits = []
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def create(self, chats: int) -> list:
+        ids = [f"chat-{index}" for index in range(chats)]
+        for chat_id in ids:
+            self.store.create_chat({"id": chat_id, "title": chat_id, "created_at": ""})
+        return ids
+
+    def _turn(self, chat_id: str, content: str) -> dict:
+        with self._lock:
+            self.runs += 1
+        result = self.workflow.invoke(content, thread_id=chat_id)
+        reply = {"role": "assistant", "content": result["messages"][-1].content}
+        self.store.add_message(chat_id, {"role": "user", "content": content})
+        self.store.add_message(chat_id, reply)
+        return reply
+
+    def send(self, chat_id: str, content: str):
+        start = time.perf_counter()
+        if self.scheduler is None:
+            with self._lock:
+                self.arrived[content] = next(self.arrivals)
+            return self._turn(chat_id, content)
+        try:
+            # Arrival order is the order turns enter their lane
+            with self._lock:
+                turn = self.scheduler.submit(self.lane or chat_id, content)
+                self.arrived.setdefault(content, next(self.arrivals))
+        except DuplicateTurn:
+            return None
+        if turn.coalesced:
+            return turn.shared()
+        with turn:
+            self.waits.append(time.perf_counter() - start)
+            turn.reply = self._turn(chat_id, content)
+        return turn.reply
+
+    def intact(self, chat_id: str, sends: int) -> bool:
+        state = self.workflow.app.get_state(WorkFlow.config(chat_id)).values
+        asked = [m.content for m in state.get("messages", []) if m.type == "human"]
+        stored = self.store.get_messages(chat_id)
+        pairs = all(stored[i]["role"] == "user" and stored[i + 1]["content"] == f"re: {stored[i]['content']}"
+                    for i in range(0, len(stored) - 1, 2))
+        in_order = [self.arrived[q] for q in asked] == sorted(self.arrived[q] for q in asked)
+        return len(asked) == sends and len(stored) == 2 * sends and pairs and in_order
+
+
+def run(chats: Chats, n_chats: int, sends: int, copies: int = 1):
+    ids = chats.create(n_chats)
+    messages = [(chat_id, f"question {i} in {chat_id}") for i in range(sends) for chat_id in ids]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(messages) * copies) as pool:
+        replies = list(pool.map(lambda m: chats.send(*m), [m for m in messages for _ in range(copies)]))
+    return ids, time.perf_counter() - start, replies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--sends", type=int, default=6, help="concurrent messages per chat")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds per call")
+    args = parser.parse_args()
+
+    rows = []
+    for mode, scheduler, lane in (("none", None, None), ("global", TurnScheduler("off"), "all"),
+                                  ("per chat", TurnScheduler("off"), None)):
+        chats = Chats(args.latency, scheduler, lane)
+        ids, seconds, _ = run(chats, args.chats, args.sends)
+        intact = sum(chats.intact(chat_id, args.sends) for chat_id in ids)
+        rows.append((mode, f"{intact}/{args.chats}", f"{seconds:.2f}", f"{args.chats * args.sends / seconds:.1f}",
+                     f"{percentile(chats.waits, 0.5) * 1e3:.0f}" if chats.waits else "-",
+                     f"{percentile(chats.waits, 0.95) * 1e3:.0f}" if chats.waits else "-"))
+    print(f"{args.chats} chats x {args.sends} concurrent sends, {args.latency * 1e3:.0f} ms per model call")
+    print_table(("scheduling", "chats intact", "seconds", "turns/s", "wait p50 ms", "wait p95 ms"), rows)
+
+    rows = []
+    for policy in ("off", "reject", "coalesce"):
+        chats = Chats(args.latency, TurnScheduler(policy))
+        ids, seconds, replies = run(chats, args.chats, args.sends, copies=2)
+        stored = sum(len(chats.store.get_messages(chat_id)) // 2 for chat_id in ids)
+        rows.append((policy, len(replies), chats.runs, sum(r is None for r in replies), stored, f"{seconds:.2f}"))
+    print("\nevery message sent twice at once")
+    print_table(("duplicates", "sends", "graph turns", "rejected", "turns stored", "seconds"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
 from uuid import uuid4
-from datetime import datetime, timedelta
-from v1.graph import WorkFlow
-from typing import Dict, List
-import random
+from datetime import datetime
+from v1.graph import get_workflow, clear_thread
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List
+from storage import ChatStore, CheckpointConflict, get_store
+from agent.utils import warm_up
+from analytics import InvalidEvent, get_performance_engine
+from v1.logs import configure as configure_logging, get_logger
+from v1.metrics import metrics
+from v1.tracing import tracer
+from v1.turns import DuplicateTurn, Turn, turns
+import json
+import os
+
+log = get_logger(__name__)
 
 app = Flask(__name__)
 # CORS(app,origins=['http://localhost:3000/',"*"])
@@ -13,12 +24,21 @@ app.config['CORS_HEADERS'] = 'Content-Type'
 
 
 
-# In-memory storage for chats
-# In production, you'd want to use a proper database
 class ChatStorage:
-    def __init__(self):
-        self.chats: Dict[str, dict] = {}
-        self.workflows: Dict[str, WorkFlow] = {}
+    """Chat API over a pluggable ChatStore backend (see storage.get_store / CHAT_STORE)."""
+
+    def __init__(self, store: ChatStore = None):
+        self._store = store
+        self._lock = Lock()
+
+    @property
+    def store(self) -> ChatStore:
+        # Opened on first use, so a preforking master never holds a connection its workers inherit
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = get_store()
+        return self._store
 
     def create_chat(self, title: str) -> dict:
         chat_id = str(uuid4())
@@ -28,36 +48,138 @@ class ChatStorage:
             'messages': [],
             'created_at': datetime.now().isoformat()
         }
-        self.chats[chat_id] = chat
-        self.workflows[chat_id] = WorkFlow()  # Create a new workflow for each chat
-        print('New Chat Created', chat_id)
+        self.store.create_chat(chat)  # Conversation state is keyed by chat_id in the shared workflow
+        log.info('chat created', chat_id=chat_id)
         return chat
 
-    def get_chat(self, chat_id: str) -> dict:
-        return self.chats.get(chat_id)
+    def get_summary(self, chat_id: str) -> dict:
+        return self.store.get_chat(chat_id)
+
+    def get_chat(self, chat_id: str, limit: int = None, before: int = None) -> dict:
+        chat = self.store.get_chat(chat_id)
+        if chat is not None:
+            chat['messages'] = self.store.get_messages(chat_id, limit=limit, before=before)
+        return chat
 
-    def get_all_chats(self) -> List[dict]:
-        return list(self.chats.values())
+    def get_messages(self, chat_id: str, limit: int = None, before: int = None) -> List[dict]:
+        return self.store.get_messages(chat_id, limit=limit, before=before)
+
+    def get_all_chats(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        return self.store.list_chats(limit=limit, offset=offset)
 
     def add_message(self, chat_id: str, message: dict) -> None:
-        if chat_id in self.chats:
-            self.chats[chat_id]['messages'].append(message)
-            print(self.chats[chat_id]['messages'])
+        if self.store.get_chat(chat_id) is not None:
+            self.store.add_message(chat_id, message)
+
+    def update_title(self, chat_id: str, title: str) -> dict:
+        if not self.store.update_title(chat_id, title):
+            return None
+        return self.store.get_chat(chat_id)
 
     def clear_chat(self, chat_id: str) -> None:
-        if chat_id in self.chats:
-            self.chats[chat_id]['messages'] = []
-            self.workflows[chat_id] = WorkFlow()  # Reset the workflow
+        self.store.clear_messages(chat_id)
+        clear_thread(chat_id)  # Reset the conversation state
+
+    def delete_chat(self, chat_id: str) -> bool:
+        if not self.store.delete_chat(chat_id):
+            return False
+        clear_thread(chat_id)
+        return True
+
+    def import_records(self, records: Iterable[dict], batch_size: int = 500) -> dict:
+        """Create chats and append messages from export records, without running the LLM.
+
+        A chat record whose id already exists appends to that chat; a message record goes
+        to its chat_id, or to the chat record before it. Messages are written in batches,
+        and records before an invalid one are kept.
+        """
+        counts = {'chats': 0, 'messages': 0}
+        chat_id = None
+        pending = []
+
+        def flush():
+            if pending:
+                self.store.add_messages(chat_id, pending)
+                counts['messages'] += len(pending)
+                pending.clear()
+
+        for n, record in enumerate(records, 1):
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind == 'chat':
+                flush()
+                chat_id = record.get('id') or str(uuid4())
+                if self.store.get_chat(chat_id) is None:
+                    self.store.create_chat({'id': chat_id, 'title': record.get('title') or 'Imported Chat',
+                                            'created_at': record.get('created_at') or datetime.now().isoformat()})
+                    counts['chats'] += 1
+            elif kind == 'message':
+                target = record.get('chat_id') or chat_id
+                if target != chat_id:
+                    flush()
+                    chat_id = target
+                    if self.store.get_chat(chat_id) is None:
+                        raise ValueError(f"Record {n}: chat {chat_id!r} not found")
+                if chat_id is None:
+                    raise ValueError(f"Record {n}: message has no chat_id and no preceding chat")
+                if not record.get('role') or record.get('content') is None:
+                    raise ValueError(f"Record {n}: message needs role and content")
+                message = {k: v for k, v in record.items() if k not in ('type', 'chat_id', 'seq')}
+                message.setdefault('id', str(uuid4()))
+                pending.append(message)
+                if len(pending) >= batch_size:
+                    flush()
+            else:
+                raise ValueError(f"Record {n}: type must be 'chat' or 'message'")
+        flush()
+        return counts
+
+    def export_records(self) -> Iterator[dict]:
+        """Every chat followed by its messages, as import_records accepts them, read in pages."""
+        for chat in self.store.iter_chats():
+            yield {'type': 'chat', **chat}
+            for message in self.store.iter_messages(chat['id']):
+                yield {'type': 'message', 'chat_id': chat['id'], **message}
+
+
+def ndjson_records(stream, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """Parse NDJSON from a request stream in chunks (readline on the WSGI stream is slow)"""
+    tail = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if tail.strip():
+        yield json.loads(tail)
+
+
+def records_from_json(data) -> Iterator[dict]:
+    """Export records from {"chats": [{"title": ..., "messages": [...]}, ...]} or a bare list of chats"""
+    chats = data.get('chats', []) if isinstance(data, dict) else data
+    for chat in chats or []:
+        if not isinstance(chat, dict):
+            raise ValueError('Each chat must be an object')
+        yield {**{k: v for k, v in chat.items() if k != 'messages'}, 'type': 'chat'}
+        for message in chat.get('messages') or []:
+            yield {**message, 'type': 'message'}
 
 
 # Initialize chat storage
 chat_storage = ChatStorage()
+# Build the clients listed in MODEL_WARMUP now rather than on the first chat turn
+warm_up()
 
 
 @app.route('/chats', methods=['GET'])
 def get_chats():
-    """Get all chats"""
-    return jsonify(chat_storage.get_all_chats())
+    """Get chat summaries (no message bodies), newest first"""
+    limit = request.args.get('limit', 50, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify(chat_storage.get_all_chats(limit=limit, offset=offset))
 
 
 @app.route('/chats', methods=['POST'])
@@ -69,25 +191,154 @@ def create_chat():
     return jsonify(chat)
 
 
+@app.route('/chats/import', methods=['POST'])
+def import_chats():
+    """Bulk-load chats and messages without invoking the LLM.
+
+    Accepts NDJSON records as produced by GET /chats/export (Content-Type: application/x-ndjson),
+    read line by line, or a JSON body {"chats": [{"title": ..., "messages": [...]}]}.
+    """
+    if request.mimetype == STREAM_MIMETYPES['ndjson']:
+        records = ndjson_records(request.stream)
+    else:
+        records = records_from_json(request.get_json())
+    try:
+        counts = chat_storage.import_records(records)
+    except ValueError as e:
+        return jsonify({'error': f'Import stopped: {str(e)}'}), 400
+    return jsonify({'imported': counts})
+
+
+@app.route('/chats/export', methods=['GET'])
+def export_chats():
+    """Stream every chat and its messages as NDJSON, one record per line"""
+    lines = (json.dumps(record) + '\n' for record in chat_storage.export_records())
+    return Response(stream_with_context(lines), mimetype=STREAM_MIMETYPES['ndjson'],
+                    headers={'Content-Disposition': 'attachment; filename="chats.ndjson"'})
+
+
 @app.route('/chats/<chat_id>', methods=['GET'])
 def get_chat(chat_id):
-    """Get a specific chat"""
-    chat = chat_storage.get_chat(chat_id)
+    """Get a specific chat, optionally only its latest ?limit= messages"""
+    chat = chat_storage.get_chat(chat_id, limit=request.args.get('limit', type=int))
     if chat is None:
         return jsonify({'error': 'Chat not found'}), 404
-    print('Return Chat:', chat)
+    log.payload('chat returned', chat, chat_id=chat_id)
     return jsonify(chat)
 
 
+@app.route('/chats/<chat_id>/messages', methods=['GET'])
+def get_messages(chat_id):
+    """Page through a chat's messages: ?limit=50&before=<seq>, newest page first"""
+    if chat_storage.get_summary(chat_id) is None:
+        return jsonify({'error': 'Chat not found'}), 404
+    limit = request.args.get('limit', 50, type=int)
+    messages = chat_storage.get_messages(chat_id, limit=limit, before=request.args.get('before', type=int))
+    next_before = messages[0]['seq'] if len(messages) == limit and messages and messages[0]['seq'] > 0 else None
+    return jsonify({'messages': messages, 'next_before': next_before})
+
+
+STREAM_MIMETYPES = {'sse': 'text/event-stream', 'ndjson': 'application/x-ndjson'}
+
+
+def negotiate_stream(fmt, accept: str):
+    """Streaming is opt-in: ?stream=sse|ndjson, "stream": true in the body or Accept: text/event-stream.
+
+    ``fmt`` is the query parameter, else the body's "stream"; shared with asgi_app.
+    """
+    if fmt in STREAM_MIMETYPES:
+        return fmt
+    if fmt in (True, '1', 'true') or 'text/event-stream' in (accept or ''):
+        return 'sse'
+    return None
+
+
+def stream_format(data: dict):
+    return negotiate_stream(request.args.get('stream', data.get('stream')), request.headers.get('Accept', ''))
+
+
+def encode_event(fmt: str, event: str, payload: dict) -> str:
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({'event': event, **payload}) + '\n'
+
+
+DEBUG_LEDGER = os.getenv('V1_DEBUG', '0').lower() in ('1', 'true', 'yes')
+
+
+def wants_ledger(data: dict, flag=None) -> bool:
+    """Return the turn's cost ledger: V1_DEBUG=1, ?debug=1 or "debug": true in the body"""
+    flag = data.get('debug') if flag is None else flag
+    return DEBUG_LEDGER or flag in (True, '1', 'true')
+
+
+def request_user(data: dict):
+    """Caller's user id, which scopes cached replies; chats fall back to their own id"""
+    return request.headers.get('X-User-Id') or data.get('user_id')
+
+
+def stream_reply(chat_id: str, data: dict, user_message: str, fmt: str, turn: Turn) -> Response:
+    """Forward graph progress and main_conversation tokens as they are generated.
+
+    The reply is persisted to chat storage once the stream completes. A coalesced
+    duplicate streams only the original turn's final message.
+    """
+
+    user_id = request_user(data)
+    debug = wants_ledger(data, request.args.get('debug'))
+
+    def generate():
+        message_id = str(uuid4())
+        # Flush something immediately so time-to-first-byte doesn't wait on the router
+        yield encode_event(fmt, 'start', {'id': message_id})
+        if turn.coalesced:
+            try:
+                yield encode_event(fmt, 'message', turn.shared())
+            except Exception as e:
+                yield encode_event(fmt, 'error', {'error': f'Error processing message: {str(e)}'})
+            return
+        content = None
+        with turn:
+            try:
+                for event, payload in get_workflow().stream(user_message, thread_id=chat_id, user_id=user_id,
+                                                            debug=debug):
+                    if event == 'token':
+                        yield encode_event(fmt, 'token', {'content': payload})
+                    elif event == 'node':
+                        yield encode_event(fmt, 'node', {'node': payload, 'status': 'done'})
+                    elif event == 'ledger':
+                        yield encode_event(fmt, 'ledger', payload)
+                    else:
+                        content = payload
+            except Exception as e:
+                yield encode_event(fmt, 'error', {'error': f'Error processing message: {str(e)}'})
+                return
+            ai_message = {
+                'id': message_id,
+                'role': 'assistant',
+                'content': content
+            }
+            chat_storage.add_message(chat_id, data)
+            chat_storage.add_message(chat_id, ai_message)
+            turn.reply = ai_message
+        yield encode_event(fmt, 'message', ai_message)
+
+    response = Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[fmt],
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Frees the chat's lane even if the client goes away before the stream starts
+    response.call_on_close(turn.release)
+    return response
+
+
 @app.route('/chats/<chat_id>/messages', methods=['POST'])
 def send_message(chat_id):
     """Send a message in a specific chat"""
-    chat = chat_storage.get_chat(chat_id)
+    chat = chat_storage.get_summary(chat_id)
     if chat is None:
         return jsonify({'error': 'Chat not found'}), 404
 
     data = request.get_json()
-    print(data)
+    log.payload('message received', data, chat_id=chat_id)
     user_message = data.get('content')
 
     if not user_message:
@@ -96,7 +347,9 @@ def send_message(chat_id):
     # Handle special commands
     if user_message.startswith('/'):
         if user_message == '/clear':
-            chat_storage.clear_chat(chat_id)
+            # Queued like a turn, so it can't interleave with one in progress
+            with turns.submit(chat_id):
+                chat_storage.clear_chat(chat_id)
             return jsonify({
                 'id': str(uuid4()),
                 'role': 'assistant',
@@ -108,18 +361,36 @@ def send_message(chat_id):
             'content': 'Command not recognized.'
         })
 
-    # Process message using the chat-specific workflow
-    workflow = chat_storage.workflows[chat_id]
+    # Turns of one chat run one at a time, in the order they arrive
+    try:
+        turn = turns.submit(chat_id, user_message)
+    except DuplicateTurn as e:
+        return jsonify({'error': str(e)}), 409
+
+    fmt = stream_format(data)
+    if fmt:
+        return stream_reply(chat_id, data, user_message, fmt, turn)
+    if turn.coalesced:
+        return jsonify(turn.shared())
+
+    # Process message using the shared workflow, threaded by chat id
     # try:
-    response = workflow.invoke(user_message)
-    ai_message = {
-        'id': str(uuid4()),
-        'role': 'assistant',
-        'content': response['messages'][-1].content
-    }
-    chat_storage.add_message(chat_id, data)
-    chat_storage.add_message(chat_id, ai_message)
-    return jsonify(ai_message)
+    debug = wants_ledger(data, request.args.get('debug'))
+    with turn:
+        try:
+            response = get_workflow().invoke(user_message, thread_id=chat_id, user_id=request_user(data), debug=debug)
+        except CheckpointConflict:
+            # Another worker kept winning the race for this chat's checkpoint
+            return jsonify({'error': 'The chat was updated by another request, please retry'}), 409
+        ai_message = {
+            'id': str(uuid4()),
+            'role': 'assistant',
+            'content': response['messages'][-1].content
+        }
+        chat_storage.add_message(chat_id, data)
+        chat_storage.add_message(chat_id, ai_message)
+        turn.reply = ai_message
+    return jsonify({**ai_message, 'ledger': response['ledger']} if debug else ai_message)
     # TODO: Restore Exception Handling
     # except Exception as e:
     #     print("Inga tha error: ", e)
@@ -131,9 +402,7 @@ def send_message(chat_id):
 @app.route('/chats/<chat_id>', methods=['DELETE'])
 def delete_chat(chat_id):
     """Delete a specific chat"""
-    if chat_id in chat_storage.chats:
-        del chat_storage.chats[chat_id]
-        del chat_storage.workflows[chat_id]
+    if chat_storage.delete_chat(chat_id):
         return jsonify({'message': 'Chat deleted successfully'})
     return jsonify({'error': 'Chat not found'}), 404
 
@@ -141,58 +410,55 @@ def delete_chat(chat_id):
 @app.route('/chats/<chat_id>/title', methods=['PATCH'])
 def update_chat_title(chat_id):
     """Update chat title"""
-    chat = chat_storage.get_chat(chat_id)
-    if chat is None:
-        return jsonify({'error': 'Chat not found'}), 404
-
     data = request.get_json()
     new_title = data.get('title')
     if not new_title:
         return jsonify({'error': 'Title is required'}), 400
 
-    chat['title'] = new_title
+    chat = chat_storage.update_title(chat_id, new_title)
+    if chat is None:
+        return jsonify({'error': 'Chat not found'}), 404
     return jsonify(chat)
 
 
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    """Record study-session, task and grade events (one object or a list)"""
+    data = request.get_json()
+    events = data if isinstance(data, list) else [data]
+    if not all(isinstance(e, dict) for e in events):
+        return jsonify({'error': 'Each event must be an object'}), 400
+    user_id = request.headers.get('X-User-Id')
+    if user_id:
+        # The authenticated user wins over any user_id in the body
+        events = [{**e, 'user_id': user_id} for e in events]
+    try:
+        count = get_performance_engine().ingest(events)
+    except InvalidEvent as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ingested': count})
+
+
 @app.route('/performance', methods=['GET'])
 def get_performance():
-    # Generate mock data for demonstration
-    performance_data = {
-        'overallProgress': random.randint(60, 95),
-        'studyHours': random.randint(20, 40),
-        'tasksCompleted': random.randint(10, 30),
-        'averageGrade': round(random.uniform(70, 95), 2),
-        'streak': random.randint(1, 14),
-        'focusScore': random.randint(60, 100),
-        'upcomingDeadlines': [
-            {'task': 'Math Assignment', 'date': (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d')},
-            {'task': 'History Essay', 'date': (datetime.now() + timedelta(days=5)).strftime('%Y-%m-%d')},
-            {'task': 'Science Project', 'date': (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')},
-        ],
-        'recentAchievements': [
-            'Completed 7-day study streak',
-            'Improved average grade by 5%',
-            'Finished all tasks for the week',
-        ],
-        'subjectPerformance': [
-            {'subject': 'Math', 'score': random.randint(70, 100)},
-            {'subject': 'Science', 'score': random.randint(70, 100)},
-            {'subject': 'History', 'score': random.randint(70, 100)},
-            {'subject': 'English', 'score': random.randint(70, 100)},
-            {'subject': 'Art', 'score': random.randint(70, 100)},
-        ],
-        'weeklyStudyHours': [
-            {'day': 'Mon', 'hours': random.randint(1, 6)},
-            {'day': 'Tue', 'hours': random.randint(1, 6)},
-            {'day': 'Wed', 'hours': random.randint(1, 6)},
-            {'day': 'Thu', 'hours': random.randint(1, 6)},
-            {'day': 'Fri', 'hours': random.randint(1, 6)},
-            {'day': 'Sat', 'hours': random.randint(1, 6)},
-            {'day': 'Sun', 'hours': random.randint(1, 6)},
-        ],
-    }
-    return jsonify(performance_data)
+    """Dashboard for ?user_id= (or X-User-Id), served from incrementally maintained rollups"""
+    user_id = request.args.get('user_id') or request.headers.get('X-User-Id') or 'default'
+    return jsonify(get_performance_engine().dashboard(user_id))
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint: node, model and turn latencies (p50/p95/p99), token counts"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/traces', methods=['GET'])
+def get_traces():
+    """Recent spans (OTLP JSON shape) from the in-memory exporter, optionally for one ?trace_id="""
+    return jsonify({'spans': tracer.recent(request.args.get('trace_id'))})
 
 
 if __name__ == '__main__':
+    # Servers configure logging in their entry point (asgi_app's lifespan, gunicorn's post_fork)
+    configure_logging()
     app.run(debug=True)
@@ -0,0 +1,37 @@
+"""Production server settings.
+
+    gunicorn -c gunicorn.conf.py flask_app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:app
+
+With GUNICORN_PRELOAD=1 (the default) the master imports the app and the heavy agent
+dependencies once (v1.startup.preload) and forks workers that share those pages
+copy-on-write; set it to 0 to let each worker import everything itself.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    if preload_app:
+        from v1.startup import preload
+
+        preload()
+
+
+def post_fork(server, worker):
+    # Each worker routes its own root logger through v1.logs; the master keeps gunicorn's logging
+    from v1.logs import configure
+
+    configure()
+
+
+def post_worker_init(worker):
+    from v1.startup import warm_worker
+
+    warm_worker()
@@ -0,0 +1,56 @@
+import os
+
+from storage.base import ChatStore, CheckpointConflict
+from storage.memory import MemoryChatStore
+from storage.sqlite import SQLiteChatStore
+
+
+def get_store(url: str = None) -> ChatStore:
+    """Open the chat store named by ``url`` (default: the CHAT_STORE env var).
+
+    Supported: ``memory://``, ``sqlite:///path/to/chats.db``, ``mongodb://...`` /
+    ``mongodb+srv://...`` and ``mongomock://`` (in-process fake, for tests).
+    """
+    url = url or os.getenv("CHAT_STORE", "sqlite:///chats.db")
+    if url.startswith("memory://"):
+        return MemoryChatStore()
+    if url.startswith("sqlite://"):
+        return SQLiteChatStore(url[len("sqlite:///"):] or ":memory:")
+    if url.startswith("mongomock://"):
+        import mongomock
+        from storage.mongo import MongoChatStore
+        return MongoChatStore(mongomock.MongoClient())
+    if url.startswith(("mongodb://", "mongodb+srv://")):
+        from pymongo import MongoClient
+        from storage.mongo import MongoChatStore
+        return MongoChatStore(MongoClient(url), os.getenv("MONGO_DB", "studytracker"))
+    raise ValueError(f"Unsupported CHAT_STORE {url!r}")
+
+
+def get_checkpointer(url: str = None):
+    """Open the LangGraph checkpointer named by ``url`` (default: CHECKPOINT_STORE, then CHAT_STORE).
+
+    Durable backends let any worker process continue any chat; ``memory://`` keeps state
+    in this process only. Set CHECKPOINT_HISTORY=1 to keep every checkpoint instead of
+    only the latest per chat.
+    """
+    url = url or os.getenv("CHECKPOINT_STORE") or os.getenv("CHAT_STORE", "sqlite:///chats.db")
+    keep_history = os.getenv("CHECKPOINT_HISTORY", "0") == "1"
+    if url.startswith("memory://"):
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    if url.startswith("sqlite://"):
+        from storage.checkpoint import SQLiteCheckpointSaver
+        return SQLiteCheckpointSaver(url[len("sqlite:///"):] or ":memory:", keep_history)
+    if url.startswith("mongomock://"):
+        import mongomock
+        from storage.mongo import MongoCheckpointSaver
+        return MongoCheckpointSaver(mongomock.MongoClient(), keep_history=keep_history)
+    if url.startswith(("mongodb://", "mongodb+srv://")):
+        from pymongo import MongoClient
+        from storage.mongo import MongoCheckpointSaver
+        return MongoCheckpointSaver(MongoClient(url), os.getenv("MONGO_DB", "studytracker"), keep_history)
+    raise ValueError(f"Unsupported CHECKPOINT_STORE {url!r}")
+
+
+__all__ = ["ChatStore", "CheckpointConflict", "MemoryChatStore", "SQLiteChatStore", "get_checkpointer", "get_store"]
@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+
+class CheckpointConflict(Exception):
+    """Another writer saved a newer checkpoint of this thread since ours was loaded."""
+
+
+class ChatStore(ABC):
+    """Storage backend for chats and their messages.
+
+    Chats are stored as summaries (id, title, created_at, message_count); messages are
+    stored separately, numbered by a per-chat ``seq`` so they can be paged through
+    without loading the whole history.
+    """
+
+    @abstractmethod
+    def create_chat(self, chat: dict) -> None:
+        """Insert a chat summary with keys id, title and created_at."""
+
+    @abstractmethod
+    def get_chat(self, chat_id: str) -> Optional[dict]:
+        """Return the chat summary, without messages, or None."""
+
+    @abstractmethod
+    def list_chats(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        """Return chat summaries, newest first."""
+
+    @abstractmethod
+    def update_title(self, chat_id: str, title: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete_chat(self, chat_id: str) -> bool:
+        """Delete a chat and all of its messages. Returns False if it didn't exist."""
+
+    @abstractmethod
+    def add_message(self, chat_id: str, message: dict) -> int:
+        """Append a message and return its seq."""
+
+    def add_messages(self, chat_id: str, messages: List[dict]) -> List[int]:
+        """Append messages in order and return their seqs; backends write the batch at once."""
+        return [self.add_message(chat_id, message) for message in messages]
+
+    @abstractmethod
+    def get_messages(self, chat_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[dict]:
+        """Return up to ``limit`` of the latest messages with seq < ``before``, oldest first.
+
+        Each message is returned with its ``seq`` so the caller can request the next page.
+        """
+
+    @abstractmethod
+    def clear_messages(self, chat_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def iter_chats(self, batch_size: int = 500) -> Iterator[dict]:
+        """Yield every chat summary, oldest first, holding at most ``batch_size`` in memory."""
+
+    @abstractmethod
+    def iter_messages(self, chat_id: str, batch_size: int = 500) -> Iterator[dict]:
+        """Yield a chat's messages with their seq, oldest first, ``batch_size`` at a time."""
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,298 @@
+"""Durable LangGraph checkpointers, so any worker process can continue any chat.
+
+Graph state is keyed by thread id (the chat id). Each checkpoint row stores only the
+channel versions; channel values live in a blob table keyed by (channel, version), so
+a new checkpoint writes just the channels that changed since the last one. By default
+only the latest checkpoint per thread is kept and blobs it no longer references are
+dropped in the same transaction.
+
+A put only succeeds on top of the checkpoint it was derived from: when another worker
+saved a newer checkpoint of the same chat in the meantime, it raises CheckpointConflict
+instead of overwriting that turn (see v1.graph.WorkFlow for the retry).
+"""
+import asyncio
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from storage.base import CheckpointConflict
+from storage.sqlite import ThreadConnections
+
+Typed = Tuple[str, bytes]
+
+
+class StoredCheckpointSaver(BaseCheckpointSaver, ABC):
+    """get/list/put over a backend's row operations; subclasses implement the ``_`` methods.
+
+    With ``keep_history`` off, a put also deletes the thread's older checkpoints, their
+    pending writes and every blob the new checkpoint doesn't reference.
+    """
+
+    def __init__(self, keep_history: bool = False, serde=None):
+        super().__init__(serde=serde)
+        self.keep_history = keep_history
+
+    # Backend operations
+
+    @abstractmethod
+    def _checkpoints(self, thread_id: Optional[str], ns: Optional[str], checkpoint_id: Optional[str] = None,
+                     before: Optional[str] = None) -> Iterator[dict]:
+        """Rows {thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint, metadata}, newest first."""
+
+    @abstractmethod
+    def _blobs(self, thread_id: str, ns: str, versions: ChannelVersions) -> Dict[str, Typed]:
+        """Typed values of the given channel versions, by channel."""
+
+    @abstractmethod
+    def _writes(self, thread_id: str, ns: str, checkpoint_id: str) -> List[tuple]:
+        """(task_id, idx, channel, typed value, task_path) rows of one checkpoint."""
+
+    @abstractmethod
+    def _store(self, row: dict, blobs: List[tuple], prune_versions: Optional[ChannelVersions]) -> None:
+        """Insert a checkpoint row and its (channel, version, typed) blobs in one transaction.
+
+        Raises CheckpointConflict, writing nothing, unless the thread's latest checkpoint is
+        the row's parent (none, for a new thread) or the row itself (a retried put).
+        """
+
+    @abstractmethod
+    def _store_writes(self, thread_id: str, ns: str, checkpoint_id: str, rows: List[tuple]) -> None:
+        """Save a task's pending writes; regular ones are kept if already saved, special ones replaced."""
+
+    @abstractmethod
+    def delete_thread(self, thread_id: str) -> None:
+        """Drop every checkpoint, blob and pending write of a thread."""
+
+    # BaseCheckpointSaver
+
+    def _tuple(self, row: dict) -> CheckpointTuple:
+        thread_id, ns, checkpoint_id = row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"]
+        checkpoint: Checkpoint = self.serde.loads_typed(row["checkpoint"])
+        values = {channel: self.serde.loads_typed(typed)
+                  for channel, typed in self._blobs(thread_id, ns, checkpoint["channel_versions"]).items()
+                  if typed[0] != "empty"}
+        writes = sorted(self._writes(thread_id, ns, checkpoint_id),
+                        key=lambda w: writes_sort_key(w[4], w[0], w[1]))
+        parent = row["parent_id"]
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed(row["metadata"]),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns,
+                                            "checkpoint_id": parent}} if parent else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value))
+                            for task_id, _, channel, value, _ in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        row = next(self._checkpoints(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                                     get_checkpoint_id(config)), None)
+        return self._tuple(row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        configurable = (config or {}).get("configurable", {})
+        rows = self._checkpoints(configurable.get("thread_id"), configurable.get("checkpoint_ns"),
+                                 get_checkpoint_id(config) if config else None,
+                                 get_checkpoint_id(before) if before else None)
+        for row in rows:
+            if limit is not None and limit <= 0:
+                return
+            if filter:
+                metadata = self.serde.loads_typed(row["metadata"])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._tuple(row)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id, ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        # Only channels updated since the parent checkpoint get a new blob
+        blobs = [(channel, str(version),
+                  self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b""))
+                 for channel, version in new_versions.items()]
+        self._store({"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"],
+                     "parent_id": configurable.get("checkpoint_id"),
+                     "checkpoint": self.serde.dumps_typed(stored),
+                     "metadata": self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))},
+                    blobs, None if self.keep_history else checkpoint["channel_versions"])
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        configurable = config["configurable"]
+        rows = [(task_id, WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value), task_path)
+                for idx, (channel, value) in enumerate(writes)]
+        self._store_writes(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                           configurable["checkpoint_id"], rows)
+
+    # Async variants run the blocking calls off the event loop
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None
+                    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteCheckpointSaver(StoredCheckpointSaver):
+    """Checkpoints in a SQLite file; can share the chat store's database."""
+
+    def __init__(self, path: str = "chats.db", keep_history: bool = False, serde=None):
+        super().__init__(keep_history, serde)
+        self._connections = ThreadConnections(path, "checkpoints")
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @staticmethod
+    def _row(row) -> dict:
+        return {"thread_id": row["thread_id"], "checkpoint_ns": row["checkpoint_ns"],
+                "checkpoint_id": row["checkpoint_id"], "parent_id": row["parent_id"],
+                "checkpoint": (row["type"], row["checkpoint"]), "metadata": (row["metadata_type"], row["metadata"])}
+
+    def _checkpoints(self, thread_id, ns, checkpoint_id=None, before=None) -> Iterator[dict]:
+        query, params = "SELECT * FROM checkpoints WHERE 1 = 1", []
+        for column, value in (("thread_id", thread_id), ("checkpoint_ns", ns), ("checkpoint_id", checkpoint_id)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        if before is not None:
+            query += " AND checkpoint_id < ?"
+            params.append(before)
+        # Checkpoint ids are time-ordered, so the newest sorts last
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+        return (self._row(row) for row in self._conn().execute(query, params).fetchall())
+
+    def _blobs(self, thread_id, ns, versions) -> Dict[str, Typed]:
+        if not versions:
+            return {}
+        pairs = " OR ".join("(channel = ? AND version = ?)" for _ in versions)
+        params = [thread_id, ns] + [p for channel, version in versions.items() for p in (channel, str(version))]
+        rows = self._conn().execute(
+            f"SELECT channel, type, blob FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+            f"AND ({pairs})", params)
+        return {row["channel"]: (row["type"], row["blob"]) for row in rows}
+
+    def _writes(self, thread_id, ns, checkpoint_id) -> List[tuple]:
+        rows = self._conn().execute(
+            "SELECT task_id, idx, channel, type, blob, task_path FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", (thread_id, ns, checkpoint_id))
+        return [(r["task_id"], r["idx"], r["channel"], (r["type"], r["blob"]), r["task_path"]) for r in rows]
+
+    def _store(self, row, blobs, prune_versions) -> None:
+        key = (row["thread_id"], row["checkpoint_ns"])
+        with self._conn() as conn:
+            # Compare-and-insert in one statement, which holds the write lock: the thread's
+            # latest checkpoint must still be our parent
+            inserted = conn.execute(
+                "INSERT OR REPLACE INTO checkpoints SELECT ?, ?, ?, ?, ?, ?, ?, ? "
+                "WHERE coalesce((SELECT max(checkpoint_id) FROM checkpoints WHERE thread_id = ? "
+                "AND checkpoint_ns = ?), '') IN (?, ?)",
+                (*key, row["checkpoint_id"], row["parent_id"], *row["checkpoint"], *row["metadata"],
+                 *key, row["parent_id"] or "", row["checkpoint_id"])).rowcount
+            if not inserted:
+                raise CheckpointConflict(f"thread {row['thread_id']!r} has a newer checkpoint")
+            conn.executemany("INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)",
+                             [(*key, channel, version, *typed) for channel, version, typed in blobs])
+            if prune_versions is None:
+                return
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <> ?",
+                         (*key, row["checkpoint_id"]))
+            conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                         "AND checkpoint_id <> ?", (*key, row["checkpoint_id"]))
+            conn.executemany("DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                             "AND channel = ? AND version <> ?",
+                             [(*key, channel, str(version)) for channel, version in prune_versions.items()])
+            channels = list(prune_versions)
+            conn.execute(f"DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                         f"AND channel NOT IN ({', '.join('?' * len(channels))})", (*key, *channels))
+
+    def _store_writes(self, thread_id, ns, checkpoint_id, rows) -> None:
+        params = [(thread_id, ns, checkpoint_id, task_id, idx, channel, *typed, task_path)
+                  for task_id, idx, channel, typed, task_path in rows]
+        with self._conn() as conn:
+            # Regular writes are immutable once saved; special ones (errors, interrupts) are replaced
+            conn.executemany("INSERT OR IGNORE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [p for p in params if p[4] >= 0])
+            conn.executemany("INSERT OR REPLACE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [p for p in params if p[4] < 0])
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._conn() as conn:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def close(self) -> None:
+        self._connections.close()
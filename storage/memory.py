@@ -0,0 +1,88 @@
+from threading import RLock
+from typing import Dict, Iterator, List, Optional
+
+from storage.base import ChatStore
+
+
+class MemoryChatStore(ChatStore):
+    """Process-local store, lost on restart. Useful for tests and single-process dev."""
+
+    def __init__(self):
+        self._lock = RLock()
+        self.chats: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.next_seq: Dict[str, int] = {}
+
+    def create_chat(self, chat: dict) -> None:
+        with self._lock:
+            self.chats[chat['id']] = {'id': chat['id'], 'title': chat['title'],
+                                      'created_at': chat['created_at'], 'message_count': 0}
+            self.messages[chat['id']] = []
+            self.next_seq[chat['id']] = 0
+
+    def get_chat(self, chat_id: str) -> Optional[dict]:
+        chat = self.chats.get(chat_id)
+        return dict(chat) if chat else None
+
+    def list_chats(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        with self._lock:
+            ordered = sorted(self.chats.values(), key=lambda c: c['created_at'], reverse=True)
+            return [dict(c) for c in ordered[offset:offset + limit]]
+
+    def update_title(self, chat_id: str, title: str) -> bool:
+        with self._lock:
+            if chat_id not in self.chats:
+                return False
+            self.chats[chat_id]['title'] = title
+            return True
+
+    def delete_chat(self, chat_id: str) -> bool:
+        with self._lock:
+            self.messages.pop(chat_id, None)
+            self.next_seq.pop(chat_id, None)
+            return self.chats.pop(chat_id, None) is not None
+
+    def add_message(self, chat_id: str, message: dict) -> int:
+        with self._lock:
+            seq = self.next_seq[chat_id]
+            self.next_seq[chat_id] = seq + 1
+            self.messages[chat_id].append({**message, 'seq': seq})
+            self.chats[chat_id]['message_count'] += 1
+            return seq
+
+    def add_messages(self, chat_id: str, messages: List[dict]) -> List[int]:
+        with self._lock:
+            start = self.next_seq[chat_id]
+            self.next_seq[chat_id] = start + len(messages)
+            self.messages[chat_id].extend({**m, 'seq': start + i} for i, m in enumerate(messages))
+            self.chats[chat_id]['message_count'] += len(messages)
+            return list(range(start, start + len(messages)))
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            messages = self.messages.get(chat_id, [])
+            if before is not None:
+                # seq is increasing, so binary search would work too; pages are small
+                messages = [m for m in messages if m['seq'] < before]
+            if limit is not None:
+                messages = messages[-limit:] if limit else []
+            return [dict(m) for m in messages]
+
+    def clear_messages(self, chat_id: str) -> None:
+        with self._lock:
+            if chat_id in self.chats:
+                self.messages[chat_id] = []
+                self.chats[chat_id]['message_count'] = 0
+
+    def iter_chats(self, batch_size: int = 500) -> Iterator[dict]:
+        with self._lock:
+            ordered = sorted(self.chats.values(), key=lambda c: (c['created_at'], c['id']))
+        for chat in ordered:
+            yield dict(chat)
+
+    def iter_messages(self, chat_id: str, batch_size: int = 500) -> Iterator[dict]:
+        with self._lock:
+            messages = list(self.messages.get(chat_id, []))
+        for message in messages:
+            yield dict(message)
@@ -0,0 +1,200 @@
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from storage.base import ChatStore
+from storage.checkpoint import CheckpointConflict, StoredCheckpointSaver, Typed
+
+
+class MongoChatStore(ChatStore):
+    """MongoDB store. Chats and messages live in separate collections so listing chats
+    never touches message bodies.
+
+    ``client`` may be a pymongo.MongoClient or a mongomock.MongoClient.
+    """
+
+    def __init__(self, client, database: str = "studytracker"):
+        self.client = client
+        db = client[database]
+        self.chats = db["chats"]
+        self.messages = db["messages"]
+        self.chats.create_index([("id", ASCENDING)], unique=True)
+        self.chats.create_index([("created_at", DESCENDING)])
+        self.messages.create_index([("chat_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+
+    @staticmethod
+    def _summary(doc) -> dict:
+        return {'id': doc['id'], 'title': doc['title'], 'created_at': doc['created_at'],
+                'message_count': doc['message_count']}
+
+    def create_chat(self, chat: dict) -> None:
+        self.chats.insert_one({'id': chat['id'], 'title': chat['title'], 'created_at': chat['created_at'],
+                               'message_count': 0, 'next_seq': 0})
+
+    def get_chat(self, chat_id: str) -> Optional[dict]:
+        doc = self.chats.find_one({'id': chat_id})
+        return self._summary(doc) if doc else None
+
+    def list_chats(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        cursor = self.chats.find({}, {'_id': 0, 'next_seq': 0}).sort('created_at', DESCENDING)
+        return [self._summary(doc) for doc in cursor.skip(offset).limit(limit)]
+
+    def update_title(self, chat_id: str, title: str) -> bool:
+        return self.chats.update_one({'id': chat_id}, {'$set': {'title': title}}).matched_count > 0
+
+    def delete_chat(self, chat_id: str) -> bool:
+        self.messages.delete_many({'chat_id': chat_id})
+        return self.chats.delete_one({'id': chat_id}).deleted_count > 0
+
+    def add_message(self, chat_id: str, message: dict) -> int:
+        # Atomically reserve the next seq so concurrent workers never collide
+        doc = self.chats.find_one_and_update(
+            {'id': chat_id}, {'$inc': {'next_seq': 1, 'message_count': 1}},
+            projection={'next_seq': 1}, return_document=ReturnDocument.AFTER)
+        if doc is None:
+            raise KeyError(chat_id)
+        seq = doc['next_seq'] - 1
+        self.messages.insert_one({'chat_id': chat_id, 'seq': seq, 'body': message})
+        return seq
+
+    def add_messages(self, chat_id: str, messages: List[dict]) -> List[int]:
+        if not messages:
+            return []
+        # One reservation for the whole batch, then one insert
+        doc = self.chats.find_one_and_update(
+            {'id': chat_id}, {'$inc': {'next_seq': len(messages), 'message_count': len(messages)}},
+            projection={'next_seq': 1}, return_document=ReturnDocument.AFTER)
+        if doc is None:
+            raise KeyError(chat_id)
+        start = doc['next_seq'] - len(messages)
+        self.messages.insert_many([{'chat_id': chat_id, 'seq': start + i, 'body': m}
+                                   for i, m in enumerate(messages)])
+        return list(range(start, start + len(messages)))
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[dict]:
+        query = {'chat_id': chat_id}
+        if before is not None:
+            query['seq'] = {'$lt': before}
+        cursor = self.messages.find(query, {'_id': 0}).sort('seq', DESCENDING)
+        if limit is not None:
+            if limit == 0:
+                return []
+            cursor = cursor.limit(limit)
+        return [{**doc['body'], 'seq': doc['seq']} for doc in reversed(list(cursor))]
+
+    def clear_messages(self, chat_id: str) -> None:
+        self.messages.delete_many({'chat_id': chat_id})
+        self.chats.update_one({'id': chat_id}, {'$set': {'message_count': 0}})
+
+    def iter_chats(self, batch_size: int = 500) -> Iterator[dict]:
+        cursor = self.chats.find({}, {'_id': 0, 'next_seq': 0}).sort([('created_at', ASCENDING), ('id', ASCENDING)])
+        for doc in cursor.batch_size(batch_size):
+            yield self._summary(doc)
+
+    def iter_messages(self, chat_id: str, batch_size: int = 500) -> Iterator[dict]:
+        cursor = self.messages.find({'chat_id': chat_id}, {'_id': 0}).sort('seq', ASCENDING)
+        for doc in cursor.batch_size(batch_size):
+            yield {**doc['body'], 'seq': doc['seq']}
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class MongoCheckpointSaver(StoredCheckpointSaver):
+    """Checkpoints in MongoDB, next to the chat store's collections.
+
+    ``client`` may be a pymongo.MongoClient or a mongomock.MongoClient.
+    """
+
+    def __init__(self, client, database: str = "studytracker", keep_history: bool = False, serde=None):
+        super().__init__(keep_history, serde)
+        self.client = client
+        db = client[database]
+        self.checkpoints = db["checkpoints"]
+        self.blobs = db["checkpoint_blobs"]
+        self.writes = db["checkpoint_writes"]
+        # The latest checkpoint id per thread, compared-and-set by every put
+        self.heads = db["checkpoint_heads"]
+        self.heads.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING)], unique=True)
+        self.checkpoints.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                       ("checkpoint_id", DESCENDING)], unique=True)
+        self.blobs.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                 ("channel", ASCENDING), ("version", ASCENDING)], unique=True)
+        self.writes.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                  ("checkpoint_id", ASCENDING), ("task_id", ASCENDING), ("idx", ASCENDING)],
+                                 unique=True)
+
+    def _checkpoints(self, thread_id, ns, checkpoint_id=None, before=None) -> Iterator[dict]:
+        query = {k: v for k, v in (("thread_id", thread_id), ("checkpoint_ns", ns),
+                                   ("checkpoint_id", checkpoint_id)) if v is not None}
+        if before is not None:
+            query["checkpoint_id"] = {"$lt": before}
+        cursor = self.checkpoints.find(query, {"_id": 0}).sort(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)])
+        for doc in cursor:
+            yield {**doc, "checkpoint": (doc["type"], doc["checkpoint"]),
+                   "metadata": (doc["metadata_type"], doc["metadata"])}
+
+    def _blobs(self, thread_id, ns, versions) -> Dict[str, Typed]:
+        if not versions:
+            return {}
+        docs = self.blobs.find({"thread_id": thread_id, "checkpoint_ns": ns,
+                                "$or": [{"channel": c, "version": str(v)} for c, v in versions.items()]})
+        return {doc["channel"]: (doc["type"], doc["blob"]) for doc in docs}
+
+    def _writes(self, thread_id, ns, checkpoint_id) -> List[tuple]:
+        docs = self.writes.find({"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id})
+        return [(d["task_id"], d["idx"], d["channel"], (d["type"], d["blob"]), d["task_path"]) for d in docs]
+
+    def _store(self, row, blobs, prune_versions) -> None:
+        key = {"thread_id": row["thread_id"], "checkpoint_ns": row["checkpoint_ns"]}
+        try:
+            # Before writing anything: the head must still be our parent. A thread that has a
+            # head but no match makes the upsert collide with the unique index
+            self.heads.update_one({**key, "checkpoint_id": {"$in": [row["parent_id"], row["checkpoint_id"]]}},
+                                  {"$set": {"checkpoint_id": row["checkpoint_id"]}}, upsert=True)
+        except DuplicateKeyError:
+            raise CheckpointConflict(f"thread {row['thread_id']!r} has a newer checkpoint") from None
+        if blobs:
+            try:
+                self.blobs.insert_many([{**key, "channel": channel, "version": version, "type": typed[0],
+                                         "blob": typed[1]} for channel, version, typed in blobs], ordered=False)
+            except BulkWriteError as e:
+                # A retried put re-sends blobs that are already stored
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+        # The checkpoint goes in after its blobs, so a reader never sees it without them
+        self.checkpoints.replace_one(
+            {**key, "checkpoint_id": row["checkpoint_id"]},
+            {**key, "checkpoint_id": row["checkpoint_id"], "parent_id": row["parent_id"],
+             "type": row["checkpoint"][0], "checkpoint": row["checkpoint"][1],
+             "metadata_type": row["metadata"][0], "metadata": row["metadata"][1]}, upsert=True)
+        if prune_versions is None:
+            return
+        older = {**key, "checkpoint_id": {"$ne": row["checkpoint_id"]}}
+        self.checkpoints.delete_many(older)
+        self.writes.delete_many(older)
+        self.blobs.delete_many({**key, "$nor": [{"channel": c, "version": str(v)}
+                                                for c, v in prune_versions.items()] or [{"_id": None}]})
+
+    def _store_writes(self, thread_id, ns, checkpoint_id, rows) -> None:
+        key = {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}
+        operations = []
+        for task_id, idx, channel, typed, task_path in rows:
+            doc = {"channel": channel, "type": typed[0], "blob": typed[1], "task_path": task_path}
+            # Regular writes are immutable once saved; special ones (errors, interrupts) are replaced.
+            # The key is unique, so each matches one document; mongomock's bulk_write rejects
+            # UpdateOne from current pymongo releases
+            operations.append(UpdateMany({**key, "task_id": task_id, "idx": idx},
+                                         {"$setOnInsert" if idx >= 0 else "$set": doc}, upsert=True))
+        if operations:
+            self.writes.bulk_write(operations, ordered=False)
+
+    def delete_thread(self, thread_id: str) -> None:
+        for collection in (self.checkpoints, self.blobs, self.writes, self.heads):
+            collection.delete_many({"thread_id": thread_id})
+
+    def close(self) -> None:
+        self.client.close()
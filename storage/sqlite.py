@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterator, List, Optional
+
+from storage.base import ChatStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS chats_created_at ON chats (created_at);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class ThreadConnections:
+    """One sqlite3 connection per thread, since connections can't be shared across threads.
+
+    ``:memory:`` becomes a named shared-cache database so every thread sees the same data.
+    A forked child (e.g. a worker of a preloading server) opens its own connections
+    instead of reusing the parent's.
+    """
+
+    def __init__(self, path: str, name: str = "chats"):
+        self.path = path
+        self.uri = False
+        if path == ":memory:":
+            self.path, self.uri = f"file:{name}-{id(self)}?mode=memory&cache=shared", True
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # SQLite handles must not cross fork(); leave the parent's alone
+            self._reset()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, uri=self.uri)
+            conn.row_factory = sqlite3.Row
+            if not self.uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SQLiteChatStore(ChatStore):
+    """Embedded store. WAL mode lets several worker processes share one database file."""
+
+    def __init__(self, path: str = "chats.db"):
+        self.path = path
+        self._connections = ThreadConnections(path)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @staticmethod
+    def _summary(row) -> dict:
+        return {'id': row['id'], 'title': row['title'], 'created_at': row['created_at'],
+                'message_count': row['message_count']}
+
+    def create_chat(self, chat: dict) -> None:
+        with self._conn() as conn:
+            conn.execute("INSERT INTO chats (id, title, created_at) VALUES (?, ?, ?)",
+                         (chat['id'], chat['title'], chat['created_at']))
+
+    def get_chat(self, chat_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        return self._summary(row) if row else None
+
+    def list_chats(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM chats ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset))
+        return [self._summary(row) for row in rows]
+
+    def update_title(self, chat_id: str, title: str) -> bool:
+        with self._conn() as conn:
+            return conn.execute("UPDATE chats SET title = ? WHERE id = ?", (title, chat_id)).rowcount > 0
+
+    def delete_chat(self, chat_id: str) -> bool:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            return conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,)).rowcount > 0
+
+    def add_message(self, chat_id: str, message: dict) -> int:
+        with self._conn() as conn:
+            row = conn.execute(
+                "UPDATE chats SET next_seq = next_seq + 1, message_count = message_count + 1 "
+                "WHERE id = ? RETURNING next_seq - 1", (chat_id,)).fetchone()
+            if row is None:
+                raise KeyError(chat_id)
+            seq = row[0]
+            conn.execute("INSERT INTO messages (chat_id, seq, body) VALUES (?, ?, ?)",
+                         (chat_id, seq, json.dumps(message)))
+            return seq
+
+    def add_messages(self, chat_id: str, messages: List[dict]) -> List[int]:
+        with self._conn() as conn:
+            row = conn.execute(
+                "UPDATE chats SET next_seq = next_seq + ?, message_count = message_count + ? "
+                "WHERE id = ? RETURNING next_seq - ?",
+                (len(messages), len(messages), chat_id, len(messages))).fetchone()
+            if row is None:
+                raise KeyError(chat_id)
+            seqs = list(range(row[0], row[0] + len(messages)))
+            conn.executemany("INSERT INTO messages (chat_id, seq, body) VALUES (?, ?, ?)",
+                             [(chat_id, seq, json.dumps(m)) for seq, m in zip(seqs, messages)])
+            return seqs
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[dict]:
+        query = "SELECT seq, body FROM messages WHERE chat_id = ?"
+        params = [chat_id]
+        if before is not None:
+            query += " AND seq < ?"
+            params.append(before)
+        query += " ORDER BY seq DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._conn().execute(query, params).fetchall()
+        return [{**json.loads(row['body']), 'seq': row['seq']} for row in reversed(rows)]
+
+    def clear_messages(self, chat_id: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            conn.execute("UPDATE chats SET message_count = 0 WHERE id = ?", (chat_id,))
+
+    def iter_chats(self, batch_size: int = 500) -> Iterator[dict]:
+        # Keyset pages, so no read transaction stays open while the caller streams
+        last = ("", "")
+        while True:
+            rows = self._conn().execute(
+                "SELECT * FROM chats WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+                (*last, batch_size)).fetchall()
+            yield from (self._summary(row) for row in rows)
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+
+    def iter_messages(self, chat_id: str, batch_size: int = 500) -> Iterator[dict]:
+        last = -1
+        while True:
+            rows = self._conn().execute(
+                "SELECT seq, body FROM messages WHERE chat_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (chat_id, last, batch_size)).fetchall()
+            yield from ({**json.loads(row['body']), 'seq': row['seq']} for row in rows)
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]['seq']
+
+    def close(self) -> None:
+        self._connections.close()
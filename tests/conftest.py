@@ -0,0 +1,7 @@
+import os
+
+# Offline defaults, set before any test module imports the app or CrewAI
+for name, value in (("GROQ_API_KEY", "test"), ("CHAT_STORE", "memory://"), ("ANALYTICS_STORE", "memory://"),
+                    ("CREWAI_DISABLE_TELEMETRY", "true"), ("OTEL_SDK_DISABLED", "true"), ("LOG_LEVEL", "WARNING"),
+                    ("LITELLM_LOCAL_MODEL_COST_MAP", "True")):
+    os.environ.setdefault(name, value)
@@ -0,0 +1,105 @@
+"""The incremental streak, deadline and task-status indexes against a full scan of the raw events."""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analytics import PerformanceEngine, get_analytics_store
+from analytics.events import normalize
+from benchmarks.analytics_index import TOP_K, brute_force, synthetic_events
+
+EVENTS = 100_000
+USERS = ("synthetic-0", "synthetic-1")
+
+
+def task_counts(events):
+    """(tasks_total, tasks_completed) from each task's last status, scanning every event."""
+    statuses = {}
+    for event in events:
+        if event["type"] == "task":
+            statuses[event["task_id"]] = event["status"]
+    return len(statuses), sum(status == "completed" for status in statuses.values())
+
+
+def ingest(engine: PerformanceEngine, events, batch: int = 500) -> None:
+    for start in range(0, len(events), batch):
+        engine.ingest(events[start:start + batch])
+
+
+@pytest.fixture(scope="module")
+def today():
+    return date.today()
+
+
+@pytest.fixture(scope="module")
+def synthetic(today):
+    """An engine holding 100k events for each synthetic user, and those events."""
+    engine = PerformanceEngine(get_analytics_store("memory://"))
+    rng = random.Random(7)
+    users = {}
+    for user_id in USERS:
+        users[user_id] = [normalize(e) for e in synthetic_events(user_id, EVENTS, today, rng)]
+        ingest(engine, users[user_id])
+    return engine, users
+
+
+@pytest.mark.parametrize("user_id", USERS)
+def test_streak_matches_full_scan(synthetic, today, user_id):
+    engine, users = synthetic
+    current, longest, _ = brute_force(users[user_id], today)
+    assert engine.dashboard(user_id, today)["streak"] == current
+    assert engine.store.streak(user_id)["longest"] == longest
+
+
+@pytest.mark.parametrize("user_id", USERS)
+def test_deadlines_match_full_scan(synthetic, today, user_id):
+    engine, users = synthetic
+    _, _, expected = brute_force(users[user_id], today)
+    assert [d["task_id"] for d in engine.upcoming_deadlines(user_id, TOP_K, today)] == expected
+
+
+@pytest.mark.parametrize("user_id", USERS)
+def test_task_status_matches_full_scan(synthetic, today, user_id):
+    engine, users = synthetic
+    total, completed = task_counts(users[user_id])
+    totals = engine.store.row("totals", user_id)
+    assert (totals["tasks_total"], totals["tasks_completed"]) == (total, completed)
+    dashboard = engine.dashboard(user_id, today)
+    assert dashboard["tasksCompleted"] == completed
+    assert dashboard["overallProgress"] == round(100 * completed / total)
+
+
+def test_rebuild_matches_incremental_index(synthetic, today):
+    engine, _ = synthetic
+    user_id = USERS[0]
+    dashboard, streak = engine.dashboard(user_id, today), engine.store.streak(user_id)
+    engine.rebuild(user_id)
+    assert engine.dashboard(user_id, today) == dashboard
+    assert engine.store.streak(user_id) == streak
+
+
+@pytest.mark.parametrize("url", ["memory://", "sqlite:///:memory:", "mongomock://"])
+def test_stores_agree_with_full_scan(url, today):
+    engine = PerformanceEngine(get_analytics_store(url))
+    events = [normalize(e) for e in synthetic_events("u", 3000, today, random.Random(3))]
+    ingest(engine, events)
+    current, longest, deadlines = brute_force(events, today)
+    totals = engine.store.row("totals", "u")
+    assert (engine.dashboard("u", today)["streak"], engine.store.streak("u")["longest"]) == (current, longest)
+    assert [d["task_id"] for d in engine.upcoming_deadlines("u", TOP_K, today)] == deadlines
+    assert (totals["tasks_total"], totals["tasks_completed"]) == task_counts(events)
+
+
+def test_reopened_and_resent_tasks_count_once(today):
+    engine = PerformanceEngine(get_analytics_store("memory://"))
+    due = (today + timedelta(days=3)).isoformat()
+    events = [{"type": "task", "user_id": "u", "task_id": t, "due": due} for t in ("a", "b", "c")]
+    events += [{"type": "task", "user_id": "u", "task_id": "a", "status": "completed"},
+               {"type": "task", "user_id": "u", "task_id": "a", "status": "completed"},
+               {"type": "task", "user_id": "u", "task_id": "b", "status": "completed"},
+               {"type": "task", "user_id": "u", "task_id": "b", "due": due}]
+    engine.ingest(events)
+    assert task_counts([normalize(e) for e in events]) == (3, 1)
+    assert engine.dashboard("u", today)["overallProgress"] == 33
+    engine.rebuild("u")
+    assert engine.dashboard("u", today)["overallProgress"] == 33
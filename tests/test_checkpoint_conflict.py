@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import pytest
+
+from agent.fake_llm import FakeChatModel
+from storage import CheckpointConflict
+from storage.checkpoint import SQLiteCheckpointSaver
+from storage.mongo import MongoCheckpointSaver
+from v1.context import ContextManager, KeepAll
+from v1.graph import WorkFlow
+from v1.nodes import Nodes
+from v1.router import RouterChain, StaticRouter
+
+
+def nodes() -> Nodes:
+    return Nodes(chat=FakeChatModel(latency=0.2), router=RouterChain([StaticRouter()]),
+                 context=ContextManager(KeepAll()))
+
+
+@pytest.fixture(params=["sqlite", "mongomock"])
+def workers(request, tmp_path):
+    """Two WorkFlows with their own checkpointer on one store, as two worker processes."""
+    if request.param == "sqlite":
+        path = str(tmp_path / "checkpoints.db")
+        return [WorkFlow(nodes(), SQLiteCheckpointSaver(path)), WorkFlow(nodes(), SQLiteCheckpointSaver(path))]
+    client = mongomock.MongoClient()
+    return [WorkFlow(nodes(), MongoCheckpointSaver(client)), WorkFlow(nodes(), MongoCheckpointSaver(client))]
+
+
+def history(workflow: WorkFlow, thread_id: str) -> list:
+    return [m.content for m in workflow.app.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]]
+
+
+def test_concurrent_invokes_keep_both_turns(workers):
+    workers[0].invoke("first", thread_id="chat")
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda i: workers[i].invoke(f"question {i}", thread_id="chat"), range(2)))
+    messages = history(workers[0], "chat")
+    assert len(messages) == 6
+    assert {"question 0", "question 1"} <= set(messages)
+
+
+def test_concurrent_streams_keep_both_turns(workers):
+    with ThreadPoolExecutor(2) as pool:
+        replies = list(pool.map(lambda i: dict(workers[i].stream(f"question {i}", thread_id="chat")), range(2)))
+    assert all(reply["message"] for reply in replies)
+    messages = history(workers[1], "chat")
+    assert len(messages) == 4
+    assert {"question 0", "question 1"} <= set(messages)
+
+
+def test_concurrent_async_turns_keep_both_turns(workers):
+    async def turns():
+        async def stream(workflow):
+            return [event async for event in workflow.astream("streamed", thread_id="chat")]
+        await asyncio.gather(workers[0].ainvoke("invoked", thread_id="chat"), stream(workers[1]))
+
+    asyncio.run(turns())
+    assert {"invoked", "streamed"} <= set(history(workers[0], "chat"))
+
+
+def test_conflicts_past_the_retries_are_raised(workers):
+    workers[0].conflict_retries = 0
+    workers[0].invoke("first", thread_id="chat")
+    stale = workers[0].app.get_state({"configurable": {"thread_id": "chat"}}).config
+    workers[1].invoke("second", thread_id="chat")
+    with pytest.raises(CheckpointConflict):
+        workers[0].app.update_state(stale, {"messages": []})
+    with ThreadPoolExecutor(2) as pool:
+        results = [pool.submit(workers[i].invoke, f"question {i}", thread_id="chat") for i in range(2)]
+        errors = [future.exception() for future in results]
+    # Only the worker without retries can lose; the other reruns its turn if it does
+    assert errors[1] is None
+    assert errors[0] is None or isinstance(errors[0], CheckpointConflict)
@@ -0,0 +1,31 @@
+import pytest
+from crewai import Process
+
+from backendcrew.src.backendcrew.crew import backendcrewCrew
+from backendcrew.src.backendcrew.pool import CrewPool, worker_agents
+
+
+def checkout(pool: CrewPool):
+    crew = pool._idle.get()
+    pool._idle.put(crew)
+    return crew
+
+
+def test_worker_agents_counts_without_building():
+    assert worker_agents(backendcrewCrew) == 1
+
+
+def test_pool_builds_only_the_fast_crew(monkeypatch):
+    monkeypatch.setattr(backendcrewCrew, "crew", lambda self: pytest.fail("built the hierarchical crew"))
+    pool = CrewPool(2)
+    crew = checkout(pool)
+    assert pool._idle.qsize() == 2
+    assert crew.process == Process.sequential
+    assert [task.name for task in crew.tasks] == ["handle_misc_queries"]
+    assert [tool.name for tool in crew.agents[0].tools] == ["Web Search", "Deadline Tool"]
+
+
+def test_pool_without_fast_path_builds_the_hierarchical_crew():
+    crew = checkout(CrewPool(1, fast_path=False))
+    assert crew.process == Process.hierarchical
+    assert crew.manager_agent is not None
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+import pytest
+
+import analytics
+from analytics import PerformanceEngine, get_analytics_store
+from backendcrew.src.backendcrew.pool import CrewPool
+from backendcrew.src.backendcrew.tools.DeadlineTool import DeadlineTool
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = PerformanceEngine(get_analytics_store("memory://"))
+    due = (date.today() + timedelta(days=2)).isoformat()
+    engine.ingest([{"type": "task", "user_id": user, "task_id": f"{user}-essay", "title": f"{user}'s essay",
+                    "due": due} for user in ("alice", "bob")])
+    monkeypatch.setattr(analytics, "_engine", engine)
+    return engine
+
+
+def test_reads_the_bound_user_and_ignores_the_argument(engine):
+    tool = DeadlineTool(user_id="alice")
+    assert "alice's essay" in tool.run("bob")
+    assert "bob" not in tool.run("bob")
+
+
+def test_unbound_tool_reads_no_one(engine):
+    assert "essay" not in DeadlineTool().run("default")
+    assert "essay" not in DeadlineTool().run("alice")
+
+
+def test_pool_binds_the_caller_for_one_kickoff(engine, monkeypatch):
+    pool = CrewPool(1)
+    crew = pool._idle.queue[0]
+    seen = []
+    monkeypatch.setattr(type(crew), "kickoff", lambda self, inputs: seen.append(
+        [t.run("bob") for a in self.agents for t in a.tools if isinstance(t, DeadlineTool)]))
+    pool.kickoff({"query": "what's due?"}, user_id="alice")
+    assert "alice's essay" in seen[0][0] and "bob" not in seen[0][0]
+    assert all(t.user_id is None for a in crew.agents for t in a.tools if isinstance(t, DeadlineTool))
@@ -0,0 +1,156 @@
+"""Keep the conversation history sent to the model bounded.
+
+Each strategy splits the prior history into messages to keep and messages to drop. The
+dropped ones are removed from the checkpointed state, so neither the prompt nor the
+stored thread grows with chat length. RollingSummary folds the dropped messages into a
+running summary, which is stored per chat in the graph state and extended incrementally.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import AnyMessage, HumanMessage, RemoveMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=None)
+def encoding():
+    """The tiktoken encoding, loaded on first use since reading its ranks slows imports."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # tiktoken is optional, or its encoding may not be downloadable
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count from a local tokenizer; a word/punctuation estimate without tiktoken."""
+    if encoding() is not None:
+        return len(encoding().encode(text))
+    return int(len(_PIECE.findall(text)) * 1.3) + 1
+
+
+def message_tokens(messages: Sequence[AnyMessage]) -> int:
+    # ~4 tokens of per-message framing in chat formats
+    return sum(estimate_tokens(str(m.content)) + 4 for m in messages)
+
+
+def turn_starts(messages: Sequence[AnyMessage]) -> List[int]:
+    return [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+
+
+class KeepAll:
+    """No bound; the behaviour before context management, kept for benchmarks."""
+
+    def split(self, history: Sequence[AnyMessage]) -> Tuple[list, list]:
+        return list(history), []
+
+
+class SlidingWindow:
+    """Keep the last ``turns`` user turns and the replies to them.
+
+    With ``step`` > 1 an overflowing window drops ``step`` turns at once, so the kept
+    history, and with it the prompt prefix a provider can cache, only changes every
+    ``step`` turns instead of on every turn.
+    """
+
+    def __init__(self, turns: int = 6, step: int = 1):
+        self.turns = turns
+        self.step = max(1, min(step, turns))
+
+    def split(self, history: Sequence[AnyMessage]) -> Tuple[list, list]:
+        starts = turn_starts(history)
+        if len(starts) <= self.turns:
+            return list(history), []
+        keep = self.turns - self.step + 1
+        cut = starts[-keep] if keep else len(history)
+        return list(history[cut:]), list(history[:cut])
+
+
+class TokenBudget:
+    """Keep the newest whole turns that fit in ``max_tokens``."""
+
+    def __init__(self, max_tokens: int = 2000):
+        self.max_tokens = max_tokens
+
+    def split(self, history: Sequence[AnyMessage]) -> Tuple[list, list]:
+        cut = len(history)
+        used = 0
+        for start in reversed(turn_starts(history)):
+            used += message_tokens(history[start:cut])
+            if used > self.max_tokens:
+                break
+            cut = start
+        return list(history[cut:]), list(history[:cut])
+
+
+class RollingSummary:
+    """Sliding window whose evicted turns are folded into a running summary."""
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system",
+         "You maintain a short running summary of a conversation between a student and their study assistant. "
+         "Extend the summary with the new lines, keeping facts about the student, their subjects and deadlines. "
+         "Reply with the updated summary only."),
+        ("human", "Current summary:\n{summary}\n\nNew lines:\n{lines}"),
+    ])
+
+    def __init__(self, turns: int = 4, step: int = 1):
+        self.window = SlidingWindow(turns, step)
+
+    def split(self, history: Sequence[AnyMessage]) -> Tuple[list, list]:
+        return self.window.split(history)
+
+    def inputs(self, summary: str, dropped: Sequence[AnyMessage]) -> dict:
+        lines = "\n".join(f"{m.type}: {m.content}" for m in dropped)
+        return {"summary": summary or "(empty)", "lines": lines}
+
+    def summarize(self, model, summary: str, dropped: Sequence[AnyMessage]) -> str:
+        return (self.prompt | model).invoke(self.inputs(summary, dropped)).content
+
+    async def asummarize(self, model, summary: str, dropped: Sequence[AnyMessage]) -> str:
+        return (await (self.prompt | model).ainvoke(self.inputs(summary, dropped))).content
+
+
+def strategy_from_env():
+    """V1_CONTEXT is "window:<turns>" (default window:6), "tokens:<budget>", "summary:<turns>" or "all".
+
+    "window" and "summary" take an optional eviction step, e.g. "window:8:4" (see SlidingWindow).
+    """
+    name, _, arg = os.getenv("V1_CONTEXT", "window:6").partition(":")
+    arg, _, step = arg.partition(":")
+    if name == "window":
+        return SlidingWindow(int(arg or 6), int(step or 1))
+    if name == "tokens":
+        return TokenBudget(int(arg or 2000))
+    if name == "summary":
+        return RollingSummary(int(arg or 4), int(step or 1))
+    if name == "all":
+        return KeepAll()
+    raise ValueError(f"Unknown context strategy {name!r} in V1_CONTEXT")
+
+
+class ContextManager:
+    def __init__(self, strategy=None):
+        self.strategy = strategy or strategy_from_env()
+
+    def evict(self, state: dict) -> Tuple[list, dict]:
+        _, dropped = self.strategy.split(state["messages"][:-1])
+        return dropped, {"messages": [RemoveMessage(id=m.id) for m in dropped]} if dropped else {}
+
+    def update(self, state: dict, model) -> dict:
+        """Graph-node update: remove evicted messages and, when summarizing, extend the summary."""
+        dropped, update = self.evict(state)
+        if dropped and isinstance(self.strategy, RollingSummary):
+            update["summary"] = self.strategy.summarize(model, state.get("summary", ""), dropped)
+        return update
+
+    async def aupdate(self, state: dict, model) -> dict:
+        dropped, update = self.evict(state)
+        if dropped and isinstance(self.strategy, RollingSummary):
+            update["summary"] = await self.strategy.asummarize(model, state.get("summary", ""), dropped)
+        return update
@@ -0,0 +1,109 @@
+"""Run CrewAI queries in a bounded worker pool with a per-query deadline.
+
+A crew that overruns its deadline can't stall a chat turn: the turn continues with the
+fallback answer, and the crew's late result is discarded.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+from typing import Callable, Optional
+
+from agent.rate_limit import BACKGROUND, limits
+from v1.logs import get_logger
+from v1.metrics import metrics
+
+log = get_logger(__name__)
+
+NO_INFORMATION = "No additional information available."
+
+
+# The model backendcrew's agents call through litellm
+CREW_MODEL = "groq/llama-3.1-70b-versatile"
+
+
+def crew_pool(workers: int = None):
+    """backendcrew's CrewPool. CrewAI takes seconds to import, so it loads here on first use
+    (or up front in v1.startup.preload)."""
+    from backendcrew.src.backendcrew.pool import get_pool
+
+    return get_pool(workers or int(os.getenv("V1_CREW_WORKERS", "2")))
+
+
+def kickoff_crew(query: str, user_id: str = None) -> str:
+    limiter = limits.limiter(CREW_MODEL)
+    if limiter is not None:
+        # The crew's own calls bypass our clients; gate each kickoff behind interactive turns instead
+        limiter.acquire(level=BACKGROUND)
+    return crew_pool().kickoff({'query': query}, user_id=user_id).raw
+
+
+class CrewRunner:
+    def __init__(self, run: Callable[[str, Optional[str]], str] = kickoff_crew, max_workers: int = 2,
+                 timeout: float = 30.0, fallback: str = NO_INFORMATION):
+        self.run = run
+        self.timeout = timeout
+        self.fallback = fallback
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._lock = Lock()
+        self.queued = 0
+
+    def _set_queued(self, delta: int) -> None:
+        with self._lock:
+            self.queued += delta
+            metrics.set("crew_queue_depth", self.queued)
+
+    def _run(self, query: str, user_id: Optional[str]) -> str:
+        self._set_queued(-1)
+        start = time.perf_counter()
+        try:
+            return self.run(query, user_id)
+        finally:
+            metrics.observe("crew_run_seconds", time.perf_counter() - start)
+
+    def submit(self, query: str, user_id: str = None):
+        """Queue a crew run for ``query`` on behalf of ``user_id`` (the turn's user, if signed in)."""
+        self._set_queued(1)
+        return self.pool.submit(self._run, query, user_id)
+
+    def _result(self, future, error: BaseException = None) -> str:
+        if error is None:
+            metrics.inc("crew_queries_total", result="ok")
+            return future.result()
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+            # Drops it if still queued; a crew that already started runs on and is ignored
+            if future.cancel():
+                self._set_queued(-1)
+            metrics.inc("crew_queries_total", result="timeout")
+            log.warning("crewai query timed out", timeout=self.timeout)
+        else:
+            metrics.inc("crew_queries_total", result="error")
+            log.warning("crewai query failed", error=repr(error))
+        return self.fallback
+
+    def query(self, query: str, user_id: str = None) -> str:
+        future = self.submit(query, user_id)
+        try:
+            future.result(timeout=self.timeout)
+        except Exception as e:
+            return self._result(future, e)
+        return self._result(future)
+
+    async def aquery(self, query: str, user_id: str = None) -> str:
+        future = self.submit(query, user_id)
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except Exception as e:
+            return self._result(future, e)
+        return self._result(future)
+
+
+def runner_from_env() -> CrewRunner:
+    workers = int(os.getenv("V1_CREW_WORKERS", "2"))
+    runner = CrewRunner(max_workers=workers, timeout=float(os.getenv("V1_CREW_TIMEOUT", "30")))
+    if os.getenv("V1_CREW_WARMUP", "0") == "1":
+        # Build the crews in the background now rather than on the first query; by default a
+        # worker that never routes a turn to "query" never pays for them
+        runner.pool.submit(crew_pool, workers)
+    return runner
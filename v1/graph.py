@@ -2,51 +2,317 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import os
+from contextlib import contextmanager
+from threading import Lock
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.utils import accepts_config
+from langgraph.errors import GraphRecursionError
 from langgraph.graph import StateGraph, END
 
 import v1.state as state
+from storage import CheckpointConflict, get_checkpointer
+from v1.ledger import CostLedger
+from v1.logs import get_logger
+from v1.metrics import metrics
 from v1.nodes import Nodes
+from v1.tracing import TRACE_KEY, callback_handler, trace_parent, tracer
+
+log = get_logger(__name__)
+
+
+def node(func, afunc) -> RunnableLambda:
+    """A node with both a blocking and a native async implementation (used by ainvoke/astream).
+
+    Each run is timed into node_seconds{node} and traced as a span under the turn's span.
+    """
+    name = func.__name__
+
+    def run(state, config):
+        with tracer.span(name, trace_parent(config), node=name) as span:
+            try:
+                return func(state, config) if accepts_config(func) else func(state)
+            finally:
+                metrics.observe("node_seconds", span.seconds, node=name)
+
+    async def arun(state, config):
+        with tracer.span(name, trace_parent(config), node=name) as span:
+            try:
+                return await (afunc(state, config) if accepts_config(afunc) else afunc(state))
+            finally:
+                metrics.observe("node_seconds", span.seconds, node=name)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def build_graph(nodes: Nodes, checkpointer=None):
+    workflow = StateGraph(state.AssistantState)
+
+    # Add nodes
+    workflow.add_node("manage_context", node(nodes.manage_context, nodes.amanage_context))
+    workflow.add_node("respond_or_query", node(nodes.respond_or_query, nodes.arespond_or_query))
+    workflow.add_node("crewai_agent_query", node(nodes.crewai_query, nodes.acrewai_query))
+    workflow.add_node("main_conversation", node(nodes.main_conversation, nodes.amain_conversation))
+
+    # Add edges
+    workflow.set_entry_point("manage_context")
+    workflow.add_edge("manage_context", "respond_or_query")
+    workflow.add_conditional_edges(
+        "respond_or_query",
+        lambda x: "crewai_agent_query" if x["task_decision"] == "query" else (
+            "main_conversation" if x["task_decision"] == "respond" else "respond_or_query"),
+        {
+            "crewai_agent_query": "crewai_agent_query",
+            "main_conversation": "main_conversation",
+            "respond_or_query": "respond_or_query"
+        }
+    )
+    workflow.add_edge("crewai_agent_query", "respond_or_query")
+    workflow.add_edge("main_conversation", END)
+
+    # Compile the graph
+    return workflow.compile(checkpointer=checkpointer)
 
 
 class WorkFlow:
-    def __init__(self):
-        self.messages = []
-        nodes = Nodes()
-
-        workflow = StateGraph(state.AssistantState)
-
-        # Add nodes
-        workflow.add_node("respond_or_query", nodes.respond_or_query)
-        workflow.add_node("crewai_agent_query", nodes.crewai_query)
-        workflow.add_node("main_conversation", nodes.main_conversation)
-
-        # Add edges
-        workflow.set_entry_point("respond_or_query")
-        workflow.add_conditional_edges(
-            "respond_or_query",
-            lambda x: "crewai_agent_query" if x["task_decision"] == "query" else (
-                "main_conversation" if x["task_decision"] == "respond" else "respond_or_query"),
-            {
-                "crewai_agent_query": "crewai_agent_query",
-                "main_conversation": "main_conversation",
-                "respond_or_query": "respond_or_query"
-            }
-        )
-        workflow.add_edge("crewai_agent_query", "respond_or_query")
-        workflow.add_edge("main_conversation", END)
-
-        # Compile the graph
-        self.app = workflow.compile()
+    """One compiled graph shared by every chat.
+
+    Conversation history is kept by the checkpointer, keyed by thread id (the chat id),
+    so starting, clearing or deleting a chat never rebuilds the graph or the model client.
+    With a durable checkpointer (see storage.get_checkpointer) any worker can serve any turn.
+    Two workers running turns of one chat at once both start from the same checkpoint; the
+    one that saves second gets CheckpointConflict instead of overwriting the other's messages.
+    invoke/ainvoke then rerun the turn on the newer history; a stream, whose reply has
+    already gone out, appends its messages to the newer history instead. Both give up after
+    V1_CONFLICT_RETRIES attempts and re-raise.
+    """
+
+    def __init__(self, nodes: Nodes = None, checkpointer=None):
+        self.checkpointer = checkpointer or get_checkpointer()
+        self.app = build_graph(nodes or Nodes(), self.checkpointer)
+
+    # "exit" saves one checkpoint when the turn ends instead of one per step;
+    # "async" / "sync" also save every step, so a crashed turn can be resumed midway
+    durability = os.getenv("CHECKPOINT_DURABILITY", "exit")
+
+    # Hard cap on graph steps per turn; node-level limits (Nodes.max_llm_calls) normally end it sooner
+    max_steps = int(os.getenv("V1_MAX_STEPS", "16"))
+    # The reply of a turn that hits max_steps, instead of failing the request
+    step_limit_reply = "Sorry, I couldn't finish working on that. Could you try asking again?"
+
+    # Extra attempts for a turn whose checkpoint lost a race with another worker's turn
+    conflict_retries = int(os.getenv("V1_CONFLICT_RETRIES", "2"))
+
+    def conflict(self, thread_id: str, attempt: int) -> bool:
+        """Count a lost checkpoint race; True while the turn has attempts left."""
+        metrics.inc("checkpoint_conflicts_total")
+        log.warning("checkpoint conflict", thread_id=thread_id, attempt=attempt)
+        return attempt < self.conflict_retries
+
+    @staticmethod
+    def turn_messages(user_input: str, content: str) -> dict:
+        return {"messages": [HumanMessage(content=user_input), AIMessage(content=content)]}
+
+    def rebase(self, config: dict, user_input: str, content: str) -> None:
+        """Append a streamed turn whose checkpoint lost a race onto the chat's newer history."""
+        thread_id = config["configurable"]["thread_id"]
+        for attempt in range(1, self.conflict_retries + 1):
+            try:
+                self.app.update_state(config, self.turn_messages(user_input, content), as_node="main_conversation")
+                return
+            except CheckpointConflict:
+                if not self.conflict(thread_id, attempt):
+                    raise
+
+    async def arebase(self, config: dict, user_input: str, content: str) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        for attempt in range(1, self.conflict_retries + 1):
+            try:
+                await self.app.aupdate_state(config, self.turn_messages(user_input, content),
+                                             as_node="main_conversation")
+                return
+            except CheckpointConflict:
+                if not self.conflict(thread_id, attempt):
+                    raise
+
+    def step_limit(self, user_input: str, thread_id: str) -> dict:
+        metrics.inc("turn_limits_total", limit="steps")
+        log.warning("graph step limit reached", max_steps=self.max_steps, thread_id=thread_id)
+        return self.turn_messages(user_input, self.step_limit_reply)
+
+    @classmethod
+    def config(cls, thread_id: str, user_id: str = None, span=None, ledger: CostLedger = None) -> dict:
+        configurable = {"thread_id": thread_id}
+        if user_id:
+            configurable["user_id"] = user_id
+        config = {"configurable": configurable, "recursion_limit": cls.max_steps}
+        if span is not None:
+            # Nodes and LLM calls attach their spans under the turn's span
+            config.update(metadata={TRACE_KEY: span.context}, callbacks=[callback_handler])
+        if ledger is not None:
+            config["callbacks"] = config.get("callbacks", []) + [ledger]
+        return config
+
+    @contextmanager
+    def turn(self, thread_id: str, user_id: str = None, ledger: CostLedger = None):
+        """Run config for one chat turn, traced as a chat_turn span and timed into chat_turn_seconds."""
+        span = tracer.start("chat_turn", thread_id=thread_id, user_id=user_id or "")
+        ledger = ledger or CostLedger()
+        try:
+            yield self.config(thread_id, user_id, span, ledger)
+        except Exception as e:
+            span.fail(e)
+            raise
+        finally:
+            tracer.end(span)
+            metrics.observe("chat_turn_seconds", span.seconds)
+            ledger.record()
 
     def display_graph(self) -> str:
         return self.app.get_graph().draw_mermaid()
 
-    def invoke(self, user_input: str) -> dict:
-        self.messages.append(user_input)
-        return self.app.invoke({"messages": self.messages})
+    @staticmethod
+    def turn_input(user_input: str) -> dict:
+        return {"messages": [HumanMessage(content=user_input)],
+                "database_agent_response": "",
+                "invalid_decision_count": 0,
+                "llm_calls": 0,
+                "cached_reply": ""}
+
+    def invoke(self, user_input: str, thread_id: str = "default", user_id: str = None,
+               debug: bool = False) -> dict:
+        """Run one turn; with ``debug`` the result carries the turn's cost ledger under "ledger"."""
+        ledger = CostLedger()
+        with self.turn(thread_id, user_id, ledger) as config:
+            for attempt in range(self.conflict_retries + 1):
+                try:
+                    result = self.app.invoke(self.turn_input(user_input), config, durability=self.durability)
+                except GraphRecursionError:
+                    result = self.step_limit(user_input, thread_id)
+                except CheckpointConflict:
+                    if self.conflict(thread_id, attempt):
+                        continue
+                    raise
+                break
+        return {**result, "ledger": ledger.summary()} if debug else result
+
+    async def ainvoke(self, user_input: str, thread_id: str = "default", user_id: str = None,
+                      debug: bool = False) -> dict:
+        ledger = CostLedger()
+        with self.turn(thread_id, user_id, ledger) as config:
+            for attempt in range(self.conflict_retries + 1):
+                try:
+                    result = await self.app.ainvoke(self.turn_input(user_input), config, durability=self.durability)
+                except GraphRecursionError:
+                    result = self.step_limit(user_input, thread_id)
+                except CheckpointConflict:
+                    if self.conflict(thread_id, attempt):
+                        continue
+                    raise
+                break
+        return {**result, "ledger": ledger.summary()} if debug else result
+
+    @staticmethod
+    def _events(mode: str, chunk, reply: dict):
+        if mode == "messages":
+            message, metadata = chunk
+            # The node's returned AIMessage is echoed here too; only forward streamed chunks
+            if (isinstance(message, AIMessageChunk) and message.content
+                    and metadata.get("langgraph_node") == "main_conversation"):
+                yield "token", message.content
+        else:
+            for node_name, update in chunk.items():
+                yield "node", node_name
+                if node_name == "main_conversation" and update and update.get("messages"):
+                    reply["content"] = update["messages"][-1].content
+
+    def stream(self, user_input: str, thread_id: str = "default", user_id: str = None, debug: bool = False):
+        """Run one turn, yielding ``(event, payload)`` tuples as the graph progresses.
+
+        Events are ``("node", name)`` when a node finishes, ``("token", text)`` for each
+        chunk generated by main_conversation and a final ``("message", content)``. With
+        ``debug`` a ``("ledger", summary)`` event precedes the message.
+        """
+        reply = {"content": None}
+        ledger = CostLedger()
+        with self.turn(thread_id, user_id, ledger) as config:
+            try:
+                for mode, chunk in self.app.stream(self.turn_input(user_input), config,
+                                                   stream_mode=["messages", "updates"], durability=self.durability):
+                    yield from self._events(mode, chunk, reply)
+            except GraphRecursionError:
+                reply["content"] = self.step_limit(user_input, thread_id)["messages"][-1].content
+            except CheckpointConflict:
+                # The reply has been streamed already, so keep it rather than rerunning the turn
+                if reply["content"] is None or not self.conflict(thread_id, 0):
+                    raise
+                self.rebase(config, user_input, reply["content"])
+        if debug:
+            yield "ledger", ledger.summary()
+        yield "message", reply["content"]
+
+    async def astream(self, user_input: str, thread_id: str = "default", user_id: str = None,
+                      debug: bool = False):
+        """Async counterpart of stream()."""
+        reply = {"content": None}
+        ledger = CostLedger()
+        with self.turn(thread_id, user_id, ledger) as config:
+            try:
+                async for mode, chunk in self.app.astream(self.turn_input(user_input), config,
+                                                          stream_mode=["messages", "updates"],
+                                                          durability=self.durability):
+                    for event in self._events(mode, chunk, reply):
+                        yield event
+            except GraphRecursionError:
+                reply["content"] = self.step_limit(user_input, thread_id)["messages"][-1].content
+            except CheckpointConflict:
+                if reply["content"] is None or not self.conflict(thread_id, 0):
+                    raise
+                await self.arebase(config, user_input, reply["content"])
+        if debug:
+            yield "ledger", ledger.summary()
+        yield "message", reply["content"]
+
+    def clear(self, thread_id: str = "default"):
+        self.checkpointer.delete_thread(thread_id)
+
+
+_workflow: WorkFlow = None
+_checkpointer = None
+_workflow_lock = Lock()
+
+
+def shared_checkpointer():
+    """Return the process-wide checkpointer (CHECKPOINT_STORE), opening it on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _workflow_lock:
+            if _checkpointer is None:
+                _checkpointer = get_checkpointer()
+    return _checkpointer
+
+
+def get_workflow() -> WorkFlow:
+    """Return the process-wide WorkFlow, compiling it on first use."""
+    global _workflow
+    if _workflow is None:
+        checkpointer = shared_checkpointer()
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = WorkFlow(checkpointer=checkpointer)
+    return _workflow
+
+
+def clear_thread(thread_id: str) -> None:
+    """Drop a chat's conversation state.
+
+    Checkpoints are durable, so this deletes from the store even in a worker that hasn't
+    built the graph yet; otherwise the next turn would resume the old conversation.
+    """
+    shared_checkpointer().delete_thread(thread_id)
 
-    def clear(self):
-        self.messages = []
 
 if __name__ == "__main__":
     wf = WorkFlow()
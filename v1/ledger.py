@@ -0,0 +1,93 @@
+"""Per-turn cost ledger: every LLM call made by the graph, with tokens and time.
+
+A call that shared another caller's in-flight request (LLM_COALESCE) is listed with
+``"coalesced": true`` and no tokens; the leader's ledger carries its cost.
+"""
+import time
+from threading import Lock
+from typing import Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from v1.metrics import metrics
+from v1.tracing import model_name, usage
+
+
+def coalesced(response) -> bool:
+    return any((getattr(getattr(g, "message", None), "response_metadata", None) or {}).get("coalesced")
+               for generations in response.generations for g in generations)
+
+
+class CostLedger(BaseCallbackHandler):
+    """Collects one chat turn's LLM calls; pass it in the turn's callbacks."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = Lock()
+        self._open: Dict[UUID, tuple] = {}
+        self.calls: List[dict] = []
+
+    def on_chat_model_start(self, serialized: dict, messages, *, run_id: UUID, metadata: dict = None,
+                            invocation_params: dict = None, **kwargs) -> None:
+        metadata = metadata or {}
+        model = model_name(serialized, metadata, invocation_params or kwargs.get("invocation_params") or {})
+        with self._lock:
+            self._open[run_id] = (time.perf_counter(), model, metadata.get("langgraph_node", ""))
+
+    def _close(self, run_id: UUID, **entry) -> None:
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is not None:
+                started, model, node = opened
+                self.calls.append({"node": node, "model": model,
+                                   "seconds": round(time.perf_counter() - started, 6), **entry})
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        tokens = usage(response)
+        self._close(run_id, input_tokens=tokens["input"], output_tokens=tokens["output"],
+                    cached_tokens=tokens["cached"], coalesced=coalesced(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._close(run_id, input_tokens=0, output_tokens=0, cached_tokens=0, coalesced=False, error=repr(error))
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        by_node: Dict[str, dict] = {}
+        for call in calls:
+            node = by_node.setdefault(call["node"] or "other", {"llm_calls": 0, "input_tokens": 0,
+                                                                  "cached_tokens": 0, "output_tokens": 0,
+                                                                  "seconds": 0.0})
+            node["llm_calls"] += 1
+            node["input_tokens"] += call["input_tokens"]
+            node["cached_tokens"] += call["cached_tokens"]
+            node["output_tokens"] += call["output_tokens"]
+            node["seconds"] = round(node["seconds"] + call["seconds"], 6)
+        input_tokens = sum(c["input_tokens"] for c in calls)
+        cached_tokens = sum(c["cached_tokens"] for c in calls)
+        return {
+            "llm_calls": len(calls),
+            "coalesced_calls": sum(c["coalesced"] for c in calls),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": round(cached_tokens / input_tokens, 4) if input_tokens else 0.0,
+            "output_tokens": sum(c["output_tokens"] for c in calls),
+            "llm_seconds": round(sum(c["seconds"] for c in calls), 6),
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "by_node": by_node,
+            "calls": calls,
+        }
+
+    def record(self) -> None:
+        """Feed the turn's totals into the per-turn distributions in v1.metrics."""
+        with self._lock:
+            calls = list(self.calls)
+        metrics.observe("turn_llm_calls", len(calls))
+        metrics.observe("turn_tokens", sum(c["input_tokens"] + c["output_tokens"] for c in calls))
+        input_tokens = sum(c["input_tokens"] for c in calls)
+        if input_tokens:
+            # Share of the turn's prompt tokens served from the provider's prompt cache
+            metrics.observe("turn_cached_token_ratio", sum(c["cached_tokens"] for c in calls) / input_tokens)
@@ -0,0 +1,151 @@
+"""Structured, leveled logging that stays off the request path.
+
+Records are put on a bounded queue without formatting and written by a background
+listener thread, so a slow console never blocks a worker; when the queue is full the
+record is dropped and counted in log_records_dropped_total. Configured by env vars:
+
+    LOG_LEVEL        DEBUG/INFO/WARNING/... (default INFO)
+    LOG_FORMAT       json (default) or text
+    LOG_SAMPLE_RATE  fraction of sample=True records below WARNING that are kept (default 1)
+    LOG_MAX_CHARS    truncation limit for field values and payloads (default 500)
+    LOG_PAYLOADS     1 to emit debug payload dumps (chats, replies); off by default
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+
+from v1.metrics import metrics
+
+_STANDARD = frozenset(("exc_info", "stack_info", "stacklevel", "extra"))
+
+
+def truncate(value, limit: int):
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + f"...[{len(value) - limit} more chars]"
+    if isinstance(value, (int, float, bool, type(None))):
+        return value
+    return truncate(repr(value), limit)
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """``log.info("chat created", chat_id=...)``: keyword arguments become structured fields.
+
+    ``sample=True`` marks hot-path records that LOG_SAMPLE_RATE may drop.
+    """
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _STANDARD}
+        sampled = fields.pop("sample", False)
+        extra = kwargs.setdefault("extra", {})
+        extra["fields"] = {k: truncate(v, settings.max_chars) for k, v in fields.items()}
+        extra["sampled"] = sampled
+        return msg, kwargs
+
+    def payload(self, msg: str, payload, **fields) -> None:
+        """Debug dump of a whole payload; skipped before serialising unless LOG_PAYLOADS is set."""
+        if settings.payloads and self.isEnabledFor(logging.DEBUG):
+            self.debug(msg, payload=json.dumps(payload, default=str), **fields)
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return settings.sample_rate >= 1 or random.random() < settings.sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 6), "level": record.levelname, "logger": record.name,
+                 "msg": record.getMessage(), **getattr(record, "fields", {})}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        line = f"{stamp} {record.levelname:<7} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; the record stays in this process
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+
+class Settings:
+    def __init__(self):
+        self.sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+        self.max_chars = int(os.getenv("LOG_MAX_CHARS", "500"))
+        self.payloads = os.getenv("LOG_PAYLOADS", "0").lower() in ("1", "true", "yes")
+
+
+settings = Settings()
+_listener: QueueListener = None
+_handler: NonBlockingQueueHandler = None
+_lock = Lock()
+
+
+def configure(level: str = None, fmt: str = None, stream=None, queue_size: int = 10000) -> None:
+    """Route the root logger through the queue handler; later calls are no-ops."""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(TextFormatter() if (fmt or os.getenv("LOG_FORMAT", "json")) == "text" else JsonFormatter())
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        handler.addFilter(SamplingFilter())
+        root = logging.getLogger()
+        root.addHandler(handler)
+        _handler = handler
+        root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+        _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_handler)
+            _listener = _handler = None
+
+
+def _after_fork() -> None:
+    """Threads don't survive fork(): give a forked worker its own queue and listener thread."""
+    global _listener, _lock
+    _lock = Lock()
+    if _listener is not None:
+        _handler.queue = queue.Queue(maxsize=_handler.queue.maxsize)
+        _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name), {})
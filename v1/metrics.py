@@ -0,0 +1,123 @@
+import re
+from collections import defaultdict, deque
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+# Keep a bounded window of observations per series so quantiles stay cheap
+MAX_SAMPLES = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_INVALID = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def quantile(samples: Iterable[float], q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{_INVALID.sub("_", k)}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Thread-safe in-process counters, gauges and latency observations."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters: Dict[tuple, float] = defaultdict(float)
+        self.gauges: Dict[tuple, float] = {}
+        self.samples: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        # Lifetime count and sum per observed series; quantiles only cover the window
+        self.totals: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0])
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self.counters[_key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def unset(self, name: str, **labels) -> None:
+        """Drop a gauge series, e.g. one labelled by an id that is no longer active."""
+        with self._lock:
+            self.gauges.pop(_key(name, labels), None)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.samples[key].append(value)
+            totals = self.totals[key]
+            totals[0] += 1
+            totals[1] += value
+
+    def snapshot(self) -> dict:
+        def flat(key):
+            name, labels = key
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+            return {
+                "counters": {flat(k): v for k, v in self.counters.items()},
+                "gauges": {flat(k): v for k, v in self.gauges.items()},
+                "observations": {flat(k): {"count": len(v), "mean": sum(v) / len(v) if v else 0.0,
+                                           **{f"p{int(q * 100)}": quantile(v, q) for q in QUANTILES}}
+                                 for k, v in samples.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition; observations are summaries with p50/p95/p99."""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            samples = {k: list(v) for k, v in self.samples.items()}
+            totals = {k: tuple(v) for k, v in self.totals.items()}
+
+        lines = []
+
+        def family(series: dict, kind: str, render):
+            by_name = defaultdict(list)
+            for key, value in sorted(series.items()):
+                by_name[_INVALID.sub("_", key[0])].append((key, value))
+            for name, entries in by_name.items():
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in entries:
+                    render(name, key, value)
+
+        family(counters, "counter", lambda n, k, v: lines.append(f"{n}{_labels(k[1])} {v}"))
+        family(gauges, "gauge", lambda n, k, v: lines.append(f"{n}{_labels(k[1])} {v}"))
+
+        def summary(name, key, window):
+            labels = key[1]
+            for q in QUANTILES:
+                lines.append(f"{name}{_labels(labels, quantile=q)} {quantile(window, q)}")
+            count, total = totals.get(key, (len(window), sum(window)))
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        family(samples, "summary", summary)
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.samples.clear()
+            self.totals.clear()
+
+
+metrics = Metrics()
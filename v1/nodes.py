@@ -1,75 +1,307 @@
+import os
+import re
+import time
+from typing import Optional
+
 from v1.state import AssistantState
+from v1.context import ContextManager
+from v1.crew_runner import NO_INFORMATION, runner_from_env
+from v1.logs import get_logger
+from v1.metrics import metrics
+from v1.prompt_cache import CachedPrompt
+from v1.response_cache import cache_from_env
+from v1.router import RESPOND, QUERY, router_from_env
+from v1.speculation import speculation_key, speculator_from_env
 from langchain_core.messages import AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from backendcrew.src.backendcrew.crew import backendcrewCrew
+from langchain_core.prompts import MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
+from agent.utils import load_chat_model
+
+log = get_logger(__name__)
+
+
+# Each prompt keeps its fixed instructions (and, for the reply, the conversation so far) in a
+# prefix the provider can cache; per-call values come after it (see v1.prompt_cache)
+ROUTER_PROMPT = CachedPrompt([
+    ("system",
+     "Decide if we need to consult the CrewAI agents for more information or if we can respond directly. "
+     "Output ONLY 'query' or 'respond'. More than 10 invalid decisions will result in termination."),
+], [
+    ("human", "{input}"),
+    ("system", "Invalid decisions so far: {invalid_count}. "
+               "Context retrieved from CrewAI: {database_agent_response}. Query again?"),
+])
+
+QUERY_PROMPT = CachedPrompt([
+    ("system", "Formulate a natural language query for the CrewAI agents based on the student's question."),
+], [
+    ("human", "{input}"),
+])
+
+MAIN_PROMPT = CachedPrompt([
+    ("system",
+     "You are a helpful assistant for a student. Respond based on the conversation and any information from the CrewAI agents."),
+    ("system", "Summary of the earlier conversation: {summary}"),
+    MessagesPlaceholder("history"),
+], [
+    ("human", "{input}"),
+    ("system", "Information provided CrewAI Agent: {database_agent_response}\nResponse:"),
+])
+
+
+def router_inputs(state: AssistantState) -> dict:
+    return {"input": state["messages"][-1].content,
+            "invalid_count": state.get("invalid_decision_count", 0),
+            "database_agent_response": state.get("database_agent_response") or "None."}
+
+
+DECISION = re.compile(rf"\b({QUERY}|{RESPOND})", re.IGNORECASE)
+
+
+def parse_decision(state: AssistantState, content: str, retries: int = 2) -> dict:
+    """Map router output onto query/respond; the first of the two words in the reply wins.
+
+    Anything else is "invalid" and sends the graph back to the router, at most ``retries``
+    times per turn; after that the turn falls back to responding directly.
+    """
+    match = DECISION.search(content)
+    invalid_decision_count = state.get("invalid_decision_count", 0)
+    if match:
+        result = {"task_decision": match.group(1).lower(), "invalid_decision_count": 0}
+    elif invalid_decision_count < retries:
+        result = {"task_decision": "invalid", "invalid_decision_count": invalid_decision_count + 1}
+    else:
+        metrics.inc("turn_limits_total", limit="router_retries")
+        result = {"task_decision": RESPOND, "invalid_decision_count": 0, "router_path": "fallback"}
+
+    log.debug("task decision", decision=result["task_decision"], path=result.get("router_path", "llm"),
+              sample=True)
+    return result
+
+
+def main_inputs(state: AssistantState) -> dict:
+    return {
+        "input": state["messages"][-1].content,
+        "history": state["messages"][:-1],  # already bounded by manage_context
+        "summary": state.get("summary") or "None.",
+        "database_agent_response": state.get("database_agent_response") or "No additional information available."
+    }
+
+
+def config_user(config: RunnableConfig) -> Optional[str]:
+    """The turn's signed-in user (``configurable.user_id``), or None."""
+    user_id = (config or {}).get("configurable", {}).get("user_id")
+    return str(user_id) if user_id else None
+
 
+DEFAULT_CHAT_MODEL = "groq/llama-3.1-70b-versatile"
 
-def crewai_dummy(query: str) -> str:
-    return input("Database Query: " + query)
-    # return backendcrewCrew().crew().kickoff(inputs={'query': query}).raw
+
+def model_tier(env: str, default):
+    name = os.getenv(env)
+    return load_chat_model(name) if name else default
 
 
 class Nodes:
-    def __init__(self):
-        self.chat = ChatGroq(model="llama-3.1-70b-versatile")
-
-    def respond_or_query(self, state: AssistantState) -> AssistantState:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system",
-             "Decide if we need to consult the CrewAI agents for more information or if we can respond directly."
-             "Output ONLY 'query' or 'respond'. Invalid decisions so far: {invalid_count}. More than 10 will result in termination."),
-            ("human", "{input}"),
-            ("system", "Context retrieved from CrewAI: {database_agent_response}. Query again?"),
-        ])
-
-        chain = prompt | self.chat
-
-        decision = chain.invoke(
-            {"input": state["messages"][-1].content,
-             "invalid_count": state.get("invalid_decision_count", 0),
-             "database_agent_response": state.get("database_agent_response", "None.")})
-
-        decision_content = decision.content.strip(" \n\t\'.\"\\{}()/").lower()
-
-        invalid_decision_count = 0
-        # if decision_content.startswith("query") or 'query' in decision_content[:20]:
-        #     decision_content = "query"
-        if True or decision_content.startswith("respond") or 'respond' in decision_content[:20]:
-            decision_content = "respond"
+    def __init__(self, chat=None, router=None, context=None, response_cache=None, crew=None, speculator=None,
+                 router_chat=None, query_chat=None):
+        self.chat = chat or load_chat_model(os.getenv("V1_CHAT_MODEL", DEFAULT_CHAT_MODEL))
+        # Routing and query formulation are short classification/rewrite calls; V1_ROUTER_MODEL and
+        # V1_QUERY_MODEL can move them to a smaller tier (e.g. llamacpp/<file.gguf>)
+        self.router_chat = router_chat or model_tier("V1_ROUTER_MODEL", self.chat)
+        self.query_chat = query_chat or model_tier("V1_QUERY_MODEL", self.chat)
+        self.router_chain = ROUTER_PROMPT | self.router_chat
+        self.query_chain = QUERY_PROMPT | self.query_chat
+        self.main_chain = MAIN_PROMPT | self.chat
+        self.router = router or router_from_env()
+        self.context = context or ContextManager()
+        self.response_cache = response_cache or cache_from_env()
+        self.crew = crew or runner_from_env()
+        self.speculator = speculator or speculator_from_env()
+        # Running estimate of an LLM routing round trip, used to report latency saved
+        self.llm_router_seconds = float(os.getenv("V1_ROUTER_LLM_SECONDS", "0.5"))
+        # Per-turn limits: LLM calls across all nodes, and re-asks after an unparseable decision
+        self.max_llm_calls = int(os.getenv("V1_MAX_LLM_CALLS", "6"))
+        self.router_retries = int(os.getenv("V1_ROUTER_RETRIES", "2"))
+
+    def manage_context(self, state: AssistantState) -> AssistantState:
+        return self.context.update(state, self.chat)
+
+    async def amanage_context(self, state: AssistantState) -> AssistantState:
+        return await self.context.aupdate(state, self.chat)
+
+    def cheap_route(self, state: AssistantState):
+        start = time.perf_counter()
+        if state.get("database_agent_response"):
+            # Agent context has already been retrieved this turn, so answer with it
+            decision, path = RESPOND, "context"
         else:
-            # print("Invalid DECISION: ", decision_content, invalid_decision_count)
-            decision_content = "invalid"
-            invalid_decision_count = state.get("invalid_decision_count", 0) + 1
+            decision, path = self.router.route(state["messages"][-1].content)
+        if decision is None:
+            return None
+
+        elapsed = time.perf_counter() - start
+        metrics.inc("router_decisions_total", path=path, decision=decision)
+        metrics.observe("router_seconds", elapsed, path=path)
+        if not self.router.always_decides:
+            # Only a chain that can fall through to the LLM router had an LLM call to save
+            metrics.inc("router_seconds_saved_total", max(self.llm_router_seconds - elapsed, 0.0))
+        log.debug("task decision", decision=decision, path=path, sample=True)
+        return {"task_decision": decision, "invalid_decision_count": 0, "router_path": path}
 
-        print("Task Decision: ", decision_content)
+    def within_budget(self, state: AssistantState, calls: int) -> bool:
+        """Whether ``calls`` more LLM calls fit in this turn's V1_MAX_LLM_CALLS."""
+        return state.get("llm_calls", 0) + calls <= self.max_llm_calls
 
-        return {"task_decision": decision_content, "invalid_decision_count": invalid_decision_count}
+    def budget_route(self, state: AssistantState):
+        # The router call must leave room for the reply itself
+        if self.within_budget(state, 2):
+            return None
+        metrics.inc("turn_limits_total", limit="llm_calls")
+        metrics.inc("router_decisions_total", path="budget", decision=RESPOND)
+        log.debug("task decision", decision=RESPOND, path="budget", sample=True)
+        return {"task_decision": RESPOND, "invalid_decision_count": 0, "router_path": "budget"}
 
-    def crewai_query(self, state: AssistantState) -> AssistantState:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Formulate a natural language query for the CrewAI agents based on the student's question."),
-            ("human", "{input}"),
-        ])
-        chain = prompt | self.chat
-        result = chain.invoke({"input": state["messages"][-1].content})
+    def record_llm_route(self, state: AssistantState, result: dict, elapsed: float) -> AssistantState:
+        self.llm_router_seconds = 0.8 * self.llm_router_seconds + 0.2 * elapsed
+        metrics.inc("router_decisions_total", path="llm", decision=result["task_decision"])
+        metrics.observe("router_seconds", elapsed, path="llm")
+        return {"router_path": "llm", **result, "llm_calls": state.get("llm_calls", 0) + 1}
+
+    def settle(self, key, result: dict) -> AssistantState:
+        if key is not None and result["task_decision"] == RESPOND:
+            self.speculator.discard(key)
+        return result
+
+    def respond_or_query(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
+        result = self.cached_route(state, config) or self.cheap_route(state) or self.budget_route(state)
+        if result is not None:
+            return result
+        key = None
+        if self.speculator is not None:
+            # Retrieval runs alongside the router; crewai_query claims it on "query"
+            key = speculation_key(state, config)
+            self.speculator.start(key, lambda: self.retrieve(state["messages"][-1].content, config_user(config)))
+        start = time.perf_counter()
+        decision = self.router_chain.invoke(router_inputs(state))
+        return self.settle(key, self.record_llm_route(
+            state, parse_decision(state, decision.content, self.router_retries), time.perf_counter() - start))
+
+    async def arespond_or_query(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
+        result = self.cached_route(state, config) or self.cheap_route(state) or self.budget_route(state)
+        if result is not None:
+            return result
+        key = None
+        if self.speculator is not None:
+            key = speculation_key(state, config)
+            self.speculator.astart(key, lambda: self.aretrieve(state["messages"][-1].content, config_user(config)))
+        start = time.perf_counter()
+        decision = await self.router_chain.ainvoke(router_inputs(state))
+        return self.settle(key, self.record_llm_route(
+            state, parse_decision(state, decision.content, self.router_retries), time.perf_counter() - start))
+
+    def retrieve(self, text: str, user_id: str = None) -> str:
+        result = self.query_chain.invoke({"input": text})
 
         # print("CrewAI Query: ", result.content)
 
-        return {"database_agent_response": state.get("database_agent_response", "") + crewai_dummy(result.content)}
+        # The crew's tools read this user's data only, whatever the query asks for
+        return self.crew.query(result.content, user_id)
+
+    async def aretrieve(self, text: str, user_id: str = None) -> str:
+        result = await self.query_chain.ainvoke({"input": text})
+        return await self.crew.aquery(result.content, user_id)
 
-    def main_conversation(self, state: AssistantState) -> AssistantState:
+    def skip_retrieval(self, state: AssistantState, config: RunnableConfig):
+        """Out of LLM calls for query formulation plus the reply: answer without the crew."""
+        if self.within_budget(state, 2):
+            return None
+        if self.speculator is not None:
+            self.speculator.discard(speculation_key(state, config))
+        metrics.inc("turn_limits_total", limit="llm_calls")
+        log.warning("llm call budget exhausted, skipping retrieval", max_llm_calls=self.max_llm_calls)
+        return {"database_agent_response": state.get("database_agent_response") or NO_INFORMATION}
+
+    @staticmethod
+    def retrieved(state: AssistantState, response: str) -> AssistantState:
+        return {"database_agent_response": state.get("database_agent_response", "") + response,
+                "llm_calls": state.get("llm_calls", 0) + 1}
+
+    def crewai_query(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
+        skipped = self.skip_retrieval(state, config)
+        if skipped is not None:
+            return skipped
+        text = state["messages"][-1].content
+        work = self.speculator and self.speculator.take(speculation_key(state, config))
+        user_id = config_user(config)
+        try:
+            response = work.result() if work else self.retrieve(text, user_id)
+        except Exception as e:
+            log.warning("speculative retrieval failed", error=repr(e))
+            response = self.retrieve(text, user_id)
+        return self.retrieved(state, response)
+
+    async def acrewai_query(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
+        skipped = self.skip_retrieval(state, config)
+        if skipped is not None:
+            return skipped
+        text = state["messages"][-1].content
+        work = self.speculator and self.speculator.take(speculation_key(state, config))
+        user_id = config_user(config)
+        try:
+            response = await self.speculator.aresult(work) if work else await self.aretrieve(text, user_id)
+        except Exception as e:
+            log.warning("speculative retrieval failed", error=repr(e))
+            response = await self.aretrieve(text, user_id)
+        return self.retrieved(state, response)
+
+    def cache_scope(self, state: AssistantState, config: RunnableConfig):
+        """(user, context key) this turn's reply is cached under, or None without a cache.
+
+        The user is None for anonymous turns, which only share public entries.
+        """
+        if self.response_cache is None:
+            return None
+        size = self.response_cache.context
+        window = state["messages"][-1 - size:-1] if size else []
+        return config_user(config), self.response_cache.context_key([f"{m.type}: {m.content}" for m in window])
+
+    def cached_route(self, state: AssistantState, config: RunnableConfig):
+        """Answer a repeated question from the response cache before any router (or the crew) runs."""
+        scope = None if state.get("database_agent_response") else self.cache_scope(state, config)
+        if scope is None:
+            return None
+        user, context = scope
+        cached = self.response_cache.lookup(user, state["messages"][-1].content, context)
+        if cached is None:
+            return None
+        metrics.inc("router_decisions_total", path="cache", decision=RESPOND)
+        log.debug("task decision", decision=RESPOND, path="cache", sample=True)
+        return {"task_decision": RESPOND, "invalid_decision_count": 0, "router_path": "cache",
+                "cached_reply": cached}
+
+    def cache_reply(self, state: AssistantState, config: RunnableConfig, content: str, elapsed: float) -> None:
+        scope = self.cache_scope(state, config)
+        if scope is not None:
+            user, context = scope
+            self.response_cache.store(user, state["messages"][-1].content, content,
+                                      private=bool(state.get("database_agent_response")), context=context,
+                                      llm_seconds=elapsed)
+
+    def main_conversation(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
         # print("Context Received: ", state.get("database_agent_response", "No additional information available."))
-        prompt = ChatPromptTemplate.from_messages([
-            ("system",
-             "You are a helpful assistant for a student. Respond based on the conversation and any information from the CrewAI agents."),
-            ("human", "{input}"),
-            ("system", "Information provided CrewAI Agent: {database_agent_response}\nResponse:"),
-        ])
-        chain = prompt | self.chat
-        response = chain.invoke({
-            "input": state["messages"][-1].content,
-            "database_agent_response": state.get("database_agent_response", "No additional information available.")
-        })
-        print("AI Agent reply: ", response.content)
-        return {"messages": [AIMessage(content=response.content)]}
+        if state.get("cached_reply"):
+            return {"messages": [AIMessage(content=state["cached_reply"])]}
+        start = time.perf_counter()
+        response = self.main_chain.invoke(main_inputs(state))
+        self.cache_reply(state, config, response.content, time.perf_counter() - start)
+        log.payload("ai reply", response.content)
+        return {"messages": [AIMessage(content=response.content)], "llm_calls": state.get("llm_calls", 0) + 1}
+
+    async def amain_conversation(self, state: AssistantState, config: RunnableConfig = None) -> AssistantState:
+        if state.get("cached_reply"):
+            return {"messages": [AIMessage(content=state["cached_reply"])]}
+        start = time.perf_counter()
+        response = await self.main_chain.ainvoke(main_inputs(state))
+        self.cache_reply(state, config, response.content, time.perf_counter() - start)
+        return {"messages": [AIMessage(content=response.content)], "llm_calls": state.get("llm_calls", 0) + 1}
@@ -0,0 +1,66 @@
+"""Prompt layouts that providers can serve from their prompt (prefix) cache.
+
+Providers reuse the work done on the longest prefix of a prompt they have seen recently:
+Groq and OpenAI do it automatically, Anthropic up to a ``cache_control`` breakpoint. A
+CachedPrompt therefore keeps what is the same across calls (instructions, the running
+summary, earlier turns) in a prefix, and everything that changes (the new question,
+retry counts, retrieved context) after it.
+"""
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_cache_control(model) -> bool:
+    """Whether ``model`` (or every model behind a pool) honours Anthropic-style breakpoints."""
+    members = getattr(model, "members", None)
+    if members is not None:
+        return bool(members) and all(supports_cache_control(m.model) for m in members)
+    return getattr(model, "_llm_type", "").startswith("anthropic")
+
+
+def with_breakpoint(message: BaseMessage) -> BaseMessage:
+    """A copy of ``message`` whose last content block ends a cached prefix."""
+    blocks = [{"type": "text", "text": message.content}] if isinstance(message.content, str) \
+        else [dict(block) for block in message.content]
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": blocks})
+
+
+class CachedPrompt:
+    """A chat prompt split into a stable ``prefix`` and a volatile ``suffix``.
+
+    Both are compiled once. ``prompt | model`` (or ``chain(model)``) formats the two in
+    order and, for models that support it, marks the prefix's last message as a cache
+    breakpoint.
+    """
+
+    def __init__(self, prefix: Sequence, suffix: Sequence):
+        self.prefix = ChatPromptTemplate.from_messages(prefix)
+        self.suffix = ChatPromptTemplate.from_messages(suffix)
+        self.template = self.prefix + self.suffix
+        self.marked = RunnableLambda(self.format_marked, name="CachedPrompt")
+
+    @property
+    def input_variables(self):
+        return self.template.input_variables
+
+    def format_messages(self, **inputs) -> list:
+        return self.template.format_messages(**inputs)
+
+    def format_marked(self, inputs: dict) -> ChatPromptValue:
+        prefix = self.prefix.format_messages(**inputs)
+        if prefix:
+            prefix[-1] = with_breakpoint(prefix[-1])
+        return ChatPromptValue(messages=prefix + self.suffix.format_messages(**inputs))
+
+    def chain(self, model) -> Runnable:
+        return (self.marked if supports_cache_control(model) else self.template) | model
+
+    def __or__(self, model) -> Runnable:
+        return self.chain(model)
@@ -0,0 +1,159 @@
+"""Opt-in cache of main_conversation replies for repeated student questions.
+
+Lookups try an exact match on the normalised question, then the most similar cached
+question in scope (hashed bag-of-words cosine, or a supplied embedding function).
+Entries expire after ``ttl`` seconds and the least recently used are evicted beyond
+``max_entries``.
+
+A scope is the user who asked plus a digest of the conversation the reply depends on:
+the last ``context`` messages before the question (V1_RESPONSE_CACHE_CONTEXT, default 2,
+so a follow-up only matches after the same exchange). With ``share_public``
+(V1_RESPONSE_CACHE_SHARE_PUBLIC=1, off by default) a reply that used no agent data and
+that shareable() classifies as non-personal goes to a public scope every user can hit.
+Anonymous turns (no user id) only read and write public entries.
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Set, Tuple
+
+from v1.metrics import metrics
+from v1.router import cosine, hash_embed
+
+PUBLIC = "__public__"
+
+_SPACE = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^\w\s]")
+# First-person and possessive words, digits (grades, dates, ids) and e-mail addresses
+_PERSONAL = re.compile(r"\b(i|i'm|i've|i'd|me|my|mine|myself|we|our|ours|us|your|yours|you're)\b|\d|@",
+                       re.IGNORECASE)
+
+
+def normalize(text: str) -> str:
+    return _SPACE.sub(" ", _PUNCT.sub("", text.lower())).strip()
+
+
+def shareable(question: str, response: str) -> bool:
+    """Whether a question and its reply look free of personal details, so other users may see it.
+
+    Deliberately conservative: anything mentioning the student, a number or an address stays private.
+    """
+    return not (_PERSONAL.search(question) or _PERSONAL.search(response))
+
+
+class Entry(NamedTuple):
+    response: str
+    vector: dict
+    expires: float
+
+
+Scope = Tuple[str, str]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0, threshold: float = 0.8,
+                 share_public: bool = False, context: int = 2, embed: Callable[[str], dict] = hash_embed):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.share_public = share_public
+        self.context = context
+        self.embed = embed
+        self._lock = Lock()
+        self._entries: "OrderedDict[Tuple[Scope, str], Entry]" = OrderedDict()
+        self._by_scope: Dict[Scope, Set[str]] = {}
+        # Running estimate of a main_conversation LLM call, to report latency saved
+        self.llm_seconds = 0.0
+
+    def context_key(self, history: Sequence[str]) -> str:
+        """Digest of the last ``context`` entries of ``history`` (the turns before the question)."""
+        window = history[-self.context:] if self.context else ()
+        digest = hashlib.blake2b(digest_size=8)
+        for text in window:
+            digest.update(normalize(text).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _drop(self, key: Tuple[Scope, str]) -> None:
+        del self._entries[key]
+        scope, question = key
+        keys = self._by_scope[scope]
+        keys.discard(question)
+        if not keys:
+            del self._by_scope[scope]
+
+    def _find(self, scope: Scope, question: str, vector: dict, now: float) -> Tuple[Optional[str], str]:
+        entry = self._entries.get((scope, question))
+        if entry is not None and entry.expires > now:
+            self._entries.move_to_end((scope, question))
+            return entry.response, "exact"
+        best, best_key = self.threshold, None
+        for cached in self._by_scope.get(scope, ()):
+            candidate = self._entries[(scope, cached)]
+            if candidate.expires <= now:
+                continue
+            score = cosine(vector, candidate.vector)
+            if score >= best:
+                best, best_key = score, (scope, cached)
+        if best_key is None:
+            return None, "miss"
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key].response, "semantic"
+
+    def lookup(self, user: Optional[str], text: str, context: str = "") -> Optional[str]:
+        """Cached reply to ``text`` after the conversation ``context`` (see context_key)."""
+        question = normalize(text)
+        vector = self.embed(question)
+        now = time.monotonic()
+        response, kind = None, "miss"
+        with self._lock:
+            if user is not None:
+                response, kind = self._find((user, context), question, vector, now)
+            if response is None and self.share_public:
+                response, kind = self._find((PUBLIC, context), question, vector, now)
+        metrics.inc("response_cache_lookups_total", result=kind)
+        if response is not None:
+            metrics.inc("response_cache_seconds_saved_total", self.llm_seconds)
+        return response
+
+    def store(self, user: Optional[str], text: str, response: str, private: bool, context: str = "",
+              llm_seconds: float = None) -> None:
+        if llm_seconds is not None:
+            self.llm_seconds = llm_seconds if not self.llm_seconds else 0.8 * self.llm_seconds + 0.2 * llm_seconds
+        public = self.share_public and not private and shareable(text, response)
+        if not public and user is None:
+            return
+        scope = (PUBLIC if public else user, context)
+        question = normalize(text)
+        entry = Entry(response, self.embed(question), time.monotonic() + self.ttl)
+        with self._lock:
+            key = (scope, question)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._by_scope.setdefault(scope, set()).add(question)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                metrics.inc("response_cache_evictions_total")
+            metrics.set("response_cache_entries", len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+
+def cache_from_env() -> Optional[ResponseCache]:
+    """ResponseCache configured by V1_RESPONSE_CACHE* env vars, or None when not enabled."""
+    if os.getenv("V1_RESPONSE_CACHE", "0").lower() not in ("1", "true", "yes"):
+        return None
+    return ResponseCache(
+        max_entries=int(os.getenv("V1_RESPONSE_CACHE_SIZE", "2048")),
+        ttl=float(os.getenv("V1_RESPONSE_CACHE_TTL", "3600")),
+        threshold=float(os.getenv("V1_RESPONSE_CACHE_THRESHOLD", "0.8")),
+        share_public=os.getenv("V1_RESPONSE_CACHE_SHARE_PUBLIC", "0").lower() in ("1", "true", "yes"),
+        context=int(os.getenv("V1_RESPONSE_CACHE_CONTEXT", "2")),
+    )
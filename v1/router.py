@@ -0,0 +1,232 @@
+"""Cheap routing policies that can settle respond/query without an LLM round trip.
+
+Every router's route() returns ``(decision, path)``: "respond" or "query" and the name of
+the router that settled it, or ``(None, "llm")`` when it is unsure; the LLM router in
+Nodes.respond_or_query only runs in that last case. A router with ``always_decides`` is
+never unsure, so with it the LLM router is never reached.
+"""
+import json
+import math
+import os
+import random
+import re
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+RESPOND = "respond"
+QUERY = "query"
+
+# Messages that need the student's own data (schedule, grades, notes) or the outside world
+QUERY_KEYWORDS = (
+    "due", "deadline", "schedule", "calendar", "timetable", "exam date", "my grade", "my grades",
+    "my score", "my notes", "my tasks", "my progress", "remind", "reminder", "weather", "today's",
+    "this week", "tomorrow", "upcoming",
+)
+# Small talk and general explanations the main model can answer on its own
+RESPOND_KEYWORDS = (
+    "hi", "hello", "hey", "thanks", "thank you", "explain", "what is", "what are", "how does",
+    "how do", "why", "define", "summarize", "summarise", "help me understand",
+)
+
+EXAMPLES = [
+    ("what's due this week", QUERY),
+    ("when is my next exam", QUERY),
+    ("show me my study schedule for tomorrow", QUERY),
+    ("how am i doing in math", QUERY),
+    ("remind me to revise chemistry tonight", QUERY),
+    ("what is the weather like today", QUERY),
+    ("which assignments have i not finished", QUERY),
+    ("explain photosynthesis", RESPOND),
+    ("what is a derivative", RESPOND),
+    ("how does the french revolution start", RESPOND),
+    ("give me tips to focus while studying", RESPOND),
+    ("hello there", RESPOND),
+    ("thanks for the help", RESPOND),
+    ("can you quiz me on the periodic table", RESPOND),
+]
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def hash_embed(text: str, dims: int = 2 ** 12) -> dict:
+    """L2-normalised sparse vector of hashed unigrams and bigrams."""
+    tokens = tokenize(text)
+    features = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+    vec = Counter(zlib.crc32(f.encode()) % dims for f in features)
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {k: v / norm for k, v in vec.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    """Cosine similarity of two hash_embed vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+UNSURE = (None, "llm")
+
+
+class StaticRouter:
+    """Always returns the same decision."""
+    name = "static"
+    always_decides = True
+
+    def __init__(self, decision: str = RESPOND):
+        self.decision = decision
+
+    def route(self, text: str) -> Tuple[Optional[str], str]:
+        return self.decision, self.name
+
+
+class KeywordRouter:
+    """Decides when exactly one side's keywords match; unsure otherwise."""
+    name = "keyword"
+    always_decides = False
+
+    def __init__(self, query_keywords: Iterable[str] = QUERY_KEYWORDS,
+                 respond_keywords: Iterable[str] = RESPOND_KEYWORDS):
+        self.query = self._compile(query_keywords)
+        self.respond = self._compile(respond_keywords)
+
+    @staticmethod
+    def _compile(keywords: Iterable[str]):
+        return re.compile(r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b")
+
+    def route(self, text: str) -> Tuple[Optional[str], str]:
+        text = text.lower()
+        wants_query = self.query.search(text) is not None
+        wants_respond = self.respond.search(text) is not None
+        if wants_query and not wants_respond:
+            return QUERY, self.name
+        if wants_respond and not wants_query:
+            return RESPOND, self.name
+        return UNSURE
+
+
+class SimilarityRouter:
+    """Nearest-exemplar routing over hashed bag-of-words vectors (no model download needed)."""
+    name = "similarity"
+    always_decides = False
+
+    def __init__(self, examples: Iterable[Tuple[str, str]] = EXAMPLES, threshold: float = 0.5,
+                 margin: float = 0.1, dims: int = 2 ** 12):
+        self.dims = dims
+        self.threshold = threshold
+        self.margin = margin
+        self.examples = [(self.embed(text), label) for text, label in examples]
+
+    def embed(self, text: str) -> dict:
+        return hash_embed(text, self.dims)
+
+    def route(self, text: str) -> Tuple[Optional[str], str]:
+        vec = self.embed(text)
+        best = {QUERY: 0.0, RESPOND: 0.0}
+        for example, label in self.examples:
+            best[label] = max(best[label], cosine(vec, example))
+        label, score = max(best.items(), key=lambda item: item[1])
+        other = min(best.values())
+        if score >= self.threshold and score - other >= self.margin:
+            return label, self.name
+        return UNSURE
+
+
+class ClassifierRouter:
+    """Logistic regression over hash_embed features, trained on labelled (text, decision) pairs.
+
+    Training on the LLM router's own past decisions distils it into a sub-millisecond
+    model. Unsure unless the winning side's probability reaches ``confidence``.
+    """
+    name = "classifier"
+    always_decides = False
+
+    def __init__(self, examples: Iterable[Tuple[str, str]] = EXAMPLES, confidence: float = 0.75,
+                 dims: int = 2 ** 12, epochs: int = 40, learning_rate: float = 0.5, l2: float = 1e-4):
+        self.dims = dims
+        self.confidence = confidence
+        self.weights: dict = {}
+        self.bias = 0.0
+        self.fit(examples, epochs, learning_rate, l2)
+
+    @classmethod
+    def from_jsonl(cls, path: str, **kwargs) -> "ClassifierRouter":
+        """Train on a file of {"text": ..., "label": "query"|"respond"} lines."""
+        return cls(load_labelled(path), **kwargs)
+
+    def fit(self, examples: Iterable[Tuple[str, str]], epochs: int = 40, learning_rate: float = 0.5,
+            l2: float = 1e-4) -> None:
+        data = [(hash_embed(text, self.dims), 1.0 if label == QUERY else 0.0) for text, label in examples]
+        order = random.Random(0)
+        for _ in range(epochs):
+            order.shuffle(data)
+            for vec, target in data:
+                error = self._probability(vec) - target
+                for k, v in vec.items():
+                    w = self.weights.get(k, 0.0)
+                    self.weights[k] = w - learning_rate * (error * v + l2 * w)
+                self.bias -= learning_rate * error
+
+    def _probability(self, vec: dict) -> float:
+        z = self.bias + sum(v * self.weights.get(k, 0.0) for k, v in vec.items())
+        return 1 / (1 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def probability(self, text: str) -> float:
+        """P(query) for ``text``."""
+        return self._probability(hash_embed(text, self.dims))
+
+    def route(self, text: str) -> Tuple[Optional[str], str]:
+        p = self.probability(text)
+        if p >= self.confidence:
+            return QUERY, self.name
+        if 1 - p >= self.confidence:
+            return RESPOND, self.name
+        return UNSURE
+
+
+def load_labelled(path: str) -> List[Tuple[str, str]]:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["label"]) for row in rows]
+
+
+class RouterChain:
+    """Try each cheap router in order; the first confident answer wins."""
+
+    def __init__(self, routers: List):
+        self.routers = routers
+
+    @property
+    def always_decides(self) -> bool:
+        return any(router.always_decides for router in self.routers)
+
+    def route(self, text: str) -> Tuple[Optional[str], str]:
+        for router in self.routers:
+            decision, path = router.route(text)
+            if decision is not None:
+                return decision, path
+        return UNSURE
+
+
+def router_from_env() -> RouterChain:
+    """Build the router chain from V1_ROUTER, e.g. "static:respond", "keyword,classifier" or "llm"."""
+    spec = os.getenv("V1_ROUTER", "static:respond")
+    routers = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, arg = part.partition(":")
+        if name == "static":
+            routers.append(StaticRouter(arg or RESPOND))
+        elif name == "keyword":
+            routers.append(KeywordRouter())
+        elif name == "similarity":
+            routers.append(SimilarityRouter(threshold=float(arg) if arg else 0.5))
+        elif name == "classifier":
+            # classifier:<labelled.jsonl> trains on that file instead of the built-in examples
+            routers.append(ClassifierRouter.from_jsonl(arg) if arg else ClassifierRouter())
+        elif name != "llm":
+            raise ValueError(f"Unknown router {name!r} in V1_ROUTER")
+    return RouterChain(routers)
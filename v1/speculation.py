@@ -0,0 +1,139 @@
+"""Start CrewAI retrieval while the router is still deciding.
+
+When the LLM router has to run, the retrieval it might ask for (query formulation plus
+the crew) is launched alongside it. If the router says "query", crewai_query picks the
+running result up instead of starting from scratch; if it says "respond", the work is
+cancelled, or left to finish and ignored when it can't be interrupted.
+
+Launches are limited by a per-minute budget and a cap on in-flight speculations.
+Outcomes are counted in speculation_total{outcome=win|wasted|skipped}, and
+speculation_win_rate tracks wins / (wins + wasted).
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from agent.rate_limit import background, in_background
+from v1.metrics import metrics
+
+# Unclaimed speculations older than this are dropped (e.g. the turn failed)
+STALE_SECONDS = 300.0
+
+
+def speculation_key(state, config) -> Optional[Tuple[str, str]]:
+    """(thread, human message id) identifying the turn a speculation belongs to."""
+    message = state["messages"][-1]
+    if not getattr(message, "id", None):
+        return None
+    thread = ((config or {}).get("configurable") or {}).get("thread_id", "default")
+    return str(thread), message.id
+
+
+class Speculator:
+    def __init__(self, budget_per_minute: float = 30.0, max_inflight: int = 4):
+        self.budget_per_minute = budget_per_minute
+        self.max_inflight = max_inflight
+        self._lock = Lock()
+        self._tokens = budget_per_minute
+        self._refilled = time.monotonic()
+        self._pending: Dict[tuple, Tuple[object, float]] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="speculate")
+        self.wins = 0
+        self.wasted = 0
+
+    def _admit(self, key: tuple, now: float) -> bool:
+        for stale in [k for k, (_, started) in self._pending.items() if now - started > STALE_SECONDS]:
+            self._cancel(self._pending.pop(stale)[0])
+        if key in self._pending:
+            return False
+        self._tokens = min(self.budget_per_minute,
+                           self._tokens + (now - self._refilled) * self.budget_per_minute / 60)
+        self._refilled = now
+        if self._tokens < 1 or len(self._pending) >= self.max_inflight:
+            metrics.inc("speculation_total", outcome="skipped")
+            return False
+        self._tokens -= 1
+        return True
+
+    def start(self, key: Optional[tuple], run: Callable[[], str]) -> None:
+        """Run ``run`` on the speculation pool for ``key``, budget permitting."""
+        if key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not self._admit(key, now):
+                return
+            # Speculative LLM calls queue behind interactive ones (agent.rate_limit)
+            self._pending[key] = (self._pool.submit(in_background, run), now)
+        metrics.inc("speculation_launches_total")
+
+    def astart(self, key: Optional[tuple], run) -> None:
+        """Async counterpart of start(); ``run`` is a coroutine function. Needs a running loop."""
+        if key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not self._admit(key, now):
+                return
+            with background():
+                # The task copies the current context, so its LLM calls run at background priority
+                self._pending[key] = (asyncio.ensure_future(run()), now)
+        metrics.inc("speculation_launches_total")
+
+    @classmethod
+    def from_env(cls) -> "Speculator":
+        return cls(budget_per_minute=float(os.getenv("V1_SPECULATE_BUDGET", "30")),
+                   max_inflight=int(os.getenv("V1_SPECULATE_MAX_INFLIGHT", "4")))
+
+    @staticmethod
+    def _cancel(work) -> None:
+        work.cancel()
+        if isinstance(work, asyncio.Future) and not work.cancelled():
+            # Retrieve any exception so asyncio doesn't log it as never retrieved
+            work.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def _record(self, outcome: str) -> None:
+        with self._lock:
+            if outcome == "win":
+                self.wins += 1
+            else:
+                self.wasted += 1
+            rate = self.wins / (self.wins + self.wasted)
+        metrics.inc("speculation_total", outcome=outcome)
+        metrics.set("speculation_win_rate", rate)
+
+    def take(self, key: Optional[tuple]):
+        """The running speculation for ``key`` (a Future or asyncio task), or None."""
+        with self._lock:
+            entry = self._pending.pop(key, None) if key is not None else None
+        if entry is None:
+            return None
+        work, started = entry
+        self._record("win")
+        # The retrieval had this long of a head start over a sequential run
+        metrics.inc("speculation_seconds_saved_total", time.monotonic() - started)
+        return work
+
+    def discard(self, key: Optional[tuple]) -> None:
+        """The router chose not to query: cancel the speculation, or ignore its result."""
+        with self._lock:
+            entry = self._pending.pop(key, None) if key is not None else None
+        if entry is not None:
+            self._cancel(entry[0])
+            self._record("wasted")
+
+    @staticmethod
+    async def aresult(work) -> str:
+        if isinstance(work, Future):
+            return await asyncio.wrap_future(work)
+        return await work
+
+
+def speculator_from_env() -> Optional[Speculator]:
+    """Speculator configured by V1_SPECULATE* env vars, or None when speculation is off."""
+    if os.getenv("V1_SPECULATE", "0").lower() not in ("1", "true", "yes"):
+        return None
+    return Speculator.from_env()
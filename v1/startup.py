@@ -0,0 +1,58 @@
+"""Start-up work a pre-forking server can do once, before it forks its workers.
+
+Importing flask_app only loads what the request path needs; CrewAI, provider SDKs and the
+tokenizer load on first use. Under ``gunicorn -c gunicorn.conf.py`` the master calls
+preload() instead, so those pages are loaded once and shared copy-on-write, and each
+worker calls warm_worker() before it accepts requests.
+"""
+import gc
+import os
+import time
+
+from agent.utils import load_chat_model, warm_up
+from v1.context import estimate_tokens
+from v1.logs import get_logger
+from v1.nodes import DEFAULT_CHAT_MODEL
+
+log = get_logger(__name__)
+
+
+def _load(what: str, load, *args) -> None:
+    try:
+        load(*args)
+    except Exception as e:  # It loads (or fails) on first use instead
+        log.warning("preload skipped", subsystem=what, error=repr(e))
+
+
+def _import_crew_pool() -> None:
+    import backendcrew.src.backendcrew.pool  # noqa: F401  CrewAI, its agents and tools
+
+
+def preload() -> None:
+    """Import the lazily loaded subsystems and build the configured model clients.
+
+    Each subsystem is optional: one that fails to load is logged and skipped, never fatal
+    to the master. Nothing here opens a connection (the chat and analytics stores open on
+    first use, in the workers), and the one thread it may start, CrewAI's telemetry
+    exporter, is restarted by OpenTelemetry in each forked child, so it is safe to fork()
+    afterwards. gc.freeze() then keeps the collector in the workers from touching, and so
+    un-sharing, everything loaded so far.
+    """
+    start = time.perf_counter()
+    _load("crew pool", _import_crew_pool)
+    _load("tokenizer", estimate_tokens, "")
+    for name in (os.getenv("V1_CHAT_MODEL", DEFAULT_CHAT_MODEL), os.getenv("V1_ROUTER_MODEL"),
+                 os.getenv("V1_QUERY_MODEL")):
+        if name:
+            _load(f"model {name}", load_chat_model, name)
+    _load("model warm-up", warm_up)
+    gc.collect()
+    gc.freeze()
+    log.info("preloaded", seconds=round(time.perf_counter() - start, 3))
+
+
+def warm_worker() -> None:
+    """Build this process's workflow (graph, checkpointer, crew pool) ahead of its first turn."""
+    from v1.graph import get_workflow
+
+    get_workflow()
@@ -4,4 +4,8 @@ from langgraph.graph import MessagesState
 class AssistantState(MessagesState):
     task_decision: str
     database_agent_response: str
-    invalid_decision_count: int
\ No newline at end of file
+    invalid_decision_count: int
+    router_path: str
+    summary: str
+    llm_calls: int
+    cached_reply: str
@@ -0,0 +1,270 @@
+"""Spans for chat turns, graph nodes and LLM calls.
+
+Spans carry OpenTelemetry-style ids (32-hex trace id, 16-hex span id) and are handed
+to the exporter chosen by V1_TRACE_EXPORTER when they end:
+
+    memory          keep the most recent spans in process (default; see recent())
+    jsonl:<path>    append one OTLP-shaped JSON span per line, for a local collector
+    otel            re-emit through the opentelemetry SDK, if it is installed
+    none            record metrics only
+
+Every node and LLM call also feeds node_seconds / llm_seconds / llm_tokens_total in
+v1.metrics, whatever the exporter.
+"""
+import json
+import os
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from v1.metrics import metrics
+
+TRACE_KEY = "trace_parent"
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str = None, parent_id: str = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+
+    @property
+    def context(self) -> tuple:
+        return self.trace_id, self.span_id
+
+    def child(self, name: str, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, **attributes)
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(error).__name__
+        self.attributes["exception.message"] = str(error)
+
+    def to_dict(self) -> dict:
+        """OTLP JSON span shape."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR" if self.status == "ERROR" else "STATUS_CODE_OK"},
+        }
+
+
+class MemoryExporter:
+    def __init__(self, max_spans: int = 4096):
+        self._lock = Lock()
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def recent(self, trace_id: str = None) -> List[dict]:
+        with self._lock:
+            spans = list(self.spans)
+        return [s.to_dict() for s in spans if trace_id is None or s.trace_id == trace_id]
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict()) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class OTelExporter:
+    """Replays finished spans into an opentelemetry tracer, keeping their timestamps."""
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self.trace = trace
+        self.tracer = trace.get_tracer("studytracker.v1")
+
+    def export(self, span: Span) -> None:
+        otel_span = self.tracer.start_span(span.name, start_time=span.start_ns,
+                                           attributes={k: str(v) for k, v in span.attributes.items()})
+        if span.status == "ERROR":
+            otel_span.set_status(self.trace.Status(self.trace.StatusCode.ERROR))
+        otel_span.end(end_time=span.end_ns)
+
+
+class NullExporter:
+    def export(self, span: Span) -> None:
+        pass
+
+
+def exporter_from_env():
+    spec = os.getenv("V1_TRACE_EXPORTER", "memory")
+    name, _, arg = spec.partition(":")
+    if name == "memory":
+        return MemoryExporter(int(arg) if arg else 4096)
+    if name == "jsonl":
+        return JsonlExporter(arg or "traces.jsonl")
+    if name == "otel":
+        return OTelExporter()
+    if name == "none":
+        return NullExporter()
+    raise ValueError(f"Unknown V1_TRACE_EXPORTER {spec!r}")
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("v1_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter or exporter_from_env()
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current.get()
+
+    def start(self, name: str, parent: Optional[tuple] = None, **attributes) -> Span:
+        """Open a span under ``parent`` (a (trace_id, span_id) pair), else under the current span."""
+        if parent is None and _current.get() is not None:
+            parent = _current.get().context
+        trace_id, parent_id = parent or (None, None)
+        return Span(name, trace_id, parent_id, **attributes)
+
+    def end(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[tuple] = None, **attributes):
+        """Run the block inside a span; LLM calls made in it become its children."""
+        span = self.start(name, parent, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.end(span)
+
+    def recent(self, trace_id: str = None) -> List[dict]:
+        return self.exporter.recent(trace_id) if isinstance(self.exporter, MemoryExporter) else []
+
+
+tracer = Tracer()
+
+
+def trace_parent(config) -> Optional[tuple]:
+    """The (trace_id, span_id) a WorkFlow turn put in the run config, if any."""
+    parent = ((config or {}).get("metadata") or {}).get(TRACE_KEY)
+    return tuple(parent) if parent else None
+
+
+def model_name(serialized: dict, metadata: dict, invocation_params: dict) -> str:
+    for value in (metadata.get("ls_model_name"), invocation_params.get("model"),
+                  invocation_params.get("model_name"), invocation_params.get("_type")):
+        if value:
+            return str(value)
+    return (serialized or {}).get("name") or "unknown"
+
+
+def usage(response) -> Dict[str, int]:
+    """Input/output token counts from an LLMResult, from usage_metadata or provider token_usage.
+
+    "cached" is the part of the input the provider served from its prompt cache.
+    """
+    for generations in response.generations:
+        for generation in generations:
+            meta = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if meta:
+                details = meta.get("input_token_details") or {}
+                return {"input": meta.get("input_tokens", 0), "output": meta.get("output_tokens", 0),
+                        "cached": details.get("cache_read") or 0}
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return {"input": token_usage.get("prompt_tokens", 0), "output": token_usage.get("completion_tokens", 0),
+            "cached": details.get("cached_tokens") or 0}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks that time every chat-model call and count its tokens."""
+
+    # Run in the caller's context so the enclosing node span is the current span
+    run_inline = True
+
+    def __init__(self, tracer: Tracer = tracer):
+        self.tracer = tracer
+        self._lock = Lock()
+        self._spans: Dict[UUID, Span] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages, *, run_id: UUID, metadata: dict = None,
+                            invocation_params: dict = None, **kwargs) -> None:
+        metadata = metadata or {}
+        parent = None if self.tracer.current() else trace_parent({"metadata": metadata})
+        model = model_name(serialized, metadata, invocation_params or kwargs.get("invocation_params") or {})
+        span = self.tracer.start("llm", parent, model=model, node=metadata.get("langgraph_node", ""))
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _finish(self, run_id: UUID) -> Optional[Span]:
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.end(span)
+            metrics.observe("llm_seconds", span.seconds, model=span.attributes["model"])
+        return span
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None:
+            tokens = usage(response)
+            span.attributes.update({"gen_ai.usage.input_tokens": tokens["input"],
+                                    "gen_ai.usage.output_tokens": tokens["output"],
+                                    "gen_ai.usage.cache_read_input_tokens": tokens["cached"]})
+            for kind, count in tokens.items():
+                if count:
+                    metrics.inc("llm_tokens_total", count, model=span.attributes["model"], type=kind)
+        self._finish(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            span = self._spans.get(run_id)
+            if span is None or "first_token_seconds" in span.attributes:
+                return
+            span.attributes["first_token_seconds"] = span.seconds
+        # Time to first token of streamed calls; what a warm prompt cache shortens
+        metrics.observe("llm_first_token_seconds", span.attributes["first_token_seconds"],
+                        model=span.attributes["model"])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None:
+            span.fail(error)
+            metrics.inc("llm_errors_total", model=span.attributes["model"])
+        self._finish(run_id)
+
+
+callback_handler = TracingCallbackHandler()
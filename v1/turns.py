@@ -0,0 +1,191 @@
+"""Run the turns of one chat strictly in order while different chats run in parallel.
+
+Each chat with turns in flight has a lane: a FIFO queue whose head is the running turn.
+A turn waits until it reaches the head, runs (graph, checkpoint and chat-store writes)
+and hands the lane to the next turn when it is released. Lanes are handed over through
+futures, so the same scheduler serves Flask's threads and the ASGI app's coroutines.
+
+A send whose content matches a turn still queued or running in the same chat is a
+duplicate (a double click, a client retry). V1_DUPLICATE_TURNS decides what happens:
+
+    coalesce  (default) the duplicate gets the original turn's reply; nothing runs twice
+    reject    the duplicate fails with DuplicateTurn (HTTP 409)
+    off       the duplicate queues behind the original like any other turn
+
+Turns are serialized per process. With several workers, route requests by chat id
+(sticky load balancing) so a chat's turns meet in one scheduler. Without it, concurrent
+turns of a chat still keep each other's messages (WorkFlow retries on CheckpointConflict),
+but they are no longer ordered.
+
+Metrics: chat_turn_queue_depth{chat_id} (turns in the chat's lane, running included;
+dropped when the lane empties), chat_turns_waiting, chat_turn_wait_seconds and
+chat_turn_duplicates_total{policy}.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock
+from typing import Dict, Optional
+
+from v1.metrics import metrics
+
+POLICIES = ("coalesce", "reject", "off")
+
+
+class DuplicateTurn(Exception):
+    """The same message is already queued or being answered in this chat."""
+
+
+class Turn:
+    """One chat turn's place in its chat's lane.
+
+    Use it as a (sync or async) context manager around the turn's work and set
+    ``reply`` before leaving it, so coalesced duplicates receive the same reply. A
+    coalesced duplicate never enters the lane; read the reply with ``shared()`` or
+    ``ashared()`` instead.
+    """
+
+    def __init__(self, scheduler: "TurnScheduler", chat_id: str, key: Optional[str],
+                 original: "Turn" = None):
+        self.scheduler = scheduler
+        self.chat_id = chat_id
+        self.key = key
+        self.arrived = time.perf_counter()
+        self.reply = None
+        self.result: Future = original.result if original is not None else Future()
+        self._ready: Future = Future()
+        self._released = False
+        self.coalesced = original is not None
+
+    def _waited(self) -> None:
+        metrics.observe("chat_turn_wait_seconds", time.perf_counter() - self.arrived)
+
+    def __enter__(self) -> "Turn":
+        try:
+            self._ready.result()
+        except BaseException:
+            self.release()
+            raise
+        self._waited()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release(exc)
+
+    async def __aenter__(self) -> "Turn":
+        try:
+            await asyncio.wrap_future(self._ready)
+        except BaseException:
+            # Cancelled while queued: leave the lane so the turns behind us aren't stuck
+            self.release()
+            raise
+        self._waited()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release(exc)
+
+    def release(self, error: BaseException = None) -> None:
+        """Leave the lane and publish the reply (or ``error``) to duplicates. Idempotent."""
+        if self.coalesced or self._released:
+            return
+        self._released = True
+        self.scheduler._release(self)
+        if self.result.done():
+            return
+        if error is None and self.reply is None:
+            error = RuntimeError("the original turn ended without a reply")
+        if error is None:
+            self.result.set_result(self.reply)
+        else:
+            self.result.set_exception(error)
+
+    def shared(self, timeout: float = None):
+        """The original turn's reply, for a coalesced duplicate."""
+        return self.result.result(timeout)
+
+    async def ashared(self):
+        # Shielded: a cancelled duplicate must not cancel the reply other callers wait on
+        return await asyncio.shield(asyncio.wrap_future(self.result))
+
+
+class _Lane:
+    __slots__ = ("queue", "pending")
+
+    def __init__(self):
+        self.queue: deque = deque()
+        self.pending: Dict[str, Turn] = {}
+
+
+class TurnScheduler:
+    """Keyed FIFO lanes, one per chat with turns in flight."""
+
+    def __init__(self, duplicates: str = "coalesce"):
+        if duplicates not in POLICIES:
+            raise ValueError(f"unknown duplicate policy {duplicates!r}; choose from {', '.join(POLICIES)}")
+        self.duplicates = duplicates
+        self._lock = Lock()
+        self._lanes: Dict[str, _Lane] = {}
+        self._waiting = 0
+
+    def _publish(self, chat_id: str, lane: Optional[_Lane]) -> None:
+        if lane is None:
+            metrics.unset("chat_turn_queue_depth", chat_id=chat_id)
+        else:
+            metrics.set("chat_turn_queue_depth", len(lane.queue), chat_id=chat_id)
+        metrics.set("chat_turns_waiting", self._waiting)
+
+    def submit(self, chat_id: str, key: str = None) -> Turn:
+        """Queue a turn for ``chat_id``. ``key`` (the message content) identifies duplicates;
+        turns without one, such as commands, are never treated as duplicates."""
+        with self._lock:
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                lane = self._lanes[chat_id] = _Lane()
+            original = lane.pending.get(key) if key is not None and self.duplicates != "off" else None
+            if original is not None:
+                metrics.inc("chat_turn_duplicates_total", policy=self.duplicates)
+                if self.duplicates == "reject":
+                    raise DuplicateTurn("this message is already being answered")
+                return Turn(self, chat_id, key, original)
+            turn = Turn(self, chat_id, key)
+            lane.queue.append(turn)
+            if key is not None:
+                lane.pending[key] = turn
+            if len(lane.queue) == 1:
+                turn._ready.set_result(None)
+            else:
+                self._waiting += 1
+            self._publish(chat_id, lane)
+        return turn
+
+    def _release(self, turn: Turn) -> None:
+        with self._lock:
+            lane = self._lanes[turn.chat_id]
+            head = lane.queue[0] is turn
+            lane.queue.remove(turn)
+            if not head:
+                self._waiting -= 1
+            if lane.pending.get(turn.key) is turn:
+                del lane.pending[turn.key]
+            if head and lane.queue:
+                self._waiting -= 1
+                following = lane.queue[0]
+                # A waiter cancelled in the meantime releases itself and promotes the next
+                if not following._ready.done():
+                    following._ready.set_result(None)
+            if not lane.queue:
+                del self._lanes[turn.chat_id]
+                lane = None
+            self._publish(turn.chat_id, lane)
+
+    def depth(self, chat_id: str) -> int:
+        """Turns queued or running in ``chat_id``."""
+        with self._lock:
+            lane = self._lanes.get(chat_id)
+            return len(lane.queue) if lane else 0
+
+
+turns = TurnScheduler(os.getenv("V1_DUPLICATE_TURNS", "coalesce"))